@@ -0,0 +1,376 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+"""
+Scrollable selection grid drawn on Tkinter canvases.
+
+Only the visible part of the grid is drawn: the canvases hold one check box
+per visible slot (line/column of the viewport), and scrolling only changes
+which student/topic each slot shows. The number of canvas items thus depends
+on the size of the window, not on the number of students and topics.
+
+Clicks are mapped back to (student, topic) from their position and forwarded
+to the SelectionModel, which owns the state (see SelectionModel for the
+ticking rules). The grid redraws itself once when the model notifies changes.
+A shift-click sets the whole rectangle between the last clicked cell and the
+shift-clicked one to the state given by the last click, in one bulk operation.
+A right click on a student name confirms the student (see on_confirm): his
+name is then greyed and his boxes can no longer be clicked.
+
+The display is done with 4 canvases:
+    the top one contains the topic names and the global topic boxes,
+    the left one contains the global student boxes and the student names,
+    the center one contains the single boxes,
+    the corner one is empty.
+The center and top ones scroll horizontally, the center and left ones scroll
+vertically.
+"""
+
+import Tkinter as tk
+
+# sizes in pixels
+ROW_HEIGHT = 20
+COLUMN_WIDTH = 64
+NAME_WIDTH = 140
+HEADER_HEIGHT = 44
+BOX_SIZE = 12
+
+# box colors (fill, outline)
+SELECTED_STYLE = ('#3a6ea5', 'black')
+FREE_STYLE = ('white', 'black')
+DISABLED_STYLE = ('#e0e0e0', '#b0b0b0')
+# name of the confirmed students
+CONFIRMED_COLOR = '#808080'
+
+
+def box_style(selectable, selected):
+    """
+    :return: fill and outline colors of a check box
+    """
+    if not selectable:
+        return DISABLED_STYLE
+    if selected:
+        return SELECTED_STYLE
+    return FREE_STYLE
+
+
+class SelectionGrid(tk.Frame):
+    """
+    Virtualized grid of check boxes, one line per student and one column per
+    topic, plus the global student and topic boxes.
+    """
+
+    def __init__(self, master, selection, student_list, topic_list,
+                 width=800, height=500, on_confirm=None):
+        """
+        ---------------
+        :param master: parent widget
+        :param selection: SelectionModel displayed and edited by the grid
+        :param student_list: list of the students in the order they should appear
+        :param topic_list: list of the topics in the order they should appear
+        :param width: initial width of the center zone
+        :param height: initial height of the center zone
+        :param on_confirm: function called with the student index when a
+        student is confirmed (right click on his name), None to disable the
+        confirmation
+        """
+
+        tk.Frame.__init__(self, master)
+
+        self.selection = selection
+        self.student_list = student_list
+        self.topic_list = topic_list
+        self.nb_student = len(student_list)
+        self.nb_topic = len(topic_list)
+        self.on_confirm = on_confirm
+
+        # first student/topic shown, number of line/column slots in the viewport
+        # (the last slots may be partially visible) and of fully visible ones
+        self.first_row = 0
+        self.first_column = 0
+        self.nb_rows = 0
+        self.nb_columns = 0
+        self.nb_full_rows = 0
+        self.nb_full_columns = 0
+
+        # canvas items of the slots
+        self.cell_items = []    # [row slot][column slot] -> box
+        self.student_items = [] # [row slot] -> (box, name)
+        self.topic_items = []   # [column slot] -> (name, box)
+
+        options = dict(highlightthickness=0, borderwidth=0)
+        self.corner = tk.Canvas(self, width=NAME_WIDTH, height=HEADER_HEIGHT, **options)
+        self.top = tk.Canvas(self, width=width, height=HEADER_HEIGHT, **options)
+        self.left = tk.Canvas(self, width=NAME_WIDTH, height=height, **options)
+        self.center = tk.Canvas(self, width=width, height=height,
+                                background='white', **options)
+        self.vbar = tk.Scrollbar(self, orient=tk.VERTICAL, command=self.yview)
+        self.hbar = tk.Scrollbar(self, orient=tk.HORIZONTAL, command=self.xview)
+
+        self.corner.grid(row=0, column=0)
+        self.top.grid(row=0, column=1, sticky='ew')
+        self.left.grid(row=1, column=0, sticky='ns')
+        self.center.grid(row=1, column=1, sticky='nsew')
+        self.vbar.grid(row=1, column=2, sticky='ns')
+        self.hbar.grid(row=2, column=1, sticky='ew')
+        self.rowconfigure(1, weight=1)
+        self.columnconfigure(1, weight=1)
+
+        self.center.bind('<Configure>', self.on_resize)
+        self.center.bind('<Button-1>', self.on_cell_click)
+        self.center.bind('<Shift-Button-1>', self.on_cell_shift_click)
+        self.left.bind('<Button-1>', self.on_student_click)
+        if on_confirm is not None:
+            self.left.bind('<Button-3>', self.on_student_confirm)
+        self.top.bind('<Button-1>', self.on_topic_click)
+        for canvas in (self.center, self.left, self.top):
+            canvas.bind('<MouseWheel>', self.on_wheel)
+            canvas.bind('<Shift-MouseWheel>', self.on_shift_wheel)
+            canvas.bind('<Button-4>', lambda event: self.yview('scroll', -1, 'units'))
+            canvas.bind('<Button-5>', lambda event: self.yview('scroll', 1, 'units'))
+
+        # last clicked cell and its new state, for rectangle selection
+        self.anchor = None
+
+        self._redraw_pending = False
+        self.selection.add_listener(self.on_selection_change)
+
+    #######################################################
+    # slots
+    #######################################################
+
+    def on_resize(self, event):
+        """
+        Adapt the number of slots to the size of the viewport.
+        """
+
+        self.nb_full_rows = max(event.height // ROW_HEIGHT, 1)
+        self.nb_full_columns = max(event.width // COLUMN_WIDTH, 1)
+        nb_rows = min(self.nb_full_rows + 1, self.nb_student)
+        nb_columns = min(self.nb_full_columns + 1, self.nb_topic)
+        if nb_rows != self.nb_rows or nb_columns != self.nb_columns:
+            self.nb_rows = nb_rows
+            self.nb_columns = nb_columns
+            self.create_slots()
+        self.first_row = self._clamp(self.first_row, self.nb_student,
+                                     self.nb_full_rows)
+        self.first_column = self._clamp(self.first_column, self.nb_topic,
+                                        self.nb_full_columns)
+        self.redraw()
+
+    def create_slots(self):
+        """
+        Create the canvas items of the viewport slots.
+        """
+
+        for canvas in (self.center, self.left, self.top):
+            canvas.delete(tk.ALL)
+
+        x_margin = (COLUMN_WIDTH - BOX_SIZE) // 2
+        y_margin = (ROW_HEIGHT - BOX_SIZE) // 2
+
+        self.cell_items = []
+        for iRow in range(self.nb_rows):
+            y0 = iRow * ROW_HEIGHT + y_margin
+            row_items = []
+            for iColumn in range(self.nb_columns):
+                x0 = iColumn * COLUMN_WIDTH + x_margin
+                row_items.append(self.center.create_rectangle(
+                    x0, y0, x0 + BOX_SIZE, y0 + BOX_SIZE))
+            self.cell_items.append(row_items)
+
+        self.student_items = []
+        for iRow in range(self.nb_rows):
+            y0 = iRow * ROW_HEIGHT + y_margin
+            box = self.left.create_rectangle(4, y0, 4 + BOX_SIZE, y0 + BOX_SIZE)
+            name = self.left.create_text(BOX_SIZE + 10, y0 + BOX_SIZE // 2,
+                                         anchor=tk.W)
+            self.student_items.append((box, name))
+
+        self.topic_items = []
+        for iColumn in range(self.nb_columns):
+            x0 = iColumn * COLUMN_WIDTH + x_margin
+            name = self.top.create_text(x0 + BOX_SIZE // 2, 2, anchor=tk.N,
+                                        width=COLUMN_WIDTH - 4)
+            y0 = HEADER_HEIGHT - BOX_SIZE - 4
+            box = self.top.create_rectangle(x0, y0, x0 + BOX_SIZE, y0 + BOX_SIZE)
+            self.topic_items.append((name, box))
+
+    #######################################################
+    # drawing
+    #######################################################
+
+    def on_selection_change(self, changes):
+        """
+        Schedule a single redraw for all the changes notified by the model.
+        """
+        if not self._redraw_pending:
+            self._redraw_pending = True
+            self.after_idle(self.redraw)
+
+    def redraw(self):
+        """
+        Draw the students/topics currently in the viewport.
+        """
+
+        self._redraw_pending = False
+        selection = self.selection
+
+        for iRow in range(self.nb_rows):
+            iStudent = self.first_row + iRow
+            box, name = self.student_items[iRow]
+            if iStudent >= self.nb_student:
+                self.left.itemconfigure(box, state=tk.HIDDEN)
+                self.left.itemconfigure(name, state=tk.HIDDEN)
+                for item in self.cell_items[iRow]:
+                    self.center.itemconfigure(item, state=tk.HIDDEN)
+                continue
+            fill, outline = box_style(self.student_list[iStudent] != "",
+                                      selection.student_selected(iStudent))
+            self.left.itemconfigure(box, state=tk.NORMAL, fill=fill, outline=outline)
+            self.left.itemconfigure(name, state=tk.NORMAL,
+                                    text=self.student_list[iStudent],
+                                    fill=CONFIRMED_COLOR if selection.student_locked(iStudent)
+                                    else 'black')
+
+            for iColumn in range(self.nb_columns):
+                iTopic = self.first_column + iColumn
+                item = self.cell_items[iRow][iColumn]
+                if iTopic >= self.nb_topic:
+                    self.center.itemconfigure(item, state=tk.HIDDEN)
+                    continue
+                fill, outline = box_style(selection.is_selectable(iStudent, iTopic),
+                                          selection.is_selected(iStudent, iTopic))
+                self.center.itemconfigure(item, state=tk.NORMAL,
+                                          fill=fill, outline=outline)
+
+        for iColumn in range(self.nb_columns):
+            iTopic = self.first_column + iColumn
+            name, box = self.topic_items[iColumn]
+            if iTopic >= self.nb_topic:
+                self.top.itemconfigure(name, state=tk.HIDDEN)
+                self.top.itemconfigure(box, state=tk.HIDDEN)
+                continue
+            fill, outline = box_style(self.topic_list[iTopic] != "",
+                                      selection.topic_selected(iTopic))
+            self.top.itemconfigure(name, state=tk.NORMAL,
+                                   text=self.topic_list[iTopic])
+            self.top.itemconfigure(box, state=tk.NORMAL, fill=fill, outline=outline)
+
+        self._update_scrollbars()
+
+    def _update_scrollbars(self):
+        if self.nb_student:
+            self.vbar.set(float(self.first_row) / self.nb_student,
+                          min(float(self.first_row + self.nb_full_rows) / self.nb_student, 1.))
+        if self.nb_topic:
+            self.hbar.set(float(self.first_column) / self.nb_topic,
+                          min(float(self.first_column + self.nb_full_columns) / self.nb_topic, 1.))
+
+    #######################################################
+    # scrolling
+    #######################################################
+
+    def _clamp(self, first, total, visible):
+        return max(0, min(first, total - visible))
+
+    def _scroll(self, args, first, total, visible):
+        """
+        Compute the new first index from the scrollbar command arguments.
+        """
+        if args[0] == 'moveto':
+            first = int(round(float(args[1]) * total))
+        elif args[0] == 'scroll':
+            step = int(args[1])
+            if args[2] == 'pages':
+                step *= max(visible - 1, 1)
+            first += step
+        return self._clamp(first, total, visible)
+
+    def yview(self, *args):
+        self.first_row = self._scroll(args, self.first_row,
+                                      self.nb_student, self.nb_full_rows)
+        self.redraw()
+
+    def xview(self, *args):
+        self.first_column = self._scroll(args, self.first_column,
+                                         self.nb_topic, self.nb_full_columns)
+        self.redraw()
+
+    def on_wheel(self, event):
+        self.yview('scroll', -1 if event.delta > 0 else 1, 'units')
+
+    def on_shift_wheel(self, event):
+        self.xview('scroll', -1 if event.delta > 0 else 1, 'units')
+
+    #######################################################
+    # clicks: hit testing
+    #######################################################
+
+    def _student_at(self, y):
+        iStudent = self.first_row + int(y) // ROW_HEIGHT
+        if iStudent < self.nb_student:
+            return iStudent
+        return None
+
+    def _topic_at(self, x):
+        iTopic = self.first_column + int(x) // COLUMN_WIDTH
+        if iTopic < self.nb_topic:
+            return iTopic
+        return None
+
+    def on_cell_click(self, event):
+        iStudent = self._student_at(event.y)
+        iTopic = self._topic_at(event.x)
+        if iStudent is None or iTopic is None \
+                or self.selection.student_locked(iStudent):
+            return
+        # empty cells and cells without headers are not selectable: the model
+        # ignores them.
+        value = not self.selection.is_selected(iStudent, iTopic)
+        self.anchor = (iStudent, iTopic, value)
+        self.selection.set_single(iStudent, iTopic, value)
+
+    def on_cell_shift_click(self, event):
+        iStudent = self._student_at(event.y)
+        iTopic = self._topic_at(event.x)
+        if iStudent is None or iTopic is None:
+            return
+        if self.anchor is None:
+            return self.on_cell_click(event)
+        anchor_student, anchor_topic, value = self.anchor
+        self.selection.set_rect(anchor_student, iStudent, anchor_topic, iTopic, value)
+
+    def on_student_click(self, event):
+        iStudent = self._student_at(event.y)
+        if iStudent is None or self.student_list[iStudent] == "" \
+                or self.selection.student_locked(iStudent):
+            return
+        self.selection.set_student(iStudent,
+                                   not self.selection.student_selected(iStudent))
+
+    def on_topic_click(self, event):
+        iTopic = self._topic_at(event.x)
+        if iTopic is None or self.topic_list[iTopic] == "":
+            return
+        self.selection.set_topic(iTopic,
+                                 not self.selection.topic_selected(iTopic))
+
+    #######################################################
+    # confirmation
+    #######################################################
+
+    def on_student_confirm(self, event):
+        iStudent = self._student_at(event.y)
+        if iStudent is None or self.student_list[iStudent] == "" \
+                or self.selection.student_locked(iStudent):
+            return
+        self.on_confirm(iStudent)
+
+    def set_confirmed(self, iStudent):
+        """
+        Show a student as confirmed: he is locked in the selection, the clicks
+        on his boxes and the bulk operations leave his cells as they are.
+        """
+        self.selection.lock_student(iStudent)
+        self.on_selection_change(None)
@@ -0,0 +1,625 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+"""
+Selection state of the students and topics, independent of Tkinter.
+
+The state of the single cells (one topic for one student) is stored as a bit
+array, along with the bit array of the selectable cells (cells with a student
+header, a topic header and a mark). A 20k x 200 selection fits in 1 MB.
+The global student and topic selectors are stored as one byte each.
+
+The ticking rules are:
+If a global student is ticked, it ticks every topic for this student, and ticks
+the global topics which are completed. If it is unticked, it unticks every
+topic for this student and every global topic.
+Same with student <---> topic.
+If a single cell is ticked, it ticks the global student and topic it completes.
+If it is unticked, it unticks the corresponding global student and topic.
+Empty cells and lines/columns without header cannot be selected, but are
+considered as ticked when checking for line/column completeness.
+
+The completeness checks cost O(1): the number of selected and selectable cells
+is kept for each line and column.
+
+Listeners (e.g. the GUI) are notified once per operation with the list of the
+changes, see SelectionModel.add_listener.
+
+Bulk operations (select_all, reset, set_rect, set_mask, set_state) update
+the bit arrays byte per byte in a single pass, and notify the listeners only
+once. A mask is a bit array with the same layout as the cells (see new_mask).
+
+The cells of a locked student (e.g. whose mail was already sent, see
+sendPipeline) are kept as they are by every operation, bulk ones included.
+"""
+
+import array
+import string
+import binascii
+import operator
+import itertools
+
+# positions of the set bits, for each byte value
+BIT_POSITIONS = [tuple(bit for bit in range(8) if value >> bit & 1)
+                 for value in range(256)]
+# bits of each byte value, one byte ('\x00' or '\x01') per bit
+UNPACKED_BYTES = [''.join(chr(value >> bit & 1) for bit in range(8))
+                  for value in range(256)]
+BINARY_DIGITS = string.maketrans('\x00\x01', '01')
+INVERTED_BYTES = ''.join(chr(255 - value) for value in range(256))
+
+
+def unpack_bits(bits, nb_bits):
+    """
+    :return: string of one byte per bit of a bit array, '\x01' for the set
+    bits, '\x00' for the other ones
+    """
+    return ''.join(itertools.imap(UNPACKED_BYTES.__getitem__, bits))[:nb_bits]
+
+
+def pack_bits(unpacked):
+    """
+    Opposite of unpack_bits, without any python loop over the bits: the string
+    is read as a binary number.
+    ---------------
+    :param unpacked: string of one byte per bit, '\x00' or '\x01'
+    :return: bit array (bytearray)
+    """
+    nb_bytes = (len(unpacked) + 7) // 8
+    if not nb_bytes:
+        return bytearray()
+    value = int(str(unpacked)[::-1].translate(BINARY_DIGITS), 2)
+    return bytearray(binascii.unhexlify('%0*x' % (2 * nb_bytes, value))[::-1])
+
+
+def set_bit_range(bits, start, stop):
+    """
+    Set the bits of the range [start, stop[ of a bit array, full bytes at once.
+    ---------------
+    :param bits: bit array (bytearray)
+    :param start: first bit index
+    :param stop: bit index after the last one
+    """
+
+    if start >= stop:
+        return
+    first_byte, first_bit = start >> 3, start & 7
+    last_byte, last_bit = stop >> 3, stop & 7
+    if first_byte == last_byte:
+        bits[first_byte] |= ((1 << (last_bit - first_bit)) - 1) << first_bit
+        return
+    bits[first_byte] |= (0xff << first_bit) & 0xff
+    bits[first_byte + 1:last_byte] = '\xff' * (last_byte - first_byte - 1)
+    if last_bit:
+        bits[last_byte] |= (1 << last_bit) - 1
+
+
+def clear_bit_range(bits, start, stop):
+    """
+    Clear the bits of the range [start, stop[ of a bit array, full bytes at
+    once (see set_bit_range).
+    """
+
+    if start >= stop:
+        return
+    first_byte, first_bit = start >> 3, start & 7
+    last_byte, last_bit = stop >> 3, stop & 7
+    if first_byte == last_byte:
+        bits[first_byte] &= ~(((1 << (last_bit - first_bit)) - 1) << first_bit) & 0xff
+        return
+    bits[first_byte] &= (1 << first_bit) - 1
+    bits[first_byte + 1:last_byte] = bytearray(last_byte - first_byte - 1)
+    if last_bit:
+        bits[last_byte] &= ~((1 << last_bit) - 1) & 0xff
+
+
+def intersect_masks(first, second):
+    """
+    :return: mask of the cells which are in both masks
+    """
+    return bytearray(itertools.imap(operator.and_, first, second))
+
+
+def invert_mask(mask):
+    """
+    :return: mask of the cells which are not in a mask (the padding bits of the
+    last byte are set)
+    """
+    return mask.translate(INVERTED_BYTES)
+
+
+def check_sizes(student_list, topic_list, table):
+    """
+    Check that the lists of the students and topics match a mark table.
+    ---------------
+    :raise ValueError: if they do not have one name per line and column of
+    the table
+    """
+    if len(student_list) != table.nb_student:
+        raise ValueError("%d student names for a table of %d students"
+                         % (len(student_list), table.nb_student))
+    if len(topic_list) != table.nb_topic:
+        raise ValueError("%d topic names for a table of %d topics"
+                         % (len(topic_list), table.nb_topic))
+
+
+class SelectionModel(object):
+    """
+    Selection of the single cells and of the global students/topics.
+    """
+
+    def __init__(self, student_list, topic_list, table):
+        """
+        The lists are those of the table (table.student_list() and
+        table.topic_list()): one name per student and per topic of the table,
+        in its display order.
+        ---------------
+        :param student_list: list of the students as they should appear, needed
+        to check for empty student headers
+        :param topic_list: list of the topics as they should appear, needed to
+        check for empty topic headers
+        :param table: mark table (retrieve_marks.MarkTable), needed to check for
+        empty cells
+        :raise ValueError: if the lists do not have the sizes of the table
+        """
+
+        check_sizes(student_list, topic_list, table)
+        self.nb_student = len(student_list)
+        self.nb_topic = len(topic_list)
+        nb_bytes = (self.nb_student * self.nb_topic + 7) // 8
+
+        # bit arrays of the single cells, student major
+        self.cells = bytearray(nb_bytes)
+        self.selectable = bytearray(nb_bytes)
+        # selectable cells of the students which are not locked
+        self.editable = bytearray(nb_bytes)
+        # 1 for the locked students
+        self.locked = bytearray(self.nb_student)
+        self.nb_locked = 0
+        # global selectors
+        self.students = bytearray(self.nb_student)
+        self.topics = bytearray(self.nb_topic)
+
+        # number of selected and selectable cells per line and column
+        self.selected_student = array.array('l', [0] * self.nb_student)
+        self.selected_topic = array.array('l', [0] * self.nb_topic)
+        self.selectable_student = array.array('l', [0] * self.nb_student)
+        self.selectable_topic = array.array('l', [0] * self.nb_topic)
+
+        self._add_selectable(0, student_list, topic_list, table)
+
+        self.listeners = []
+        self._changes = None
+
+    def _add_selectable(self, first_student, student_list, topic_list, table):
+        """
+        Mark as selectable the cells of the students from first_student on
+        which have a header and a mark, and count them. Done on the map of the
+        filled cells (one byte per cell) with string operations, then packed.
+        """
+        nb_topic = self.nb_topic
+        nb_new = self.nb_student - first_student
+        cells = bytearray(table.filled_cells(first_student))
+        for iStudent in range(first_student, self.nb_student):
+            if student_list[iStudent] == "":
+                index = (iStudent - first_student) * nb_topic
+                cells[index:index + nb_topic] = bytearray(nb_topic)
+        for iTopic in range(nb_topic):
+            if topic_list[iTopic] == "":
+                cells[iTopic::nb_topic] = bytearray(nb_new)
+        cells = str(cells)
+
+        for iStudent in range(first_student, self.nb_student):
+            index = (iStudent - first_student) * nb_topic
+            self.selectable_student[iStudent] = cells.count('\x01', index, index + nb_topic)
+        for iTopic in range(nb_topic):
+            self.selectable_topic[iTopic] += cells[iTopic::nb_topic].count('\x01')
+        previous = unpack_bits(self.selectable, first_student * nb_topic)
+        self.selectable[:] = pack_bits(previous + cells)
+        self.editable[:] = self.selectable
+        if self.nb_locked:
+            for iStudent in range(first_student):
+                if self.locked[iStudent]:
+                    clear_bit_range(self.editable, iStudent * nb_topic,
+                                    (iStudent + 1) * nb_topic)
+
+    def add_students(self, student_list, topic_list, table):
+        """
+        Add the students appended at the end of the table since the selection
+        was built (see MarkTable.append_student), unselected. The selection of
+        the previous students is kept, the topics which are no longer complete
+        are unticked.
+        ---------------
+        :param student_list: list of all the students, previous ones first
+        :param topic_list: list of the topics, unchanged
+        :param table: mark table, with the new students
+        :raise ValueError: if the lists do not have the sizes of the table
+        """
+
+        check_sizes(student_list, topic_list, table)
+        first_student = self.nb_student
+        self.nb_student = len(student_list)
+        nb_new = self.nb_student - first_student
+        if nb_new <= 0:
+            return
+        nb_bytes = (self.nb_student * self.nb_topic + 7) // 8
+        self.cells.extend(bytearray(nb_bytes - len(self.cells)))
+        self.selectable.extend(bytearray(nb_bytes - len(self.selectable)))
+        self.editable.extend(bytearray(nb_bytes - len(self.editable)))
+        self.students.extend(bytearray(nb_new))
+        self.locked.extend(bytearray(nb_new))
+        self.selected_student.extend([0] * nb_new)
+        self.selectable_student.extend([0] * nb_new)
+
+        self._add_selectable(first_student, student_list, topic_list, table)
+        for iTopic in range(self.nb_topic):
+            if not self.topic_is_complete(iTopic):
+                self.topics[iTopic] = 0
+
+        self._changes = [('all',)]
+        self._commit()
+
+    ########################################################
+    # notification of the changes
+    ########################################################
+
+    def add_listener(self, callback):
+        """
+        Register a function called after each operation changing the selection.
+        It receives the list of the changes, as tuples:
+            ('single', iStudent, iTopic, value)
+            ('student', iStudent, value)
+            ('topic', iTopic, value)
+            ('all',) if any value may have changed.
+        ---------------
+        :param callback: function taking the list of changes
+        """
+        self.listeners.append(callback)
+
+    def _begin(self):
+        self._changes = []
+
+    def _commit(self):
+        changes = self._changes
+        self._changes = None
+        if changes:
+            for callback in self.listeners:
+                callback(changes)
+
+    ########################################################
+    # read access
+    ########################################################
+
+    def is_selectable(self, iStudent, iTopic):
+        index = iStudent * self.nb_topic + iTopic
+        return (self.selectable[index >> 3] >> (index & 7)) & 1 == 1
+
+    def is_editable(self, iStudent, iTopic):
+        """
+        :return: True if the cell is selectable and its student is not locked
+        """
+        index = iStudent * self.nb_topic + iTopic
+        return (self.editable[index >> 3] >> (index & 7)) & 1 == 1
+
+    def student_locked(self, iStudent):
+        return self.locked[iStudent] == 1
+
+    def is_selected(self, iStudent, iTopic):
+        index = iStudent * self.nb_topic + iTopic
+        return (self.cells[index >> 3] >> (index & 7)) & 1 == 1
+
+    def student_selected(self, iStudent):
+        return self.students[iStudent] == 1
+
+    def topic_selected(self, iTopic):
+        return self.topics[iTopic] == 1
+
+    def selected_topics(self, iStudent):
+        """
+        Generator over the selected topics of a student, in order.
+        ---------------
+        :param iStudent: student index
+        """
+        if self.selected_student[iStudent] == 0:
+            return
+        cells = self.cells
+        start = iStudent * self.nb_topic
+        stop = start + self.nb_topic
+        # byte per byte, the empty bytes are skipped
+        for iByte in xrange(start >> 3, (stop + 7) >> 3):
+            byte = cells[iByte]
+            if not byte:
+                continue
+            for bit in BIT_POSITIONS[byte]:
+                index = (iByte << 3) + bit
+                if start <= index < stop:
+                    yield index - start
+
+    def nb_selected(self):
+        """
+        :return: total number of selected cells
+        """
+        return sum(self.selected_student)
+
+    def topic_is_complete(self, iTopic):
+        return self.selected_topic[iTopic] >= self.selectable_topic[iTopic]
+
+    def student_is_complete(self, iStudent):
+        return self.selected_student[iStudent] >= self.selectable_student[iStudent]
+
+    ########################################################
+    # low level setters, no propagation
+    ########################################################
+
+    def _set_cell(self, iStudent, iTopic, value):
+        index = iStudent * self.nb_topic + iTopic
+        mask = 1 << (index & 7)
+        was_selected = self.cells[index >> 3] & mask != 0
+        if was_selected == value:
+            return
+        if value:
+            self.cells[index >> 3] |= mask
+            delta = 1
+        else:
+            self.cells[index >> 3] &= ~mask
+            delta = -1
+        self.selected_student[iStudent] += delta
+        self.selected_topic[iTopic] += delta
+        self._changes.append(('single', iStudent, iTopic, value))
+
+    def _set_student(self, iStudent, value):
+        if self.students[iStudent] != value:
+            self.students[iStudent] = value
+            self._changes.append(('student', iStudent, value))
+
+    def _set_topic(self, iTopic, value):
+        if self.topics[iTopic] != value:
+            self.topics[iTopic] = value
+            self._changes.append(('topic', iTopic, value))
+
+    ########################################################
+    # operations (ticking rules)
+    ########################################################
+
+    def set_single(self, iStudent, iTopic, value):
+        """
+        Tick or untick a single cell.
+        ---------------
+        :param iStudent: student index of the cell
+        :param iTopic: topic index of the cell
+        :param value: new state of the cell
+        """
+
+        if not self.is_editable(iStudent, iTopic):
+            return
+        self._begin()
+        self._set_cell(iStudent, iTopic, value)
+        if not value:
+            self._set_student(iStudent, False)
+            self._set_topic(iTopic, False)
+        else:
+            if self.student_is_complete(iStudent):
+                self._set_student(iStudent, True)
+            if self.topic_is_complete(iTopic):
+                self._set_topic(iTopic, True)
+        self._commit()
+
+    def set_student(self, iStudent, value):
+        """
+        Tick or untick a whole student.
+        ---------------
+        :param iStudent: student index
+        :param value: new state of the student
+        """
+
+        if self.locked[iStudent]:
+            return
+        self._begin()
+        self._set_student(iStudent, value)
+        for iTopic in range(self.nb_topic):
+            if not self.is_selectable(iStudent, iTopic):
+                continue
+            self._set_cell(iStudent, iTopic, value)
+            if not value:
+                self._set_topic(iTopic, False)
+            elif self.topic_is_complete(iTopic):
+                self._set_topic(iTopic, True)
+        self._commit()
+
+    def set_topic(self, iTopic, value):
+        """
+        Tick or untick a whole topic.
+        ---------------
+        :param iTopic: topic index
+        :param value: new state of the topic
+        """
+
+        self._begin()
+        self._set_topic(iTopic, value)
+        for iStudent in range(self.nb_student):
+            if not self.is_editable(iStudent, iTopic):
+                continue
+            self._set_cell(iStudent, iTopic, value)
+            if not value:
+                self._set_student(iStudent, False)
+            elif self.student_is_complete(iStudent):
+                self._set_student(iStudent, True)
+        # the unticked cells of the locked students stay unticked
+        if value and not self.topic_is_complete(iTopic):
+            self._set_topic(iTopic, False)
+        self._commit()
+
+    def select_all(self):
+        """
+        Tick every selectable cell and every global selector (only the cells
+        of the students which are not locked, if any).
+        """
+        if self.nb_locked:
+            return self.set_mask(bytearray('\xff' * len(self.cells)), True)
+        self.cells[:] = self.selectable
+        self.students[:] = '\x01' * self.nb_student
+        self.topics[:] = '\x01' * self.nb_topic
+        self.selected_student = array.array('l', self.selectable_student)
+        self.selected_topic = array.array('l', self.selectable_topic)
+        self._changes = [('all',)]
+        self._commit()
+
+    def reset(self):
+        """
+        Untick everything (but the cells of the locked students).
+        """
+        if self.nb_locked:
+            return self.set_mask(bytearray('\xff' * len(self.cells)), False)
+        self.cells[:] = bytearray(len(self.cells))
+        self.students[:] = bytearray(self.nb_student)
+        self.topics[:] = bytearray(self.nb_topic)
+        self.selected_student = array.array('l', [0] * self.nb_student)
+        self.selected_topic = array.array('l', [0] * self.nb_topic)
+        self._changes = [('all',)]
+        self._commit()
+
+    def lock_student(self, iStudent):
+        """
+        Lock a student: his cells are no longer changed by any operation.
+        ---------------
+        :param iStudent: student index
+        """
+        if self.locked[iStudent]:
+            return
+        self.locked[iStudent] = 1
+        self.nb_locked += 1
+        clear_bit_range(self.editable, iStudent * self.nb_topic,
+                        (iStudent + 1) * self.nb_topic)
+
+    def set_state(self, cells, students=None, topics=None):
+        """
+        Replace the whole selection, e.g. read from a file (see selectionFile),
+        counting the selected cells without any loop over the single cells.
+        The cells which are not selectable are dropped, the global students
+        and topics are ticked if they were and are still complete.
+        ---------------
+        :param cells: bit array of the selected cells (layout of new_mask)
+        :param students: global student states (one byte each), None to tick
+        the complete students with a selected cell
+        :param topics: global topic states, None to tick the complete topics
+        with a selected cell
+        """
+
+        nb_topic = self.nb_topic
+        self.cells[:] = intersect_masks(cells, self.selectable)
+        unpacked = unpack_bits(self.cells, self.nb_student * nb_topic)
+        self.selected_student = array.array('l', [
+            unpacked.count('\x01', iStudent * nb_topic, (iStudent + 1) * nb_topic)
+            for iStudent in range(self.nb_student)])
+        self.selected_topic = array.array('l', [unpacked[iTopic::nb_topic].count('\x01')
+                                                for iTopic in range(nb_topic)])
+        if students is None:
+            students = self.selected_student
+        if topics is None:
+            topics = self.selected_topic
+        self.students[:] = bytearray(
+            1 if students[iStudent] and self.student_is_complete(iStudent) else 0
+            for iStudent in range(self.nb_student))
+        self.topics[:] = bytearray(
+            1 if topics[iTopic] and self.topic_is_complete(iTopic) else 0
+            for iTopic in range(nb_topic))
+        self._changes = [('all',)]
+        self._commit()
+
+    def new_mask(self):
+        """
+        :return: empty mask (bit array with the layout of the cells)
+        """
+        return bytearray(len(self.cells))
+
+    def mask_set(self, mask, iStudent, iTopic):
+        """
+        Add a cell to a mask.
+        """
+        index = iStudent * self.nb_topic + iTopic
+        mask[index >> 3] |= 1 << (index & 7)
+
+    def rect_mask(self, first_student, last_student, first_topic, last_topic):
+        """
+        Mask of a rectangle of cells, bounds included.
+        """
+        mask = self.new_mask()
+        for iStudent in range(first_student, last_student + 1):
+            index = iStudent * self.nb_topic
+            set_bit_range(mask, index + first_topic, index + last_topic + 1)
+        return mask
+
+    def set_rect(self, first_student, last_student, first_topic, last_topic, value):
+        """
+        Tick or untick all the selectable cells of a rectangle, bounds included
+        and in any order.
+        ---------------
+        :param value: new state of the cells
+        """
+        if first_student > last_student:
+            first_student, last_student = last_student, first_student
+        if first_topic > last_topic:
+            first_topic, last_topic = last_topic, first_topic
+        self.set_mask(self.rect_mask(first_student, last_student,
+                                     first_topic, last_topic), value)
+
+    def set_mask(self, mask, value):
+        """
+        Tick or untick all the selectable cells of a mask (but the ones of the
+        locked students), in one pass over the bit arrays. The global students and topics of the changed cells are
+        ticked if they are complete (when ticking), unticked otherwise.
+        ---------------
+        :param mask: bit array of the cells to change (see new_mask)
+        :param value: new state of the cells
+        """
+
+        cells = self.cells
+        editable = self.editable
+        nb_topic = self.nb_topic
+        selected_student = self.selected_student
+        selected_topic = self.selected_topic
+        delta = 1 if value else -1
+        changed_students = set()
+        changed_topics = set()
+
+        for iByte in xrange(len(cells)):
+            bits = mask[iByte] & editable[iByte]
+            if not bits:
+                continue
+            old = cells[iByte]
+            new = old | bits if value else old & ~bits
+            if new == old:
+                continue
+            cells[iByte] = new
+            for bit in BIT_POSITIONS[old ^ new]:
+                iStudent, iTopic = divmod((iByte << 3) + bit, nb_topic)
+                selected_student[iStudent] += delta
+                selected_topic[iTopic] += delta
+                changed_students.add(iStudent)
+                changed_topics.add(iTopic)
+
+        for iStudent in changed_students:
+            self.students[iStudent] = value and self.student_is_complete(iStudent)
+        for iTopic in changed_topics:
+            self.topics[iTopic] = value and self.topic_is_complete(iTopic)
+
+        self._changes = [('all',)]
+        self._commit()
+
+
+def print_selection_map(selection):
+    """
+    Debug function to print the state of the global selectors and of the
+    single cells.
+    ---------------
+    :param selection: SelectionModel
+    """
+    print '  [',
+    for iTopic in range(selection.nb_topic):
+        print 1 if selection.topic_selected(iTopic) else 0, ',',
+    print ']'
+    for iStudent in range(selection.nb_student):
+        print 1 if selection.student_selected(iStudent) else 0, '[',
+        for iTopic in range(selection.nb_topic):
+            print 1 if selection.is_selected(iStudent, iTopic) else 0, ',',
+        print ']'
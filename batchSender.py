@@ -0,0 +1,307 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+"""
+Batch mode: send the marks of many csv files (one per course or group) in one
+run, without the GUI.
+
+The sheets are given as files, directories (all their .csv files) or glob
+patterns. They are parsed and their mails rendered and built in a pool of
+processes (one per core by default), with the same selection expression for
+all of them. The messages of all the sheets go to a single dispatcher: one
+SMTP pool and one rate limit for the whole run (see mailDispatch).
+Each sheet is processed independently: a sheet which cannot be read or
+parsed is reported in the summary, the other ones are sent anyway.
+
+Call with
+    ./batchSender.py --select 'where mark<10' --sender me@u-psud.fr \
+        path/to/sheets/ 'other/*.csv'
+Help available with
+    ./batchSender.py -h
+"""
+
+import os
+import sys
+import glob
+import argparse
+import threading
+import multiprocessing
+from marksender import add_smtp_arguments, check_smtp_arguments, \
+    create_dispatcher
+
+
+def find_sheets(patterns):
+    """
+    List the csv files to process.
+    ---------------
+    :param patterns: files, directories or glob patterns
+    :return: list of paths, without duplicates, in the order they were given
+    """
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            found = sorted(glob.glob(os.path.join(pattern, '*.csv')))
+        else:
+            found = sorted(glob.glob(pattern)) or [pattern]
+        for path in found:
+            if path not in paths:
+                paths.append(path)
+    return paths
+
+
+def render_sheet(job):
+    """
+    Parse a sheet, select its marks and build its messages. Run in the worker
+    processes: every error is caught and returned, so that a bad sheet only
+    fails alone.
+    ---------------
+    :param job: (path of the sheet, selection expression, path of the template
+    or None, sender, subject, cache directory or None for no cache, dry-run
+    flag, computed statistics flag)
+    :return: dictionary with the path, the error (None if ok), the number of
+    selected marks, the students without mail address and the mails, as
+    (receiver, topics, body, message) tuples (message is None for dry-runs)
+    """
+
+    path, expression_text, template_path, sender, subject, cache_dir, dry_run, \
+        computed_stats = job
+    result = {'path': path, 'error': None, 'nb_selected': 0,
+              'no_address': [], 'mails': []}
+    try:
+        import mailUtils as mailU
+        from selectExpr import SelectionExpression
+        from SelectionModel import SelectionModel
+
+        if cache_dir is None:
+            from retrieve_marks import build_list_dic
+            with open(path, 'r') as input_file:
+                table, topic_list, student_list = build_list_dic(input_file,
+                                                                 False, False)
+        else:
+            import markCache
+            table, topic_list, student_list, hit = \
+                markCache.build_list_dic_cached(path, False, False, cache_dir)
+
+        if template_path:
+            template = mailU.MailTemplate.from_file(template_path)
+        else:
+            template = mailU.MailTemplate()
+        template.prepare(table, topic_list, sheet_stats=not computed_stats)
+
+        selection = SelectionModel(student_list, topic_list, table)
+        expression = SelectionExpression(expression_text)
+        selection.set_mask(expression.mask(table, selection), True)
+        result['nb_selected'] = selection.nb_selected()
+
+        for iStudent in range(len(student_list)):
+            mail_body = template.render(iStudent, selection)
+            if mail_body == "":
+                continue
+            mail_add = table.email(iStudent)
+            if mail_add == "":
+                result['no_address'].append(student_list[iStudent])
+                continue
+            topics = [topic_list[iTopic]
+                      for iTopic in selection.selected_topics(iStudent)
+                      if table.has_mark(iStudent, iTopic)]
+            message = None
+            if not dry_run:
+                message = mailU.build_message(sender, mail_add, subject, mail_body)
+            result['mails'].append((mail_add, topics, mail_body, message))
+    except StopIteration:
+        result['error'] = "incomplete sheet, the 4 reserved lines are missing"
+        result['mails'] = []
+    except Exception, error:
+        result['error'] = "%s: %s" % (type(error).__name__, error)
+        result['mails'] = []
+    return result
+
+
+class SheetSummary(object):
+    """
+    Counters of the mails of a sheet. Updated from the dispatcher threads.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.error = None
+        self.nb_selected = 0
+        self.nb_rendered = 0
+        self.nb_sent = 0
+        self.nb_failed = 0
+        self.nb_skipped = 0
+
+    def __str__(self):
+        if self.error is not None:
+            return "%s: not processed (%s)" % (self.path, self.error)
+        return "%s: %d mark(s) selected, %d mail(s), %d sent, %d failed, " \
+            "%d already sent" % (self.path, self.nb_selected, self.nb_rendered,
+                                 self.nb_sent, self.nb_failed, self.nb_skipped)
+
+
+def main(argv):
+    """
+    Main program.
+    ---------------
+    :param argv: described in built-in help
+    :return:    0 if evertything ok,
+                1 if some sheets could not be processed,
+                2 if some mails could not be sent.
+    """
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("sheets", metavar="sheet", nargs="+",
+                    help="csv file, directory of csv files or glob pattern")
+    parser.add_argument("--select", metavar="EXPR", required=True,
+                    help="selection expression applied to every sheet (see "
+                    "selectExpr)")
+    parser.add_argument("--dry-run", action="store_true",
+                    help="do everything without actually sending the mails")
+    parser.add_argument("--template", metavar="FILE",
+                    help="template of the mails (see mailUtils.MailTemplate)")
+    parser.add_argument("--computed-stats", action="store_true",
+                    help="compute the mean, max and min of each topic from the "
+                    "marks, instead of using the lines of the csv files")
+    parser.add_argument("--journal", metavar="FILE",
+                    help="record the mails sent in this journal file")
+    parser.add_argument("--resume", action="store_true",
+                    help="do not send again the mails recorded as sent in the "
+                    "journal (requires --journal)")
+    parser.add_argument("--processes", type=int,
+                    help="number of processes parsing and rendering the sheets "
+                    "(default: number of cores)")
+    parser.add_argument("--cache", action="store_true",
+                    help="cache the parsed csv files in ~/.cache/marksender "
+                    "(see markCache)")
+    parser.add_argument("--cache-dir", metavar="DIR",
+                    help="directory of the cache of the parsed csv files "
+                    "(implies --cache)")
+    add_smtp_arguments(parser)
+
+    args = parser.parse_args(argv[1:])
+    check_smtp_arguments(parser, args)
+    if args.resume and not args.journal:
+        parser.error("--resume requires --journal")
+    # check the expression and the template once, before starting the workers
+    import mailUtils as mailU
+    from selectExpr import SelectionExpression
+    try:
+        SelectionExpression(args.select)
+    except ValueError, error:
+        parser.error(str(error))
+    if args.template:
+        try:
+            mailU.MailTemplate.from_file(args.template)
+        except IOError:
+            parser.error("template file not found: %s" % args.template)
+        except ValueError, error:
+            parser.error("invalid template: %s" % error)
+
+    paths = find_sheets(args.sheets)
+    if not paths:
+        print "No sheet found."
+        return 1
+    cache_dir = None
+    if args.cache or args.cache_dir is not None:
+        import markCache
+        cache_dir = args.cache_dir or markCache.DEFAULT_CACHE_DIR
+    jobs = [(path, args.select, args.template, args.sender, args.subject,
+             cache_dir, args.dry_run, args.computed_stats) for path in paths]
+
+    summaries = dict((path, SheetSummary(path)) for path in paths)
+    summaries_lock = threading.Lock()
+
+    journal = None
+    delivered = set()
+    if args.journal and not args.dry_run:
+        import mailJournal
+        journal = mailJournal.SendJournal(args.journal)
+        if args.resume:
+            delivered = journal.delivered()
+
+    def on_result(result, tag):
+        # from the dispatcher threads
+        path, key, topics = tag
+        with summaries_lock:
+            if result.ok:
+                summaries[path].nb_sent += 1
+            else:
+                summaries[path].nb_failed += 1
+        if journal is not None:
+            status = mailJournal.SENT if result.ok else mailJournal.FAILED
+            journal.record(key, result.receiver, topics, status)
+
+    # the worker processes are started (forked) before the dispatcher threads
+    processes = multiprocessing.Pool(args.processes or multiprocessing.cpu_count())
+    if not args.dry_run:
+        pool, dispatcher = create_dispatcher(args, on_result)
+
+    # the sheets are handled in the order they are ready
+    try:
+        for sheet in processes.imap_unordered(render_sheet, jobs):
+            summary = summaries[sheet['path']]
+            summary.error = sheet['error']
+            if sheet['error'] is not None:
+                print "Error in", sheet['path'], ":", sheet['error']
+                continue
+            summary.nb_selected = sheet['nb_selected']
+            for name in sheet['no_address']:
+                print "Warning: no mail address for", name, "in", sheet['path']
+            if not args.dry_run:
+                with summaries_lock:
+                    summary.nb_failed += len(sheet['no_address'])
+            for mail_add, topics, mail_body, message in sheet['mails']:
+                summary.nb_rendered += 1
+                if args.dry_run:
+                    mailU.send_mail_fake(mail_add, mail_body)
+                    continue
+                key = None
+                if journal is not None:
+                    key = mailJournal.message_key(mail_add, topics, mail_body)
+                    if key in delivered:
+                        with summaries_lock:
+                            summary.nb_skipped += 1
+                        continue
+                dispatcher.put(args.sender, mail_add, message,
+                               (sheet['path'], key, topics))
+        processes.close()
+    except BaseException:
+        # Ctrl-C or error: join would wait for (or refuse) a running pool
+        processes.terminate()
+        raise
+    finally:
+        processes.join()
+
+    nb_close_errors = 0
+    if not args.dry_run:
+        for result in dispatcher.close():
+            if not result.ok:
+                print "Could not send the mail to", result.receiver, ":", result.error
+        try:
+            pool.close()
+        except (IOError, OSError), error:
+            # the mails were written, but may not be on the disk
+            print "Could not close the spool", args.spool, ":", error
+            nb_close_errors = 1
+        if journal is not None:
+            journal.close()
+
+    print
+    nb_errors = 0
+    nb_failed = 0
+    for path in paths:
+        print summaries[path]
+        if summaries[path].error is not None:
+            nb_errors += 1
+        nb_failed += summaries[path].nb_failed
+    print len(paths), "sheet(s),", nb_errors, "not processed,", \
+        sum(summary.nb_sent for summary in summaries.itervalues()), "mail(s) sent,", \
+        nb_failed, "failed."
+
+    if nb_errors:
+        return 1
+    return 0 if nb_failed + nb_close_errors == 0 else 2
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+"""
+Benchmark of the routing by recipient domain (see mailRouting), against
+several local stand-in SMTP servers (see tests/smtpServer.py), one per domain:
+    fast.example    accepts every message at once
+    slow.example    waits before accepting each message (--slow-delay)
+    grey.example    greylists: refuses the first attempt of each recipient
+                    with 451, accepts the next ones
+The messages of the 3 domains are interleaved, and sent:
+    through a single queue (mailDispatch.Dispatcher) whose workers are
+        shared by all the domains,
+    through mailRouting.RoutingDispatcher, one queue, pool and retry heap per
+        domain.
+For each one, the time at which each domain is done, and the number of
+messages delivered, are printed.
+
+Call with
+    python benchmarks/bench_routing.py [-n NB_MESSAGES] [-c CONNECTIONS]
+"""
+
+import os
+import sys
+import time
+import json
+import argparse
+import threading
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'tests')]
+import mailUtils as mailU
+import mailDispatch
+import mailRouting
+from smtpServer import StandinServer
+
+DOMAINS = ('fast.example', 'slow.example', 'grey.example')
+
+
+class SinglePathPool(object):
+    """
+    Pools of the stand-in servers behind a single queue: the message goes to
+    the server of its domain, but through the workers shared by all domains.
+    """
+
+    def __init__(self, routes):
+        self.pools = dict((domain, mailU.SMTPPool(route.host, route.port, size=route.connections))
+                          for domain, route in routes.items())
+
+    def send(self, sender, receiver, message):
+        return self.pools[mailRouting.recipient_domain(receiver)].send(sender, receiver, message)
+
+    def close(self):
+        for pool in self.pools.values():
+            pool.close()
+
+
+def run(dispatcher, messages):
+    """
+    :return: dictionary of the seconds until each domain is done, and of the
+    number of messages delivered
+    """
+    done = {}
+    lock = threading.Lock()
+    start = time.time()
+
+    def on_result(result, tag):
+        with lock:
+            done[mailRouting.recipient_domain(result.receiver)] = time.time() - start
+
+    dispatcher.on_result = on_result
+    for sender, receiver, message in messages:
+        dispatcher.put(sender, receiver, message)
+    results = dispatcher.close()
+    report = dict(('%s_done_seconds' % domain, round(done.get(domain, 0.), 3))
+                  for domain in DOMAINS)
+    report['seconds'] = round(time.time() - start, 3)
+    report['delivered'] = sum(1 for result in results if result.ok)
+    report['failed'] = sum(1 for result in results if not result.ok)
+    return report
+
+
+def main(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--nb-messages", type=int, default=150)
+    parser.add_argument("-c", "--connections", type=int, default=2)
+    parser.add_argument("--slow-delay", type=float, default=0.1,
+                        help="seconds per message of the slow server")
+    parser.add_argument("--retry-delay", type=float, default=0.5,
+                        help="first retry delay after greylisting")
+    args = parser.parse_args(argv[1:])
+
+    body = "Hello,\nYour mark for Topic1 is 12. Mean is 10, highest grade is 18, " \
+           "lowest grade is 2.\nHave a good day,\n"
+    messages = []
+    for iMessage in range(args.nb_messages):
+        receiver = "student%d@%s" % (iMessage, DOMAINS[iMessage % len(DOMAINS)])
+        messages.append(("teacher@example.org", receiver,
+                         mailU.build_message("teacher@example.org", receiver,
+                                             "Your marks", body)))
+
+    results = {}
+    for name in ('single_queue', 'routed'):
+        servers = [StandinServer(), StandinServer(delay=args.slow_delay),
+                   StandinServer(greylist=True)]
+        routes = mailRouting.parse_routes(
+            ["%s 127.0.0.1:%d" % (domain, server.port())
+             for domain, server in zip(DOMAINS, servers)],
+            '127.0.0.1', default_connections=args.connections)
+        if name == 'single_queue':
+            pools = SinglePathPool(routes)
+            dispatcher = mailDispatch.Dispatcher(pools, workers=args.connections)
+        else:
+            pools = mailRouting.RelayPools(
+                lambda route: mailU.SMTPPool(route.host, route.port, size=route.connections))
+            dispatcher = mailRouting.RoutingDispatcher(routes, pools,
+                                                       delay=args.retry_delay)
+        results[name] = run(dispatcher, messages)
+        pools.close()
+        for server in servers:
+            server.stop()
+
+    print json.dumps(results, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+"""
+Throughput benchmark of the SMTP sending, against a local stand-in SMTP
+server (smtpd) which accepts and drops every message.
+Compares one new SMTP session per message with the SMTPPool.
+
+Call with
+    python benchmarks/bench_smtp.py [-n NB_MESSAGES] [-c CONNECTIONS]
+"""
+
+import os
+import sys
+import time
+import json
+import smtpd
+import smtplib
+import asyncore
+import argparse
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import mailUtils as mailU
+
+
+class SinkServer(smtpd.SMTPServer):
+    """
+    SMTP server accepting every message, and only counting them.
+    """
+
+    def __init__(self, localaddr):
+        smtpd.SMTPServer.__init__(self, localaddr, None)
+        self.nb_received = 0
+        self.running = True
+        self.thread = None
+
+    def process_message(self, peer, mailfrom, rcpttos, data):
+        self.nb_received += 1
+
+    def serve(self):
+        while self.running:
+            asyncore.loop(timeout=0.05, count=1)
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+        asyncore.close_all()
+
+
+def start_sink_server(port=0):
+    """
+    Start a SinkServer in a background thread.
+    ---------------
+    :param port: port to listen to, 0 for any free port
+    :return: the server (its port is server.socket.getsockname()[1])
+    """
+    server = SinkServer(('127.0.0.1', port))
+    server.thread = threading.Thread(target=server.serve)
+    server.thread.daemon = True
+    server.thread.start()
+    return server
+
+
+def bench_one_session_per_message(port, messages):
+    start = time.time()
+    for sender, receiver, message in messages:
+        smtp = smtplib.SMTP('127.0.0.1', port)
+        smtp.sendmail(sender, [receiver], message)
+        smtp.quit()
+    return time.time() - start
+
+
+def bench_pool(port, messages, connections):
+    pool = mailU.SMTPPool('127.0.0.1', port, size=connections)
+    start = time.time()
+    results = pool.send_many(messages)
+    pool.close()
+    duration = time.time() - start
+    assert all(result.ok for result in results)
+    return duration
+
+
+def main(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--nb-messages", type=int, default=500)
+    parser.add_argument("-c", "--connections", type=int, default=2)
+    args = parser.parse_args(argv[1:])
+
+    server = start_sink_server()
+    port = server.socket.getsockname()[1]
+
+    body = "Hello,\nYour mark for Topic1 is 12. Mean is 10, highest grade is 18, " \
+           "lowest grade is 2.\nHave a good day,\n"
+    messages = []
+    for iMessage in range(args.nb_messages):
+        receiver = "student%d@example.org" % iMessage
+        messages.append(("teacher@example.org", receiver,
+                         mailU.build_message("teacher@example.org", receiver,
+                                             "Your marks", body)))
+
+    results = {}
+    duration = bench_one_session_per_message(port, messages)
+    results['one_session_per_message'] = {
+        'seconds': duration, 'messages_per_second': len(messages) / duration}
+    duration = bench_pool(port, messages, args.connections)
+    results['pool'] = {
+        'seconds': duration, 'messages_per_second': len(messages) / duration,
+        'connections': args.connections}
+    server.stop()
+
+    print json.dumps(results, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+"""
+Startup benchmark of the command line: time from the launch of the
+interpreter to the first line printed by marksender.py, for runs which do
+not open the GUI (help, dry-run with a selection expression).
+Also checks which heavy modules (Tkinter, smtplib, email) were imported.
+
+Call with
+    python benchmarks/bench_startup.py [-n REPEAT] [file.csv]
+"""
+
+import os
+import sys
+import time
+import json
+import argparse
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+# runs marksender.main, then reports the heavy modules imported on stderr
+RUNNER = """
+import sys
+sys.path.insert(0, %r)
+import marksender
+code = marksender.main(['marksender.py'] + sys.argv[1:])
+sys.stdout.flush()
+sys.stderr.write(' '.join(name for name in ('Tkinter', 'smtplib', 'email')
+                          if name in sys.modules))
+sys.exit(code)
+"""
+
+
+def time_to_first_output(arguments):
+    """
+    Run marksender once.
+    ---------------
+    :param arguments: command line arguments of marksender
+    :return: (time to the first line of output, total time, heavy modules
+    imported)
+    """
+    start = time.time()
+    process = subprocess.Popen([sys.executable, '-c', RUNNER % ROOT] + arguments,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    process.stdout.readline()
+    first = time.time() - start
+    process.stdout.read()
+    modules = process.stderr.read().split()
+    process.wait()
+    return first, time.time() - start, modules
+
+
+def main(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input_file_path", metavar="file", nargs="?",
+                        default=os.path.join(ROOT, "test_marks.csv"),
+                        help="csv input file (default: test_marks.csv)")
+    parser.add_argument("-n", "--repeat", type=int, default=10,
+                        help="number of runs per case (default: %(default)s)")
+    args = parser.parse_args(argv[1:])
+
+    cases = [
+        ("help", ["-h"]),
+        ("dry_run_select", ["--dry-run", "--select", "where mark<30",
+                            args.input_file_path]),
+    ]
+    results = {"python": sys.version.split()[0], "repeat": args.repeat}
+    for name, arguments in cases:
+        firsts, totals = [], []
+        for iRun in range(args.repeat):
+            first, total, modules = time_to_first_output(arguments)
+            firsts.append(first)
+            totals.append(total)
+        results[name] = {
+            "first_output_min_s": min(firsts),
+            "first_output_median_s": sorted(firsts)[len(firsts) // 2],
+            "total_median_s": sorted(totals)[len(totals) // 2],
+            "heavy_modules": modules,
+        }
+    print json.dumps(results, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
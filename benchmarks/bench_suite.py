@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+"""
+Benchmark suite on synthetic mark sheets (see sheet_generator), covering the
+whole program:
+    parse: build_list_dic, unsorted and sorted
+    selection: SelectionModel construction, and the operations behind the
+        clicks of the GUI (single cell, student, topic, rectangle, ALL, Reset)
+    gui: construction of the window and of the SelectionGrid, and the click
+        handlers with the redraw. Skipped when there is no display (run it
+        under Xvfb, e.g. xvfb-run python benchmarks/bench_suite.py)
+    statistics: statistics of all the topics (see markStats), percentile
+        lookups and single cell updates
+    render: build_body for a few students, MailTemplate.render for all
+    send: build_message and the Dispatcher, against a fake pool
+The results are printed (or written) as JSON, the best time of each case over
+the repetitions, in seconds.
+
+Call with
+    python benchmarks/bench_suite.py [-s STUDENTS] [-t TOPICS] [-e EMPTY]
+        [--empty-students N] [--empty-topics N] [-r REPEAT] [-o results.json]
+"""
+
+import os
+import sys
+import time
+import json
+import argparse
+import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from sheet_generator import generate_sheet
+from retrieve_marks import build_list_dic
+from SelectionModel import SelectionModel
+from markStats import MarkStatistics
+import mailUtils as mailU
+import mailDispatch
+
+
+class FakePool(object):
+    """
+    Stands for mailUtils.SMTPPool: accepts every message without sending it.
+    """
+
+    def __init__(self):
+        self.nb_sent = 0
+
+    def send(self, sender, receiver, message):
+        self.nb_sent += 1
+        return mailU.SendResult(receiver, True, None, 1)
+
+
+class FakeEvent(object):
+    """
+    Mouse event, for the click handlers of the SelectionGrid.
+    """
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+
+def best_time(function, repeat, setup=None):
+    """
+    Best time of several runs of a function.
+    ---------------
+    :param function: function to time, called with the result of setup
+    :param repeat: number of runs
+    :param setup: function called before each run (not timed), None if no setup
+    :return: best time, in seconds
+    """
+    best = None
+    for iRun in range(repeat):
+        argument = setup() if setup is not None else None
+        start = time.time()
+        if setup is not None:
+            function(argument)
+        else:
+            function()
+        duration = time.time() - start
+        if best is None or duration < best:
+            best = duration
+    return best
+
+
+def bench_parse(sheet, repeat):
+    results = {}
+    for name, sort in (("unsorted", False), ("sorted", True)):
+        results[name] = best_time(
+            lambda: build_list_dic(StringIO.StringIO(sheet), sort, sort), repeat)
+    return results
+
+
+def bench_selection(table, topic_list, student_list, repeat):
+    def new_model():
+        return SelectionModel(student_list, topic_list, table)
+
+    def new_full_model():
+        selection = new_model()
+        selection.select_all()
+        return selection
+
+    iStudent = len(student_list) // 2
+    iTopic = len(topic_list) // 2
+    last_student = min(len(student_list), 100) - 1
+    last_topic = min(len(topic_list), 20) - 1
+    return {
+        "construction": best_time(new_model, repeat),
+        "single_click": best_time(
+            lambda selection: selection.set_single(iStudent, iTopic, True),
+            repeat, new_model),
+        "student_click": best_time(
+            lambda selection: selection.set_student(iStudent, True),
+            repeat, new_model),
+        "topic_click": best_time(
+            lambda selection: selection.set_topic(iTopic, True),
+            repeat, new_model),
+        "rectangle_100x20": best_time(
+            lambda selection: selection.set_rect(0, last_student, 0, last_topic, True),
+            repeat, new_model),
+        "select_all": best_time(lambda selection: selection.select_all(),
+                                repeat, new_model),
+        "reset": best_time(lambda selection: selection.reset(),
+                           repeat, new_full_model),
+    }
+
+
+def bench_gui(table, topic_list, student_list, repeat):
+    """
+    :return: timings, None if no display is available
+    """
+    import Tkinter as tk
+    from SelectionGrid import SelectionGrid
+    try:
+        tk.Tk().destroy()
+    except tk.TclError:
+        return None
+
+    def build():
+        window = tk.Tk()
+        selection = SelectionModel(student_list, topic_list, table)
+        grid = SelectionGrid(window, selection, student_list, topic_list)
+        grid.grid(row=1, column=0, sticky='nsew')
+        window.update()
+        return window, grid
+
+    def build_and_destroy():
+        build()[0].destroy()
+
+    def click(handler):
+        def run(built):
+            window, grid = built
+            handler(grid)
+            window.update()
+            window.destroy()
+        return run
+
+    event = FakeEvent(1, 1)
+    return {
+        "construction": best_time(build_and_destroy, repeat),
+        "single_click": best_time(click(lambda grid: grid.on_cell_click(event)),
+                                  repeat, build),
+        "student_click": best_time(click(lambda grid: grid.on_student_click(event)),
+                                   repeat, build),
+        "topic_click": best_time(click(lambda grid: grid.on_topic_click(event)),
+                                 repeat, build),
+    }
+
+
+def bench_statistics(table, repeat):
+    statistics = MarkStatistics(table)
+    marks = [table.mark(iStudent, 0) for iStudent in range(table.nb_student)
+             if table.has_mark(iStudent, 0)]
+
+    def update_cells():
+        # move each mark up and back
+        for mark in marks[:1000]:
+            statistics.update_cell(0, mark, mark + 1.)
+            statistics.update_cell(0, mark + 1., mark)
+
+    return {
+        "compute": best_time(lambda: MarkStatistics(table), repeat),
+        "percentile_column": best_time(
+            lambda: map(statistics.topic(0).percentile, marks), repeat),
+        "update_2000_cells": best_time(update_cells, repeat),
+    }
+
+
+def bench_render(table, topic_list, student_list, repeat):
+    selection = SelectionModel(student_list, topic_list, table)
+    selection.select_all()
+    nb_student = len(student_list)
+    few = range(min(nb_student, 100))
+
+    def render_all():
+        template = mailU.MailTemplate().prepare(table, topic_list)
+        for iStudent in range(nb_student):
+            template.render(iStudent, selection)
+
+    return {
+        "build_body_100": best_time(
+            lambda: [mailU.build_body(iStudent, topic_list, table, selection)
+                     for iStudent in few], repeat),
+        "template_all": best_time(render_all, repeat),
+    }
+
+
+def bench_send(table, topic_list, student_list, repeat):
+    selection = SelectionModel(student_list, topic_list, table)
+    selection.select_all()
+    template = mailU.MailTemplate().prepare(table, topic_list)
+    bodies = []
+    for iStudent in range(len(student_list)):
+        body = template.render(iStudent, selection)
+        if body != "" and table.email(iStudent) != "":
+            bodies.append((table.email(iStudent), body))
+
+    def send_loop():
+        dispatcher = mailDispatch.Dispatcher(FakePool(), workers=2)
+        for receiver, body in bodies:
+            message = mailU.build_message("teacher@example.org", receiver,
+                                          "Your marks", body)
+            dispatcher.put("teacher@example.org", receiver, message)
+        dispatcher.close()
+
+    duration = best_time(send_loop, repeat)
+    return {"send_loop": duration, "nb_messages": len(bodies),
+            "messages_per_second": len(bodies) / duration if duration else None}
+
+
+def main(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-s", "--students", type=int, default=1000)
+    parser.add_argument("-t", "--topics", type=int, default=50)
+    parser.add_argument("-e", "--empty-fraction", type=float, default=0.1,
+                        help="fraction of empty cells (default: %(default)s)")
+    parser.add_argument("--empty-students", type=int, default=0,
+                        help="number of student lines without name")
+    parser.add_argument("--empty-topics", type=int, default=0,
+                        help="number of topic columns without header")
+    parser.add_argument("-r", "--repeat", type=int, default=3,
+                        help="number of runs per case (default: %(default)s)")
+    parser.add_argument("-o", "--output", metavar="FILE",
+                        help="write the results to this file instead of printing them")
+    args = parser.parse_args(argv[1:])
+
+    sheet_file = StringIO.StringIO()
+    generate_sheet(sheet_file, args.students, args.topics, args.empty_fraction,
+                   args.empty_students, args.empty_topics)
+    sheet = sheet_file.getvalue()
+    table, topic_list, student_list = build_list_dic(StringIO.StringIO(sheet),
+                                                     False, False)
+
+    results = {
+        "parameters": {
+            "students": args.students, "topics": args.topics,
+            "empty_fraction": args.empty_fraction,
+            "empty_students": args.empty_students,
+            "empty_topics": args.empty_topics,
+            "repeat": args.repeat, "sheet_bytes": len(sheet),
+            "storage": type(table).__name__,
+            "python": sys.version.split()[0],
+        },
+        "parse": bench_parse(sheet, args.repeat),
+        "selection": bench_selection(table, topic_list, student_list, args.repeat),
+        "gui": bench_gui(table, topic_list, student_list, args.repeat),
+        "statistics": bench_statistics(table, args.repeat),
+        "render": bench_render(table, topic_list, student_list, args.repeat),
+        "send": bench_send(table, topic_list, student_list, args.repeat),
+    }
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(output + "\n")
+    else:
+        print output
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+"""
+Generator of synthetic mark sheets, with the layout described in the README:
+a header line (Name;Surname;mail;topics...), the Mean, Highest and Lowest
+lines, then one line per student. Some cells can be left empty, as well as
+some student names and topic headers.
+
+Call with
+    python benchmarks/sheet_generator.py -s 1000 -t 50 -e 0.1 output.csv
+"""
+
+import sys
+import random
+import argparse
+
+
+def generate_sheet(output_file, nb_student, nb_topic, empty_fraction=0.1,
+                   nb_empty_student=0, nb_empty_topic=0, seed=0):
+    """
+    Write a synthetic mark sheet.
+    ---------------
+    :param output_file: file object to write to
+    :param nb_student: number of student lines
+    :param nb_topic: number of topic columns
+    :param empty_fraction: fraction of empty mark cells
+    :param nb_empty_student: number of student lines without name
+    :param nb_empty_topic: number of topic columns without header
+    :param seed: seed of the random generator, for reproducible sheets
+    """
+
+    generator = random.Random(seed)
+    empty_students = set(generator.sample(range(nb_student),
+                                          min(nb_empty_student, nb_student)))
+    empty_topics = set(generator.sample(range(nb_topic),
+                                        min(nb_empty_topic, nb_topic)))
+
+    columns = []
+    for iTopic in range(nb_topic):
+        column = [None if generator.random() < empty_fraction
+                  else round(generator.uniform(0, 20), generator.choice((0, 1)))
+                  for iStudent in range(nb_student)]
+        columns.append(column)
+
+    def mark_text(mark):
+        return "" if mark is None else "%g" % mark
+
+    header = ["Name", "Surname", "mail"]
+    header += ["" if iTopic in empty_topics else "Topic%d" % iTopic
+               for iTopic in range(nb_topic)]
+    output_file.write(";".join(header) + "\n")
+
+    means, highests, lowests = [], [], []
+    for column in columns:
+        marks = [mark for mark in column if mark is not None]
+        means.append(sum(marks) / len(marks) if marks else None)
+        highests.append(max(marks) if marks else None)
+        lowests.append(min(marks) if marks else None)
+    for label, values in (("Mean", means), ("Highest", highests),
+                          ("Lowest", lowests)):
+        output_file.write(";".join([label, "", ""] + map(mark_text, values)) + "\n")
+
+    for iStudent in range(nb_student):
+        if iStudent in empty_students:
+            line = ["", "", ""]
+        else:
+            line = ["Student%d" % iStudent, "s%d" % iStudent,
+                    "student%d@example.org" % iStudent]
+        line += [mark_text(column[iStudent]) for column in columns]
+        output_file.write(";".join(line) + "\n")
+
+
+def main(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("output_file_path", metavar="file",
+                        help="csv file to write")
+    parser.add_argument("-s", "--students", type=int, default=1000)
+    parser.add_argument("-t", "--topics", type=int, default=50)
+    parser.add_argument("-e", "--empty-fraction", type=float, default=0.1,
+                        help="fraction of empty cells (default: %(default)s)")
+    parser.add_argument("--empty-students", type=int, default=0,
+                        help="number of student lines without name")
+    parser.add_argument("--empty-topics", type=int, default=0,
+                        help="number of topic columns without header")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv[1:])
+
+    with open(args.output_file_path, 'w') as output_file:
+        generate_sheet(output_file, args.students, args.topics,
+                       args.empty_fraction, args.empty_students,
+                       args.empty_topics, args.seed)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+"""
+Concurrent dispatch of the mails, with rate limiting and backpressure.
+
+The messages are rendered by the caller (producer) and put in a bounded queue.
+N worker threads take them from the queue and send them, each through its own
+connection of an SMTPPool (see mailUtils). A token bucket limits the number
+of messages sent per second, to respect the quotas of the relay.
+When the relay is slow, the queue fills up and put() blocks: the rendering is
+throttled instead of accumulating messages in memory.
+An unexpected error while sending a message (or while reporting its result)
+does not stop the worker: the message is reported as failed, so that the
+queue keeps being emptied and close() returns.
+"""
+
+import time
+import threading
+import Queue
+import profiling
+from mailUtils import SendResult
+
+
+class TokenBucket(object):
+    """
+    Thread-safe token bucket: allows rate operations per second on average,
+    with bursts of at most burst operations.
+    """
+
+    def __init__(self, rate, burst=None):
+        """
+        ---------------
+        :param rate: number of tokens added per second
+        :param burst: maximal number of tokens stored (default: 1, i.e.
+        regularly spaced operations)
+        """
+        self.rate = float(rate)
+        self.burst = max(burst or 1, 1)
+        self.tokens = self.burst
+        self.last = time.time()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Take a token, waiting for it if needed.
+        """
+        while True:
+            with self.lock:
+                now = time.time()
+                self.tokens = min(self.burst,
+                                  self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class Dispatcher(object):
+    """
+    Worker threads sending the messages of a bounded queue through a pool.
+    """
+
+    def __init__(self, pool, workers=2, rate=None, queue_size=100,
+                 on_result=None):
+        """
+        ---------------
+        :param pool: mailUtils.SMTPPool (or any object with a send(sender,
+        receiver, message) method returning a mailUtils.SendResult)
+        :param workers: number of worker threads, i.e. of concurrent sessions
+        :param rate: maximal number of messages per second, None for no limit
+        :param queue_size: maximal number of messages waiting to be sent
+        :param on_result: function called (from the worker threads) with each
+        SendResult and the tag given to put
+        """
+
+        self.pool = pool
+        self.bucket = TokenBucket(rate) if rate else None
+        self.queue = Queue.Queue(maxsize=queue_size)
+        self.on_result = on_result
+        self.results = []
+        self.results_lock = threading.Lock()
+        self.threads = [threading.Thread(target=self._work)
+                        for iWorker in range(workers)]
+        for thread in self.threads:
+            thread.daemon = True
+            thread.start()
+
+    def _work(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            sender, receiver, message, tag = job
+            try:
+                if self.bucket is not None:
+                    self.bucket.acquire()
+                start = time.time()
+                result = self.pool.send(sender, receiver, message)
+                profiling.observe('send_ms', (time.time() - start) * 1000)
+                profiling.count('send_retries', result.attempts - 1)
+            except Exception, error:
+                result = SendResult(receiver, False, str(error), 1)
+            if result.ok:
+                profiling.count('bytes_sent', len(message))
+            if self.on_result is not None:
+                try:
+                    self.on_result(result, tag)
+                except Exception, error:
+                    # e.g. the journal cannot be written: the message is
+                    # counted as failed, even if it was delivered
+                    result = SendResult(receiver, False, str(error), result.attempts)
+            with self.results_lock:
+                self.results.append(result)
+
+    def put(self, sender, receiver, message, tag=None):
+        """
+        Queue a message. Blocks while the queue is full.
+        ---------------
+        :param sender: mail address of the sender (envelope)
+        :param receiver: mail address of the receiver (envelope)
+        :param message: full message (see mailUtils.build_message)
+        :param tag: any value given back to on_result with the result
+        """
+        self.queue.put((sender, receiver, message, tag))
+
+    def close(self):
+        """
+        Wait for all the queued messages to be sent, and stop the workers.
+        ---------------
+        :return: list of the SendResult, in the order they were sent
+        """
+        for thread in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        return self.results
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+"""
+Crash-safe journal of the mails sent, to resume an interrupted run.
+
+The journal is an append-only text file, one line per delivery attempt:
+    status <tab> key <tab> receiver <tab> topics
+where status is 'sent' or 'failed', and key identifies the message: hash of
+the receiver, of the topics sent and of the body (see message_key). Sending
+the same marks to the same student gives the same key, so that a resumed run
+can skip the messages already delivered, while a changed mark is sent again.
+
+The lines are flushed and fsync'd to the disk every sync_every records (and
+when closing): after a crash, at most the last batch is lost, and a truncated
+last line is ignored when reading.
+"""
+
+import os
+import hashlib
+import threading
+
+SENT = 'sent'
+FAILED = 'failed'
+
+
+def message_key(receiver, topics, body):
+    """
+    Identifier of a message.
+    ---------------
+    :param receiver: mail address of the receiver
+    :param topics: list of the names of the topics sent
+    :param body: body of the mail
+    :return: hexadecimal hash
+    """
+    content = hashlib.sha1()
+    content.update(receiver)
+    content.update('\0')
+    content.update('\x1f'.join(topics))
+    content.update('\0')
+    content.update(body)
+    return content.hexdigest()
+
+
+def read_journal(path):
+    """
+    Read the status of the messages recorded in a journal.
+    ---------------
+    :param path: path of the journal file
+    :return: dictionary key -> last status recorded ({} if no journal yet)
+    """
+    status = {}
+    try:
+        journal_file = open(path, 'r')
+    except IOError:
+        return status
+    with journal_file:
+        for line in journal_file:
+            # a line without end was being written during a crash
+            if not line.endswith('\n'):
+                break
+            fields = line.rstrip('\n').split('\t')
+            if len(fields) < 2:
+                continue
+            status[fields[1]] = fields[0]
+    return status
+
+
+class SendJournal(object):
+    """
+    Append-only journal of the mails sent. Can be used from several threads.
+    """
+
+    def __init__(self, path, sync_every=50):
+        """
+        ---------------
+        :param path: path of the journal file, created if needed
+        :param sync_every: number of records between two syncs to the disk
+        """
+        self.path = path
+        self.sync_every = sync_every
+        self.journal_file = open(path, 'a+')
+        # end a line truncated by a crash, so that it is not merged with the
+        # first new record
+        self.journal_file.seek(0, os.SEEK_END)
+        if self.journal_file.tell() > 0:
+            self.journal_file.seek(-1, os.SEEK_END)
+            if self.journal_file.read(1) != '\n':
+                self.journal_file.seek(0, os.SEEK_END)
+                self.journal_file.write('\n')
+        self.nb_unsynced = 0
+        self.lock = threading.Lock()
+
+    def delivered(self):
+        """
+        :return: set of the keys of the messages already delivered
+        """
+        return set(key for key, status in read_journal(self.path).iteritems()
+                   if status == SENT)
+
+    def record(self, key, receiver, topics, status):
+        """
+        Record the status of a message.
+        ---------------
+        :param key: message key (see message_key)
+        :param receiver: mail address of the receiver
+        :param topics: list of the names of the topics sent
+        :param status: SENT or FAILED
+        """
+        line = '\t'.join((status, key, receiver, ','.join(topics))) + '\n'
+        with self.lock:
+            self.journal_file.write(line)
+            self.nb_unsynced += 1
+            if self.nb_unsynced >= self.sync_every:
+                self._sync()
+
+    def _sync(self):
+        self.journal_file.flush()
+        os.fsync(self.journal_file.fileno())
+        self.nb_unsynced = 0
+
+    def close(self):
+        with self.lock:
+            self._sync()
+            self.journal_file.close()
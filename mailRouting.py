@@ -0,0 +1,450 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+"""
+Routing of the mails by recipient domain, each domain with its own relay,
+concurrency and retry queue.
+
+With a single queue, one slow or greylisting domain holds the workers and
+stalls the whole batch. RoutingDispatcher has the interface of
+mailDispatch.Dispatcher (put, close), but groups the messages by domain of
+the recipient address: each domain has its own queue and its own retry
+heap. Each route has one SMTP pool to its relay, shared by all its domains
+(e.g. all the domains of the * route), and at most its number of
+connections of worker threads, started when the route has messages and
+stopped when it has none. The workers of a route serve first the domains
+with the fewest messages being sent, and a single domain never has more
+than the per-domain connections of its route being sent at the same time:
+a slow or greylisting domain does not hold all the sessions of its route
+while other domains are waiting, and the domains of the other routes are
+not delayed at all. put never waits for a domain: the messages are queued
+without limit (the batch is rendered anyway).
+
+Messages refused with a temporary error (4xx answer, e.g. greylisting, or
+relay unreachable) are put back in the retry heap of their domain, to be
+tried again after an exponential backoff (delay, 2 x delay, 4 x delay...,
+at most max_delay) up to max_retries times. The other domains keep going
+meanwhile.
+
+The relay map file has one line per domain:
+    domain  host[:port]  [connections  [per-domain connections]]
+The domain * is the route of all the other domains (default: the SMTP server
+of the command line). The subdomains of a domain use its route, unless they
+have their own line. The per-domain connections default to the connections
+of the route, except for the * route, shared by many domains: half of its
+connections (at least 1). Empty lines and lines starting with # are
+ignored, e.g.
+    # university mails through the internal relay, 4 sessions
+    u-psud.fr       smtp.u-psud.fr      4
+    gmail.com       relay.example.org:587 1
+    # at most 2 of the 6 sessions for each other domain
+    *               localhost:25        6 2
+"""
+
+import time
+import heapq
+import threading
+import collections
+import profiling
+from mailUtils import SendResult
+from mailDispatch import TokenBucket
+
+# route of the mails of a domain
+Route = collections.namedtuple('Route',
+                               'domain host port connections domain_connections')
+
+DEFAULT_DOMAIN = '*'
+
+
+def parse_routes(lines, default_host, default_port=25, default_connections=2):
+    """
+    Read a relay map.
+    ---------------
+    :param lines: lines of the relay map file
+    :param default_host: relay of the domains without route, unless given by
+    the * line
+    :param default_port: port of the relays without port
+    :param default_connections: concurrency of the routes without connections
+    (see the module documentation for the per-domain connections)
+    :return: dictionary domain -> Route, with the * domain
+    :raise ValueError: if a line is not valid
+    """
+    routes = {}
+    for iLine, line in enumerate(lines, 1):
+        fields = line.split()
+        if not fields or fields[0].startswith('#'):
+            continue
+        if len(fields) not in (2, 3, 4):
+            raise ValueError("line %d: expected 'domain host[:port] [connections "
+                             "[per-domain connections]]'" % iLine)
+        domain = fields[0].lower().lstrip('@')
+        host, separator, port = fields[1].rpartition(':')
+        if not separator:
+            host, port = port, default_port
+        connections = default_connections
+        domain_connections = None
+        try:
+            port = int(port)
+            if len(fields) >= 3:
+                connections = int(fields[2])
+            if len(fields) == 4:
+                domain_connections = int(fields[3])
+        except ValueError:
+            raise ValueError("line %d: port and connections must be numbers" % iLine)
+        if connections < 1:
+            raise ValueError("line %d: at least 1 connection is needed" % iLine)
+        if domain_connections is None:
+            domain_connections = default_domain_connections(domain, connections)
+        elif not 1 <= domain_connections <= connections:
+            raise ValueError("line %d: the per-domain connections must be between 1 "
+                             "and the connections of the route" % iLine)
+        if domain in routes:
+            raise ValueError("line %d: second route for %s" % (iLine, domain))
+        routes[domain] = Route(domain, host, port, connections, domain_connections)
+    if DEFAULT_DOMAIN not in routes:
+        routes[DEFAULT_DOMAIN] = Route(
+            DEFAULT_DOMAIN, default_host, default_port, default_connections,
+            default_domain_connections(DEFAULT_DOMAIN, default_connections))
+    return routes
+
+
+def default_domain_connections(domain, connections):
+    """
+    :return: number of messages of a single domain sent at the same time on a
+    route without per-domain connections: all the connections, half of them
+    for the * route
+    """
+    if domain == DEFAULT_DOMAIN:
+        return max(1, connections // 2)
+    return connections
+
+
+def recipient_domain(address):
+    """
+    :return: domain of a mail address, lower case
+    """
+    return address.rpartition('@')[2].strip().lower()
+
+
+def find_route(routes, domain):
+    """
+    :return: route of a domain: its own, the one of its closest parent domain,
+    or the default one
+    """
+    while domain:
+        if domain in routes:
+            return routes[domain]
+        domain = domain.partition('.')[2]
+    return routes[DEFAULT_DOMAIN]
+
+
+class RelayPools(object):
+    """
+    SMTP pools of the routes, opened when first needed: one per route, shared
+    by all the domains of the route.
+    """
+
+    def __init__(self, open_pool):
+        """
+        ---------------
+        :param open_pool: function returning a new pool (mailUtils.SMTPPool)
+        for a Route, with route.connections connections
+        """
+        self.open_pool = open_pool
+        self.pools = {}
+        self.lock = threading.Lock()
+
+    def pool(self, route):
+        """
+        :return: the pool of a route
+        """
+        with self.lock:
+            pool = self.pools.get(route)
+            if pool is None:
+                pool = self.pools[route] = self.open_pool(route)
+            return pool
+
+    def close(self):
+        """
+        Close the idle connections of all the pools.
+        """
+        for pool in self.pools.values():
+            pool.close()
+
+
+class DomainQueue(object):
+    """
+    Messages of a domain: queue of the ones to send, heap of the ones to try
+    again later, number of messages being sent. Guarded by the condition of
+    the RouteQueue of the domain.
+    """
+
+    def __init__(self, domain):
+        self.domain = domain
+        self.ready = collections.deque()
+        # (time of the next attempt, sequence number, job)
+        self.retries = []
+        self.nb_active = 0
+        # in the ready domains of the route
+        self.listed = False
+
+
+class RouteQueue(object):
+    """
+    Worker threads of a route: at most route.connections, started when the
+    route has messages and stopped when it has none, sharing the pool of the
+    route. Each worker takes the next message of the domain with the fewest
+    messages being sent (the first one in turn among the equal ones), among
+    the domains with less than route.domain_connections messages being sent,
+    so that a slow domain does not hold all the sessions while the other
+    domains wait.
+    """
+
+    def __init__(self, dispatcher, route):
+        self.dispatcher = dispatcher
+        self.route = route
+        self.pool = dispatcher.pools.pool(route)
+        self.domains = {}
+        # domains with messages ready to be sent, in turn
+        self.ready_domains = collections.deque()
+        # domains with messages to try again later
+        self.retrying = set()
+        self.nb_workers = 0
+        # threads of the workers, joined by wait once they stopped
+        self.threads = []
+        self.condition = threading.Condition()
+
+    def _list(self, queue):
+        if not queue.listed:
+            queue.listed = True
+            self.ready_domains.append(queue)
+
+    def put(self, domain, job):
+        """
+        Queue a message of a domain, and start a worker if the route has less
+        than its number of connections.
+        """
+        with self.condition:
+            queue = self.domains.get(domain)
+            if queue is None:
+                queue = self.domains[domain] = DomainQueue(domain)
+                profiling.count('domains')
+            queue.ready.append(job)
+            self._list(queue)
+            # a domain at its limit is served by its own workers once they
+            # are done
+            if self.nb_workers < self.route.connections \
+            and queue.nb_active < self.route.domain_connections:
+                self.nb_workers += 1
+                thread = threading.Thread(target=self._work)
+                thread.daemon = True
+                thread.start()
+                self.threads = [thread for thread in self.threads if thread.is_alive()]
+                self.threads.append(thread)
+            else:
+                self.condition.notify()
+
+    def _pick(self):
+        """
+        :return: the ready domain with the fewest messages being sent, None if
+        no domain is ready (or all the ready ones are at their limit)
+        """
+        limit = self.route.domain_connections
+        best = None
+        for queue in self.ready_domains:
+            if queue.nb_active >= limit:
+                continue
+            if best is None or queue.nb_active < best.nb_active:
+                best = queue
+                if best.nb_active == 0:
+                    break
+        return best
+
+    def _next_job(self):
+        """
+        :return: domain queue and next job to send, None when the route has
+        nothing left to send (the worker then stops)
+        """
+        with self.condition:
+            while True:
+                # the retries which are due are ready again
+                now = time.time()
+                next_retry = None
+                for queue in list(self.retrying):
+                    while queue.retries and queue.retries[0][0] <= now:
+                        queue.ready.append(heapq.heappop(queue.retries)[2])
+                        self._list(queue)
+                    if queue.retries:
+                        next_retry = min(next_retry or queue.retries[0][0], queue.retries[0][0])
+                    else:
+                        self.retrying.discard(queue)
+                queue = self._pick()
+                if queue is not None:
+                    job = queue.ready.popleft()
+                    queue.nb_active += 1
+                    # its turn is over
+                    self.ready_domains.remove(queue)
+                    queue.listed = False
+                    if queue.ready:
+                        self._list(queue)
+                    return queue, job
+                if next_retry is None:
+                    # the domains at their limit have a worker sending their
+                    # messages, which takes their next ones
+                    self.nb_workers -= 1
+                    self.condition.notify_all()
+                    return None
+                self.condition.wait(next_retry - now)
+
+    def _work(self):
+        # the worker is counted out by _next_job when it stops normally, here
+        # on an unexpected error: wait and close do not wait for it forever
+        stopped = False
+        try:
+            while True:
+                next_job = self._next_job()
+                if next_job is None:
+                    stopped = True
+                    return
+                self._send(*next_job)
+        finally:
+            if not stopped:
+                with self.condition:
+                    self.nb_workers -= 1
+                    self.condition.notify_all()
+
+    def _send(self, queue, job):
+        """
+        Send a message of a domain, defer it after a temporary error or
+        report its result.
+        """
+        dispatcher = self.dispatcher
+        sender, receiver, message, tag, nb_attempts, nb_deferrals = job
+        try:
+            if dispatcher.bucket is not None:
+                dispatcher.bucket.acquire()
+            start = time.time()
+            result = self.pool.send(sender, receiver, message)
+            profiling.observe('send_ms', (time.time() - start) * 1000)
+            profiling.count('send_retries', result.attempts - 1)
+        except Exception, error:
+            result = SendResult(receiver, False, str(error), 1)
+        nb_attempts += result.attempts
+        deferred = not result.ok and result.temporary \
+            and nb_deferrals < dispatcher.max_retries
+        with self.condition:
+            queue.nb_active -= 1
+            if deferred:
+                # try again later, the other messages go on meanwhile
+                delay = min(dispatcher.delay * 2 ** nb_deferrals, dispatcher.max_delay)
+                heapq.heappush(queue.retries, (time.time() + delay, dispatcher.sequence(),
+                                               (sender, receiver, message, tag,
+                                                nb_attempts, nb_deferrals + 1)))
+                self.retrying.add(queue)
+            # a worker waiting for a retry may take the next message of the
+            # domain
+            self.condition.notify()
+        if deferred:
+            profiling.count('send_deferred')
+            return
+        if result.ok:
+            profiling.count('bytes_sent', len(message))
+        dispatcher.report(result._replace(attempts=nb_attempts), tag)
+
+    def wait(self):
+        """
+        Wait for all the messages of the route to be sent (or given up).
+        """
+        with self.condition:
+            while self.nb_workers:
+                self.condition.wait()
+            threads = self.threads
+            self.threads = []
+        # the last workers are counted out just before they return
+        for thread in threads:
+            thread.join()
+
+
+class RoutingDispatcher(object):
+    """
+    Dispatch of the messages to one queue per recipient domain (see the
+    module documentation). Same interface as mailDispatch.Dispatcher.
+    """
+
+    def __init__(self, routes, pools, rate=None, max_retries=5, delay=60.,
+                 max_delay=900., on_result=None):
+        """
+        ---------------
+        :param routes: dictionary domain -> Route (see parse_routes)
+        :param pools: RelayPools opening the pool of each route
+        :param rate: maximal number of messages per second (all domains),
+        None for no limit
+        :param max_retries: number of new attempts after temporary errors
+        :param delay: wait before the first new attempt, in seconds (doubled
+        at each new attempt)
+        :param max_delay: maximal wait between two attempts, in seconds
+        :param on_result: function called (from the worker threads) with each
+        SendResult and the tag given to put
+        """
+
+        self.routes = routes
+        self.pools = pools
+        self.bucket = TokenBucket(rate) if rate else None
+        self.max_retries = max_retries
+        self.delay = delay
+        self.max_delay = max_delay
+        self.on_result = on_result
+        # route of each domain seen, queue of each route used
+        self.domain_routes = {}
+        self.route_queues = {}
+        self.results = []
+        self.results_lock = threading.Lock()
+        self._sequence = 0
+
+    def sequence(self):
+        """
+        :return: increasing number, to keep the retries of the same time in
+        order
+        """
+        with self.results_lock:
+            self._sequence += 1
+            return self._sequence
+
+    def put(self, sender, receiver, message, tag=None):
+        """
+        Queue a message in the queue of its domain. Does not block.
+        ---------------
+        :param sender: mail address of the sender (envelope)
+        :param receiver: mail address of the receiver (envelope)
+        :param message: full message (see mailUtils.build_message)
+        :param tag: any value given back to on_result with the result
+        """
+        domain = recipient_domain(receiver)
+        route = self.domain_routes.get(domain)
+        if route is None:
+            route = self.domain_routes[domain] = find_route(self.routes, domain)
+        queue = self.route_queues.get(route)
+        if queue is None:
+            queue = self.route_queues[route] = RouteQueue(self, route)
+        queue.put(domain, (sender, receiver, message, tag, 0, 0))
+
+    def report(self, result, tag):
+        if self.on_result is not None:
+            try:
+                self.on_result(result, tag)
+            except Exception, error:
+                # e.g. the journal cannot be written: the message is counted
+                # as failed, even if it was delivered
+                result = SendResult(result.receiver, False, str(error), result.attempts)
+        with self.results_lock:
+            self.results.append(result)
+
+    def close(self):
+        """
+        Wait for all the queued messages to be sent (or given up).
+        ---------------
+        :return: list of the SendResult, in the order they were sent
+        """
+        for queue in self.route_queues.values():
+            queue.wait()
+        return self.results
@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+"""
+Spools: write the full messages (see mailUtils.build_message) to files
+instead of sending them, to check them or to deliver them later with another
+program. Three formats:
+    MaildirSpool: one file per message in the new/ directory of a Maildir
+    EmlSpool: one .eml file per message in a directory
+    MboxSpool: all the messages appended to a single mbox file
+The spools have the send and close methods of mailUtils.SMTPPool, so that
+they can be used by a mailDispatch.Dispatcher in place of the SMTP pool.
+
+Each Maildir or .eml message is written in a single write to a temporary
+file, then renamed: a reader of the spool never sees a partial message.
+Each mbox message is appended and flushed before send returns, so that a
+message reported as sent (and recorded in the journal) is in the file; a
+message which could not be completely written is removed from the file.
+"""
+
+import os
+import re
+import time
+import socket
+import threading
+import itertools
+from mailUtils import SendResult
+
+# lines of the body starting with "From " (possibly already quoted) must be
+# quoted in a mbox (mboxrd convention)
+FROM_LINE_PATTERN = re.compile(r'^(>*From )', re.MULTILINE)
+
+
+def _write_atomic(directory, temporary_name, final_path, message):
+    """
+    Write a message to a temporary file and rename it.
+    ---------------
+    :param directory: directory of the temporary file
+    :param temporary_name: name of the temporary file
+    :param final_path: path of the file once complete
+    :param message: content of the file
+    """
+    temporary_path = os.path.join(directory, temporary_name)
+    descriptor = os.open(temporary_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0600)
+    try:
+        written = 0
+        while written < len(message):
+            written += os.write(descriptor, message[written:])
+    finally:
+        os.close(descriptor)
+    os.rename(temporary_path, final_path)
+
+
+class MaildirSpool(object):
+    """
+    Messages delivered to a Maildir (tmp/, new/, cur/ directories).
+    """
+
+    def __init__(self, path):
+        """
+        ---------------
+        :param path: Maildir directory, created if needed
+        """
+        self.path = path
+        for directory in ('tmp', 'new', 'cur'):
+            if not os.path.isdir(os.path.join(path, directory)):
+                os.makedirs(os.path.join(path, directory))
+        self.hostname = socket.gethostname().replace('/', '\\057').replace(':', '\\072')
+        self.counter = itertools.count()
+
+    def send(self, sender, receiver, message):
+        """
+        Write a message.
+        ---------------
+        :return: SendResult
+        """
+        now = time.time()
+        name = '%d.M%dP%dQ%d.%s' % (now, (now % 1) * 1e6, os.getpid(),
+                                   next(self.counter), self.hostname)
+        try:
+            _write_atomic(os.path.join(self.path, 'tmp'), name,
+                          os.path.join(self.path, 'new', name), message)
+        except (IOError, OSError), error:
+            return SendResult(receiver, False, str(error), 1)
+        return SendResult(receiver, True, None, 1)
+
+    def close(self):
+        pass
+
+
+class EmlSpool(object):
+    """
+    Messages written to a directory, one .eml file each, numbered in the order
+    they are written.
+    """
+
+    def __init__(self, path):
+        """
+        ---------------
+        :param path: directory, created if needed
+        """
+        self.path = path
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        # do not overwrite the messages of a previous run
+        numbers = [int(name[:6]) for name in os.listdir(path)
+                   if name.endswith('.eml') and name[:6].isdigit()]
+        self.counter = itertools.count(max(numbers) + 1 if numbers else 0)
+
+    def send(self, sender, receiver, message):
+        """
+        Write a message.
+        ---------------
+        :return: SendResult
+        """
+        number = next(self.counter)
+        name = '%06d-%s.eml' % (number, re.sub(r'[^\w.@+-]', '_', receiver))
+        try:
+            _write_atomic(self.path, '.%06d.tmp' % number,
+                          os.path.join(self.path, name), message)
+        except (IOError, OSError), error:
+            return SendResult(receiver, False, str(error), 1)
+        return SendResult(receiver, True, None, 1)
+
+    def close(self):
+        pass
+
+
+class MboxSpool(object):
+    """
+    Messages appended to a mbox file. Can be used from several threads.
+    """
+
+    def __init__(self, path):
+        """
+        ---------------
+        :param path: mbox file, created if needed
+        """
+        self.path = path
+        # unbuffered: nothing is left in a buffer after a failed write
+        self.descriptor = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0600)
+        self.lock = threading.Lock()
+
+    def send(self, sender, receiver, message):
+        """
+        Append a message to the file.
+        ---------------
+        :return: SendResult
+        """
+        if not message.endswith('\n'):
+            message += '\n'
+        entry = 'From %s %s\n%s\n' % (sender or 'MAILER-DAEMON', time.asctime(),
+                                     FROM_LINE_PATTERN.sub(r'>\1', message))
+        with self.lock:
+            end = os.lseek(self.descriptor, 0, os.SEEK_END)
+            try:
+                written = 0
+                while written < len(entry):
+                    written += os.write(self.descriptor, entry[written:])
+            except OSError, error:
+                # remove what was written of the message
+                try:
+                    os.ftruncate(self.descriptor, end)
+                except OSError:
+                    pass
+                return SendResult(receiver, False, str(error), 1)
+        return SendResult(receiver, True, None, 1)
+
+    def close(self):
+        """
+        Write the file to the disk and close it.
+        ---------------
+        :raise OSError: if it cannot be written
+        """
+        with self.lock:
+            try:
+                os.fsync(self.descriptor)
+            finally:
+                os.close(self.descriptor)
+
+
+SPOOL_TYPES = {'maildir': MaildirSpool, 'eml': EmlSpool, 'mbox': MboxSpool}
+
+
+def parse_spool(description):
+    """
+    Read the description of a spool, TYPE:PATH, e.g. maildir:out/Maildir.
+    ---------------
+    :param description: type (maildir, eml or mbox) and path of the spool
+    :return: class of the spool, path
+    :raise ValueError: if the description is not valid
+    """
+    spool_type, separator, path = description.partition(':')
+    if not separator or not path or spool_type not in SPOOL_TYPES:
+        raise ValueError("Invalid spool '%s', expected TYPE:PATH with TYPE "
+                         "in %s" % (description, ', '.join(sorted(SPOOL_TYPES))))
+    return SPOOL_TYPES[spool_type], path
+
+
+def open_spool(description):
+    """
+    Open a spool described as TYPE:PATH (see parse_spool).
+    ---------------
+    :return: the spool
+    :raise ValueError: if the description is not valid
+    """
+    spool_class, path = parse_spool(description)
+    return spool_class(path)
@@ -3,66 +3,244 @@
 
 """
 Mail utils for the send_mark project. Provides:
-    build_body
-    send_mail_fake: just for testing purpose for now, it's a dumb function.
-Should provide build_header
+    MailTemplate: template of the mail bodies, compiled once
+    build_body: body of a single mail, with the default template
+    build_header, build_message: headers and full message (RFC 5322)
+    send_mail_fake: just prints the mail, for dry-runs.
+    SMTPPool: sends the mails through a small pool of persistent SMTP
+        connections, each one being reused for many messages.
+
+smtplib and the email package are only imported when a message is actually
+built or sent: they are not needed to render or print the mails, and their
+import is a large part of the startup time for small runs.
 
 :Author: NPAC 2015-2016
 :Date: 20 Feb 2016 - Last update 12 Aug 2016
 :Mail: antoine.laudrain[at]u-psud.fr
 """
 
-def build_body(iStudent, topic_list, data, to_send_array):
+import re
+import socket
+import threading
+import collections
+
+# result of the sending of a message. temporary: the failure may not happen
+# again later (4xx answer of the server, server unreachable)
+SendResult = collections.namedtuple('SendResult', 'receiver ok error attempts temporary')
+SendResult.__new__.__defaults__ = (False,)
+
+
+# default template of the mails, see MailTemplate
+DEFAULT_OPENING = "Hello,\n"
+DEFAULT_TOPIC_LINE = "Your mark for %(topic)s is %(mark)s. Mean is %(mean)s, " \
+    "highest grade is %(max)s, lowest grade is %(min)s.\n"
+DEFAULT_CLOSING = "Have a good day,\nAntoine Laudrain"
+
+# fields of the templates
+FIELD_PATTERN = re.compile(r'%\((\w+)\)s')
+TOPIC_FIELDS = ('topic', 'mean', 'max', 'min')
+STUDENT_FIELDS = ('name', 'surname', 'email')
+CELL_FIELDS = ('mark',)
+# fields computed from the marks (see markStats)
+STATISTICS_FIELDS = ('median', 'std', 'nb_marks')
+RANK_FIELDS = ('rank', 'percentile')
+
+
+class TemplatePart(object):
+    """
+    Piece of template in which the known fields have been replaced by their
+    values. The remaining fields are filled with the % operator when rendering,
+    or not at all if there is none left.
+    """
+
+    def __init__(self, template, values, allowed_fields):
+        """
+        ---------------
+        :param template: text with %(field)s fields. Any other % is literal.
+        :param values: dictionary of the field values already known
+        :param allowed_fields: fields which can appear in the template
+        """
+
+        pieces = FIELD_PATTERN.split(template)
+        # pieces = [text, field, text, field, ..., text]
+        constant = []
+        formatted = []
+        self.needs_format = False
+        for iPiece, piece in enumerate(pieces):
+            if iPiece % 2 == 0:
+                constant.append(piece)
+                formatted.append(piece.replace('%', '%%'))
+                continue
+            if piece not in allowed_fields:
+                raise ValueError("Unknown field '%s' in template, allowed: %s"
+                                 % (piece, ', '.join(allowed_fields)))
+            if piece in values:
+                value = str(values[piece])
+                constant.append(value)
+                formatted.append(value.replace('%', '%%'))
+            else:
+                self.needs_format = True
+                formatted.append('%%(%s)s' % piece)
+        if self.needs_format:
+            self.text = ''.join(formatted)
+        else:
+            self.text = ''.join(constant)
+
+    def render(self, values):
+        if self.needs_format:
+            return self.text % values
+        return self.text
+
+
+class MailTemplate(object):
+    """
+    Template of the body of the mails: an opening, one line per topic sent,
+    and a closing.
+    The text can contain the fields:
+        %(name)s, %(surname)s, %(email)s of the student (everywhere),
+        %(topic)s, %(mark)s, %(mean)s, %(max)s, %(min)s (topic line only),
+        %(median)s, %(std)s, %(nb_marks)s of the topic and %(rank)s,
+        %(percentile)s of the mark, computed from the marks (topic line only,
+        see markStats).
+    Once prepared for a table, the topic lines are pre-rendered for each topic
+    (only the student fields and the mark remain), so that rendering a body is
+    a tight loop over the selected topics, the pieces being assembled by a
+    single join.
+    """
+
+    def __init__(self, opening=DEFAULT_OPENING, topic_line=DEFAULT_TOPIC_LINE,
+                 closing=DEFAULT_CLOSING):
+        """
+        ---------------
+        :param opening: beginning of the mail
+        :param topic_line: line for each topic sent
+        :param closing: end of the mail
+        """
+        self.opening = TemplatePart(opening, {}, STUDENT_FIELDS)
+        self.closing = TemplatePart(closing, {}, STUDENT_FIELDS)
+        self.topic_line = topic_line
+        # check the fields right away
+        TemplatePart(topic_line, {}, TOPIC_FIELDS + STUDENT_FIELDS + CELL_FIELDS +
+                     STATISTICS_FIELDS + RANK_FIELDS)
+        used_fields = set(FIELD_PATTERN.findall(topic_line))
+        self.needs_rank = bool(used_fields.intersection(RANK_FIELDS))
+        self.needs_statistics = self.needs_rank or \
+            bool(used_fields.intersection(STATISTICS_FIELDS))
+        self.topic_parts = None
+        self.table = None
+        self.statistics = None
+
+    @classmethod
+    def from_file(cls, path):
+        """
+        Read a template file, made of 3 sections starting with the lines
+        [opening], [topic] and [closing]. The text of a section is made of the
+        following lines, as written (with their end of line).
+        ---------------
+        :param path: path of the template file
+        :return: MailTemplate
+        """
+        sections = {}
+        current = None
+        with open(path, 'r') as template_file:
+            for line in template_file:
+                header = line.strip()
+                if header in ('[opening]', '[topic]', '[closing]'):
+                    current = header[1:-1]
+                    sections[current] = []
+                elif current is not None:
+                    sections[current].append(line)
+        if 'topic' not in sections:
+            raise ValueError("No [topic] section in template %s" % path)
+        return cls(''.join(sections.get('opening', [])),
+                   ''.join(sections['topic']),
+                   ''.join(sections.get('closing', [])))
+
+    def prepare(self, table, topic_list, statistics=None, sheet_stats=True):
+        """
+        Pre-render the topic line for every topic of the table.
+        ---------------
+        :param table: the mark table (retrieve_marks.MarkTable)
+        :param topic_list: list of the topics, in the order of the table
+        :param statistics: markStats.MarkStatistics of the table. If None, it
+        is computed here when needed.
+        :param sheet_stats: use the mean, max and min written in the csv file,
+        otherwise the ones computed from the marks
+        :return: self
+        """
+        allowed_fields = TOPIC_FIELDS + STUDENT_FIELDS + CELL_FIELDS + \
+            STATISTICS_FIELDS + RANK_FIELDS
+        if statistics is None and (self.needs_statistics or not sheet_stats):
+            import markStats
+            statistics = markStats.MarkStatistics(table)
+        self.topic_parts = []
+        for iTopic in range(len(topic_list)):
+            values = {'topic': topic_list[iTopic]}
+            if statistics is not None:
+                values.update(statistics.values(iTopic))
+            if sheet_stats:
+                values['mean'], values['max'], values['min'] = table.stats(iTopic)
+            self.topic_parts.append(TemplatePart(self.topic_line, values,
+                                                 allowed_fields))
+        self.table = table
+        self.statistics = statistics
+        return self
+
+    def render(self, iStudent, selection):
+        """
+        Build the body of the message for a student, from the marks of the
+        topics selected for him.
+        ---------------
+        :param iStudent: student index in the table
+        :param selection: SelectionModel, filled by the gui
+        :return: "" if nothing is to be sent (no registered mark or no topic
+        selected). Message body otherwise.
+        """
+
+        table = self.table
+        values = {'name': table.name(iStudent),
+                  'surname': table.surname(iStudent),
+                  'email': table.email(iStudent)}
+        pieces = [self.opening.render(values)]
+        # only loop over the topics selected for this student
+        for iTopic in selection.selected_topics(iStudent):
+            # if no mark was entered for this student at this topic
+            mark_str = table.mark_str(iStudent, iTopic)
+            if mark_str == '':
+                continue
+            values['mark'] = mark_str
+            if self.needs_rank:
+                stats = self.statistics.topic(iTopic)
+                mark = table.mark(iStudent, iTopic)
+                rank = stats.rank(mark)
+                percentile = stats.percentile(mark)
+                values['rank'] = '' if rank is None else rank
+                values['percentile'] = '' if percentile is None else '%.0f' % percentile
+            pieces.append(self.topic_parts[iTopic].render(values))
+
+        # if no mark was registered in the database or no topic selected,
+        # no need for sending a message.
+        if len(pieces) == 1:
+            return ""
+
+        pieces.append(self.closing.render(values))
+        return ''.join(pieces)
+
+
+def build_body(iStudent, topic_list, table, selection):
     """
-    Reminder of data structure:
-    First  line: Name, Surname, Email, name of the topics...
-    Second line: Mean values for each topic
-    Third  line: Max values for each topic
-    Fourth line: Min values for each topic
-    Following lines: students data
+    Build the body of the message for a single student, with the default
+    template. To build many bodies, prepare a MailTemplate once and use its
+    render method.
     ---------------
-    :param iStudent: line number of the student
-    :param topic_list: list of the topics, in the order read in the csv file
-    :param data: the full data table (list of list formatted csv file)
-    :param to_send_array: std boolean array received after the gui
+    :param iStudent: student index in the table
+    :param topic_list: list of the topics, in the order of the table
+    :param table: the mark table (retrieve_marks.MarkTable)
+    :param selection: SelectionModel, filled by the gui
     :return: "" if nothing is to be sent (no registered mark or no topic
     selected). Message body otherwise.
     """
-
-    # opening of the message
-    opening = "Hello,\n"
-
-    # core of the message
-    core = ""
-    nb_topics_to_send = 0
-    for iTopic in range(len(topic_list)):
-        # if the topic has not been selected for this student
-        if not to_send_array[iStudent][iTopic]:
-            continue
-        # if no mark was entered for this student at this topic
-        if data[iStudent+4][iTopic+3] == '':
-            continue
-        nb_topics_to_send += 1
-        line_buffer = "Your mark for %s is %s. Mean is %s, highest grade is %s, lowest grade is %s.\n" \
-            % (topic_list[iTopic], \
-            data[iStudent+4][iTopic+3], \
-            data[1][iTopic+3], \
-            data[2][iTopic+3], \
-            data[3][iTopic+3])
-        core += line_buffer
-
-    # closing of the message
-    closing = ""
-    closing += "Have a good day,\n"
-    closing += "Antoine Laudrain"
-
-    # if no mark was registered in the database or no topic selected,
-    # no need for sending a message.
-    if nb_topics_to_send == 0:
-        return ""
-    # else, returns the message
-    else:
-        return opening + core + closing
+    return MailTemplate().prepare(table, topic_list).render(iStudent, selection)
 
 
 def send_mail_fake(mail_add, body):
@@ -76,3 +254,258 @@ def send_mail_fake(mail_add, body):
     print body
     print '-'*40
 
+
+
+def build_header(message, sender, receiver, subject):
+    """
+    Fill the header of a message.
+    ---------------
+    :param message: email.message.Message to fill
+    :param sender: mail address of the sender
+    :param receiver: mail address of the receiver
+    :param subject: subject of the mail
+    :return: the message
+    """
+    from email.utils import formatdate, make_msgid
+    message['From'] = sender
+    message['To'] = receiver
+    message['Subject'] = subject
+    message['Date'] = formatdate(localtime=True)
+    message['Message-ID'] = make_msgid()
+    return message
+
+
+def build_message(sender, receiver, subject, body):
+    """
+    Build the full message (header and body), ready to be sent.
+    ---------------
+    :param sender: mail address of the sender
+    :param receiver: mail address of the receiver
+    :param subject: subject of the mail
+    :param body: body of the mail
+    :return: the message, as a string
+    """
+    from cStringIO import StringIO
+    from email.charset import Charset, QP
+    from email.generator import Generator
+    from email.mime.nonmultipart import MIMENonMultipart
+    # quoted-printable: the body stays readable in the spools and the logs
+    # (MIMEText would encode it in base64)
+    charset = Charset('utf-8')
+    charset.body_encoding = QP
+    message = MIMENonMultipart('text', 'plain')
+    message.set_payload(body, charset)
+    build_header(message, sender, receiver, subject)
+    # the lines starting with "From " are only quoted in the mbox spool
+    output = StringIO()
+    Generator(output, mangle_from_=False).flatten(message)
+    return output.getvalue()
+
+
+class SMTPConnection(object):
+    """
+    Authenticated SMTP session, with the number of messages sent through it.
+    """
+
+    def __init__(self, pool):
+        import smtplib
+        if pool.ssl:
+            self.smtp = smtplib.SMTP_SSL(pool.host, pool.port, timeout=pool.timeout)
+        else:
+            self.smtp = smtplib.SMTP(pool.host, pool.port, timeout=pool.timeout)
+        try:
+            if pool.starttls:
+                self.smtp.ehlo()
+                self.smtp.starttls()
+                self.smtp.ehlo()
+            if pool.user:
+                self.smtp.login(pool.user, pool.password)
+        except:
+            self.smtp.close()
+            raise
+        self.nb_sent = 0
+
+    def close(self):
+        import smtplib
+        try:
+            self.smtp.quit()
+        except (smtplib.SMTPException, socket.error):
+            self.smtp.close()
+
+
+def smtp_error_code(error):
+    """
+    :param error: smtplib.SMTPException raised when sending a message
+    :return: SMTP reply code of the refusal, 0 if unknown
+    """
+    import smtplib
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        for code, reply in error.recipients.values():
+            return code
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code
+    return 0
+
+
+def connection_error_is_temporary(error):
+    """
+    :param error: error raised when opening a connection (see SMTPConnection)
+    :return: True if the connection may be opened later: network errors,
+    dropped connections and 4xx replies. Refused logins, 5xx replies, SSL
+    errors (wrong port, certificate) and missing extensions (STARTTLS, AUTH)
+    are permanent.
+    """
+    import ssl
+    import smtplib
+    # ssl.SSLError is a socket.error
+    if isinstance(error, (ssl.SSLError, ssl.CertificateError,
+                          smtplib.SMTPAuthenticationError)):
+        return False
+    if isinstance(error, (smtplib.SMTPServerDisconnected, socket.error)):
+        return True
+    return smtp_error_code(error) // 100 == 4
+
+
+class SMTPPool(object):
+    """
+    Small pool of persistent SMTP connections.
+    Connections are opened when first needed (up to size), and each one is
+    reused for max_messages messages before being renewed. When the server
+    drops a connection, or a connection cannot be opened for a while, it is
+    reopened and the message is sent again (up to retries times). A connection
+    which cannot be opened at all (login refused, 5xx reply, SSL error) fails
+    the message at once, as a permanent error. The pool can be shared by
+    several threads.
+    """
+
+    def __init__(self, host, port=25, user=None, password=None,
+                 starttls=False, ssl=False, size=2, max_messages=100,
+                 timeout=30, retries=2):
+        """
+        ---------------
+        :param host: SMTP server
+        :param port: SMTP port
+        :param user: login, None if no authentication
+        :param password: password for the login
+        :param starttls: switch to TLS after connecting
+        :param ssl: connect with SSL (SMTPS)
+        :param size: maximal number of simultaneous connections
+        :param max_messages: number of messages after which a connection is
+        renewed (servers often limit the number of messages per session)
+        :param timeout: socket timeout in seconds
+        :param retries: number of new attempts after a dropped connection
+        """
+
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.starttls = starttls
+        self.ssl = ssl
+        self.size = size
+        self.max_messages = max_messages
+        self.timeout = timeout
+        self.retries = retries
+
+        # idle connections (the last released is reused first) and number of
+        # open connections (idle or in use), guarded by the condition
+        self.idle = []
+        self.nb_open = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        """
+        :return: an idle connection, a new one if none is idle and the pool
+        is not full. Otherwise waits for a connection to be released or closed.
+        """
+        with self.condition:
+            while not self.idle and self.nb_open >= self.size:
+                self.condition.wait()
+            if self.idle:
+                return self.idle.pop()
+            self.nb_open += 1
+        try:
+            return SMTPConnection(self)
+        except:
+            with self.condition:
+                self.nb_open -= 1
+                self.condition.notify()
+            raise
+
+    def release(self, connection, broken=False):
+        """
+        Give back a connection to the pool. Broken connections, and the ones
+        which sent max_messages messages, are closed: a waiting thread can
+        then open a new one.
+        """
+        if broken or connection.nb_sent >= self.max_messages:
+            if not broken:
+                connection.close()
+            with self.condition:
+                self.nb_open -= 1
+                self.condition.notify()
+        else:
+            with self.condition:
+                self.idle.append(connection)
+                self.condition.notify()
+
+    def send(self, sender, receiver, message):
+        """
+        Send a message.
+        ---------------
+        :param sender: mail address of the sender (envelope)
+        :param receiver: mail address of the receiver (envelope)
+        :param message: full message (see build_message)
+        :return: SendResult
+        """
+
+        import ssl
+        import smtplib
+        error = None
+        for attempt in range(1, self.retries + 2):
+            try:
+                connection = self.acquire()
+            except (smtplib.SMTPException, socket.error, ssl.CertificateError), error:
+                if not connection_error_is_temporary(error):
+                    # the next attempts would fail the same way
+                    return SendResult(receiver, False, str(error), attempt)
+                continue
+            try:
+                connection.smtp.sendmail(sender, [receiver], message)
+            except (smtplib.SMTPServerDisconnected, socket.error), error:
+                # the server dropped the connection: open a new one
+                connection.smtp.close()
+                self.release(connection, broken=True)
+                continue
+            except smtplib.SMTPException, error:
+                # the server refused the message, no need to try again now
+                connection.nb_sent += 1
+                self.release(connection)
+                return SendResult(receiver, False, str(error), attempt,
+                                  smtp_error_code(error) // 100 == 4)
+            connection.nb_sent += 1
+            self.release(connection)
+            return SendResult(receiver, True, None, attempt)
+        return SendResult(receiver, False, str(error), self.retries + 1, True)
+
+    def send_many(self, messages):
+        """
+        Send several messages, reusing the connections.
+        ---------------
+        :param messages: iterable over (sender, receiver, message)
+        :return: list of SendResult
+        """
+        return [self.send(sender, receiver, message)
+                for sender, receiver, message in messages]
+
+    def close(self):
+        """
+        Close all the idle connections.
+        """
+        with self.condition:
+            idle = self.idle
+            self.idle = []
+            self.nb_open -= len(idle)
+            self.condition.notify_all()
+        for connection in idle:
+            connection.close()
@@ -0,0 +1,282 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+"""
+On-disk cache of the parsed mark sheets, to avoid parsing the same csv file
+again at each run. Only used when asked (marksender --cache or --cache-dir).
+
+One cache file per csv file (named after the hash of its absolute path), in
+a binary format:
+    MAGIC, length of the metadata (4 bytes, little endian)
+    metadata (marshal): key, storage, sizes, topics, stat lines, names,
+        surnames, emails, marks kept as text, item sizes and byte order of
+        the arrays
+    padding to 8 bytes
+    for the dense tables (MarkTable):
+        marks: nb_topic columns of nb_student doubles (native array('d'))
+        filled: nb_topic columns of nb_student bytes
+    for the sparse tables (SparseMarkTable):
+        row starts: nb_student + 1 native array('l')
+        cell columns: nb_cells native array('l')
+        cell marks: nb_cells native array('d')
+    sorting orders of the students and of the topics (native array('l'))
+The cache is memory-mapped when read: the columns are copied from the mapping
+with one slice each, no text is parsed.
+
+The key of a cache file is the path, size, modification time and SHA-1 of
+the csv file. A cache file is used when the size and the modification time
+are unchanged; when only the modification time changed, the content is hashed
+and compared, and the cache file is rewritten with the new modification time
+when the content is the same (the next runs do not hash it again).
+Otherwise (or if the cache file is corrupted, or was written by another
+architecture) the csv file is parsed again and the cache rewritten.
+Cache files are written to a temporary file and renamed, so that a reader
+never sees a partial cache.
+"""
+
+import os
+import sys
+import mmap
+import array
+import struct
+import marshal
+import hashlib
+import tempfile
+from retrieve_marks import MarkTable, SparseMarkTable, read_sheet, \
+    build_table, sorting_order
+
+MAGIC = 'MKCACHE2'
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'marksender')
+
+
+def cache_path(cache_dir, input_path):
+    """
+    :return: path of the cache file of a csv file
+    """
+    name = hashlib.sha1(os.path.abspath(input_path)).hexdigest()
+    return os.path.join(cache_dir, name + '.cache')
+
+
+def file_hash(input_path):
+    """
+    :return: SHA-1 of the content of a file (hexadecimal)
+    """
+    content = hashlib.sha1()
+    with open(input_path, 'rb') as input_file:
+        for block in iter(lambda: input_file.read(1 << 20), ''):
+            content.update(block)
+    return content.hexdigest()
+
+
+def _hashed_lines(input_file, content):
+    """
+    Generator over the lines of a file, updating a hash with them.
+    """
+    for line in input_file:
+        content.update(line)
+        yield line
+
+
+def write_cache(path, key, table, student_order, topic_order):
+    """
+    Write the cache file of a table.
+    ---------------
+    :param path: path of the cache file
+    :param key: (absolute path, size, modification time, SHA-1) of the csv file
+    :param table: MarkTable or SparseMarkTable, in file order
+    :param student_order: alphabetical order of the students (see sorting_order)
+    :param topic_order: alphabetical order of the topics
+    """
+
+    sparse = isinstance(table, SparseMarkTable)
+    metadata = marshal.dumps({
+        'key': key,
+        'sparse': sparse,
+        'nb_cells': table.nb_cells() if sparse else None,
+        'nb_student': table.nb_student,
+        'nb_topic': table.nb_topic,
+        'topics': table.topics,
+        'stat_lines': table.stat_lines,
+        'names': table.names,
+        'surnames': table.surnames,
+        'emails': table.emails,
+        'text': table.text,
+        'itemsizes': (array.array('d').itemsize, array.array('l').itemsize),
+        'byteorder': sys.byteorder,
+    })
+    head = MAGIC + struct.pack('<I', len(metadata)) + metadata
+    head += '\0' * (-len(head) % 8)
+
+    cache_dir = os.path.dirname(path)
+    descriptor, temporary_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as cache_file:
+            cache_file.write(head)
+            if sparse:
+                table.row_start.tofile(cache_file)
+                table.cell_columns.tofile(cache_file)
+                table.cell_marks.tofile(cache_file)
+            else:
+                for column in table.marks:
+                    column.tofile(cache_file)
+                for column in table.filled:
+                    cache_file.write(column)
+            student_order.tofile(cache_file)
+            topic_order.tofile(cache_file)
+        os.rename(temporary_path, path)
+    except:
+        os.remove(temporary_path)
+        raise
+
+
+def read_cache(path, key):
+    """
+    Read the cache file of a csv file, if it is valid.
+    ---------------
+    :param path: path of the cache file
+    :param key: (absolute path, size, modification time, None) of the csv
+    file, the SHA-1 is only computed if needed
+    :return: table (MarkTable or SparseMarkTable, file order), alphabetical
+    orders of the students and of the topics, SHA-1 of the csv file if it was
+    computed (the key of the cache is then outdated, None otherwise). None if
+    there is no valid cache.
+    """
+
+    try:
+        cache_file = open(path, 'rb')
+    except IOError:
+        return None
+    with cache_file:
+        try:
+            mapping = mmap.mmap(cache_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (mmap.error, ValueError):
+            return None
+    try:
+        start = len(MAGIC) + 4
+        if len(mapping) < start or mapping[:len(MAGIC)] != MAGIC:
+            return None
+        length, = struct.unpack('<I', mapping[len(MAGIC):start])
+        try:
+            metadata = marshal.loads(mapping[start:start + length])
+        except (EOFError, ValueError, TypeError):
+            return None
+
+        input_path, size, mtime, content_hash = key
+        cached_path, cached_size, cached_mtime, cached_hash = metadata['key']
+        if cached_path != input_path or cached_size != size:
+            return None
+        content_hash = None
+        if cached_mtime != mtime:
+            content_hash = file_hash(input_path)
+            if content_hash != cached_hash:
+                return None
+        if metadata['itemsizes'] != (array.array('d').itemsize, array.array('l').itemsize) \
+        or metadata['byteorder'] != sys.byteorder:
+            return None
+
+        nb_student = metadata['nb_student']
+        nb_topic = metadata['nb_topic']
+        nb_cells = metadata['nb_cells']
+        position = start + length
+        position += -position % 8
+        mark_size = array.array('d').itemsize
+        order_size = array.array('l').itemsize
+        if metadata['sparse']:
+            data_size = (nb_student + 1 + nb_cells) * order_size + nb_cells * mark_size
+        else:
+            data_size = nb_topic * nb_student * (mark_size + 1)
+        end = position + data_size + (nb_student + nb_topic) * order_size
+        if len(mapping) != end:
+            return None
+
+        if metadata['sparse']:
+            row_start = array.array('l')
+            row_start.fromstring(mapping[position:position + (nb_student + 1) * order_size])
+            position += (nb_student + 1) * order_size
+            cell_columns = array.array('l')
+            cell_columns.fromstring(mapping[position:position + nb_cells * order_size])
+            position += nb_cells * order_size
+            cell_marks = array.array('d')
+            cell_marks.fromstring(mapping[position:position + nb_cells * mark_size])
+            position += nb_cells * mark_size
+        else:
+            marks = []
+            for iTopic in range(nb_topic):
+                column = array.array('d')
+                column.fromstring(mapping[position:position + nb_student * mark_size])
+                marks.append(column)
+                position += nb_student * mark_size
+            filled = []
+            for iTopic in range(nb_topic):
+                filled.append(bytearray(mapping[position:position + nb_student]))
+                position += nb_student
+        student_order = array.array('l')
+        student_order.fromstring(mapping[position:position + nb_student * order_size])
+        position += nb_student * order_size
+        topic_order = array.array('l')
+        topic_order.fromstring(mapping[position:position + nb_topic * order_size])
+    finally:
+        mapping.close()
+
+    if metadata['sparse']:
+        table = SparseMarkTable.from_rows(metadata['topics'], metadata['stat_lines'],
+                                          metadata['names'], metadata['surnames'],
+                                          metadata['emails'], row_start,
+                                          cell_columns, cell_marks, metadata['text'])
+    else:
+        table = MarkTable.from_columns(metadata['topics'], metadata['stat_lines'],
+                                       metadata['names'], metadata['surnames'],
+                                       metadata['emails'], marks, filled,
+                                       metadata['text'])
+    return table, student_order, topic_order, content_hash
+
+
+def build_list_dic_cached(input_path, sort_students, sort_topics,
+                          cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Same as retrieve_marks.build_list_dic, for a csv file given by its path,
+    using the cache when it is valid, and writing it otherwise.
+    ---------------
+    :param input_path: path of the csv file
+    :param sort_students: boolean flag for student sorting
+    :param sort_topics: boolean flag for topic sorting
+    :param cache_dir: directory of the cache files, created if needed
+    :return: table (MarkTable), topic_list, student_list, True if the cache
+    was used
+    :raise IOError: if the csv file cannot be read
+    """
+
+    input_path = os.path.abspath(input_path)
+    status = os.stat(input_path)
+    path = cache_path(cache_dir, input_path)
+
+    cached = read_cache(path, (input_path, status.st_size, status.st_mtime, None))
+    hit = cached is not None
+    if hit:
+        table, student_order, topic_order, content_hash = cached
+        if content_hash is not None:
+            # same content, new modification time: the key is renewed
+            try:
+                write_cache(path, (input_path, status.st_size, status.st_mtime,
+                                   content_hash), table, student_order, topic_order)
+            except (IOError, OSError):
+                pass
+    else:
+        content = hashlib.sha1()
+        with open(input_path, 'rb') as input_file:
+            header, stats, student_lines = read_sheet(_hashed_lines(input_file, content))
+            table = build_table(header, stats, student_lines)
+        student_order = sorting_order(table.names)
+        topic_order = sorting_order(table.topics)
+        key = (input_path, status.st_size, status.st_mtime, content.hexdigest())
+        # the cache is only an optimization: failing to write it is not an error
+        try:
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            write_cache(path, key, table, student_order, topic_order)
+        except (IOError, OSError):
+            pass
+
+    table.set_order(student_order if sort_students else None,
+                    topic_order if sort_topics else None)
+    return table, table.topic_list(), table.student_list(), hit
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+"""
+Snapshot of the marks already sent, to only send the new or modified ones.
+
+The snapshot maps each topic name to a dictionary student email -> mark sent
+(see MarkTable.column_values), i.e. the marks are keyed by (email, topic).
+It does not depend on the order of the lines and columns: students and
+topics can be added, moved or sorted between two runs.
+The difference with a new table is a hash join, column by column: the
+emails of the table are looked up in the dictionary of the topic, in O(1),
+so that the whole diff costs O(number of cells), without scanning the
+snapshot for each student.
+
+The snapshot is stored with marshal, written to a temporary file and renamed.
+"""
+
+import os
+import marshal
+import operator
+import tempfile
+import itertools
+
+
+def student_positions(table):
+    """
+    :return: display index of each student line of the file
+    """
+    if table.student_order is None:
+        return range(table.nb_student)
+    positions = [0] * table.nb_student
+    for iStudent, iLine in enumerate(table.student_order):
+        positions[iLine] = iStudent
+    return positions
+
+
+class MarkSnapshot(object):
+    """
+    Marks sent, by topic and email.
+    """
+
+    def __init__(self, path):
+        """
+        Load the snapshot, empty if the file does not exist yet.
+        ---------------
+        :param path: path of the snapshot file, None for a snapshot only kept
+        in memory
+        :raise ValueError: if the file is not a snapshot
+        """
+        self.path = path
+        self.marks = {}
+        if path is None:
+            return
+        try:
+            snapshot_file = open(path, 'rb')
+        except IOError:
+            return
+        with snapshot_file:
+            try:
+                self.marks = marshal.load(snapshot_file)
+            except (EOFError, ValueError, TypeError):
+                raise ValueError("%s is not a snapshot file" % path)
+        if not isinstance(self.marks, dict):
+            raise ValueError("%s is not a snapshot file" % path)
+
+    def changed_mask(self, table, selection):
+        """
+        Mask of the cells which are new or modified since the snapshot. The
+        students without mail address are left out: their marks cannot be
+        sent, nor recorded, and would be reported again at each call.
+        ---------------
+        :param table: the mark table (retrieve_marks.MarkTable)
+        :param selection: SelectionModel giving the layout of the mask
+        :return: mask of the changed cells (see SelectionModel.new_mask)
+        """
+        topic_list = table.topic_list()
+        positions = student_positions(table)
+        mask = selection.new_mask()
+        nb_topic = selection.nb_topic
+        for iTopic in range(nb_topic):
+            values = table.column_values(iTopic)
+            # join the emails of the file with the snapshot of the topic
+            sent = map(self.marks.get(topic_list[iTopic], {}).get, table.emails)
+            # the lines which differ are found without a python loop
+            changed = [iLine for iLine in itertools.compress(itertools.count(),
+                                                             itertools.imap(operator.ne, values, sent))
+                       if values[iLine] is not None and table.emails[iLine]]
+            for iLine in changed:
+                index = positions[iLine] * nb_topic + iTopic
+                mask[index >> 3] |= 1 << (index & 7)
+        return mask
+
+    def record(self, table, selection, students):
+        """
+        Record the marks selected for some students, once sent.
+        ---------------
+        :param table: the mark table
+        :param selection: SelectionModel of the marks sent
+        :param students: indices of the students whose mail was sent
+        """
+        topic_list = table.topic_list()
+        if table.student_order is None:
+            lines = students
+        else:
+            lines = [table.student_order[iStudent] for iStudent in students]
+        emails = [table.emails[iLine] for iLine in lines]
+        cells = selection.cells
+        nb_topic = selection.nb_topic
+        for iTopic in range(nb_topic):
+            if selection.selected_topic[iTopic] == 0:
+                continue
+            values = table.column_values(iTopic)
+            topic_marks = self.marks.setdefault(topic_list[iTopic], {})
+            for iStudent, iLine, email in itertools.izip(students, lines, emails):
+                index = iStudent * nb_topic + iTopic
+                if (cells[index >> 3] >> (index & 7)) & 1 and values[iLine] is not None:
+                    topic_marks[email] = values[iLine]
+
+    def record_mail(self, email, marks):
+        """
+        Record the marks sent in a single mail.
+        ---------------
+        :param email: mail address of the student
+        :param marks: list of (topic, mark) sent, marks as in
+        MarkTable.column_values
+        """
+        for topic, value in marks:
+            self.marks.setdefault(topic, {})[email] = value
+
+    def save(self):
+        """
+        Write the snapshot file.
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        descriptor, temporary_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'wb') as snapshot_file:
+                marshal.dump(self.marks, snapshot_file)
+            os.rename(temporary_path, self.path)
+        except:
+            os.remove(temporary_path)
+            raise
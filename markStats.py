@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+"""
+Statistics of the marks of each topic, computed from the student lines
+instead of the mean, max and min lines typed in the csv file (which are not
+updated when a mark is edited).
+
+For each topic, the marks entered (empty cells and marks which are not
+numbers skipped) are kept sorted in an array, along with their sum and sum
+of squares:
+    mean, standard deviation: from the sums, O(1)
+    max, min, median: read in the sorted array, O(1)
+    rank and percentile of a mark: binary search in the sorted array,
+        O(log n)
+A whole column is computed with C loops only (sorted, fsum) over its filled
+cells (see MarkTable.column_cells).
+A single cell can be updated without computing the column again: the old
+mark is removed from the sorted array and the new one inserted (bisect).
+"""
+
+import math
+import array
+import bisect
+import operator
+import itertools
+
+
+def format_stat(value):
+    """
+    :return: text of a statistic for the mails, '' if there is no mark
+    """
+    if value is None:
+        return ''
+    return '%g' % round(value, 2)
+
+
+class TopicStats(object):
+    """
+    Statistics of the marks of a topic.
+    """
+
+    def __init__(self, marks=()):
+        """
+        ---------------
+        :param marks: marks of the topic (floats, empty cells and nan excluded)
+        """
+        self.sorted_marks = array.array('d', sorted(marks))
+        self.total = math.fsum(self.sorted_marks)
+        self.total_squares = math.fsum(itertools.imap(operator.mul,
+                                                      self.sorted_marks,
+                                                      self.sorted_marks))
+
+    def __len__(self):
+        return len(self.sorted_marks)
+
+    def add(self, mark):
+        """
+        Add a mark, ignored if it is not a number.
+        """
+        if mark != mark:
+            return
+        bisect.insort(self.sorted_marks, mark)
+        self.total += mark
+        self.total_squares += mark * mark
+
+    def remove(self, mark):
+        """
+        Remove a mark, ignored if it is not a number.
+        ---------------
+        :raise ValueError: if the mark is not in the statistics
+        """
+        if mark != mark:
+            return
+        index = bisect.bisect_left(self.sorted_marks, mark)
+        if index == len(self.sorted_marks) or self.sorted_marks[index] != mark:
+            raise ValueError("mark %g not in the statistics" % mark)
+        del self.sorted_marks[index]
+        self.total -= mark
+        self.total_squares -= mark * mark
+
+    ########################################################
+    # statistics, None if there is no mark
+    ########################################################
+
+    def mean(self):
+        if not self.sorted_marks:
+            return None
+        return self.total / len(self.sorted_marks)
+
+    def std(self):
+        """
+        :return: standard deviation of the marks (of the whole population)
+        """
+        if not self.sorted_marks:
+            return None
+        mean = self.total / len(self.sorted_marks)
+        return math.sqrt(max(self.total_squares / len(self.sorted_marks) - mean * mean, 0.))
+
+    def max(self):
+        if not self.sorted_marks:
+            return None
+        return self.sorted_marks[-1]
+
+    def min(self):
+        if not self.sorted_marks:
+            return None
+        return self.sorted_marks[0]
+
+    def median(self):
+        nb_marks = len(self.sorted_marks)
+        if not nb_marks:
+            return None
+        middle = nb_marks // 2
+        if nb_marks % 2:
+            return self.sorted_marks[middle]
+        return (self.sorted_marks[middle - 1] + self.sorted_marks[middle]) / 2.
+
+    def rank(self, mark):
+        """
+        :return: rank of a mark, 1 for the highest (equal marks share the same
+        rank), None if the mark is not a number
+        """
+        if mark != mark:
+            return None
+        return len(self.sorted_marks) - bisect.bisect_right(self.sorted_marks, mark) + 1
+
+    def percentile(self, mark):
+        """
+        :return: percentile rank of a mark: percentage of the marks below it,
+        counting half of the equal ones. None if the mark is not a number or
+        there is no mark.
+        """
+        if mark != mark or not self.sorted_marks:
+            return None
+        lower = bisect.bisect_left(self.sorted_marks, mark)
+        upper = bisect.bisect_right(self.sorted_marks, mark)
+        return 100. * (lower + upper) / 2. / len(self.sorted_marks)
+
+
+class MarkStatistics(object):
+    """
+    Statistics of all the topics of a mark table.
+    """
+
+    def __init__(self, table):
+        """
+        Compute the statistics of every topic.
+        ---------------
+        :param table: the mark table (retrieve_marks.MarkTable)
+        """
+        self.table = table
+        # per column, in file order
+        self.columns = [None] * table.nb_topic
+        # the marks which are not numbers (nan) are among the cells kept as
+        # text: only their columns need to be filtered
+        text_columns = set(iColumn for iLine, iColumn in table.text)
+        for iTopic in range(table.nb_topic):
+            iColumn = table._topic(iTopic)
+            marks = table.column_cells(iTopic)[1]
+            if iColumn in text_columns:
+                marks = [mark for mark in marks if mark == mark]
+            self.columns[iColumn] = TopicStats(marks)
+
+    def topic(self, iTopic):
+        """
+        :return: TopicStats of a topic (display order)
+        """
+        return self.columns[self.table._topic(iTopic)]
+
+    def update_cell(self, iTopic, old_mark, new_mark):
+        """
+        Update the statistics after the change of a single cell.
+        ---------------
+        :param iTopic: topic of the cell (display order)
+        :param old_mark: previous mark as a float (see MarkTable.mark), None if
+        the cell was empty
+        :param new_mark: new mark as a float, None if the cell is now empty
+        """
+        stats = self.topic(iTopic)
+        if old_mark is not None:
+            stats.remove(old_mark)
+        if new_mark is not None:
+            stats.add(new_mark)
+
+    def add_students(self, first_student):
+        """
+        Add the marks of the students appended to the table (see
+        MarkTable.append_student).
+        ---------------
+        :param first_student: index of the first new student
+        """
+        table = self.table
+        for iStudent in range(first_student, table.nb_student):
+            for iTopic in table.row_topics(iStudent):
+                self.topic(iTopic).add(table.mark(iStudent, iTopic))
+
+    def values(self, iTopic):
+        """
+        :return: dictionary of the statistics of a topic, formatted for the
+        templates (see mailUtils.MailTemplate)
+        """
+        stats = self.topic(iTopic)
+        return {'mean': format_stat(stats.mean()),
+                'max': format_stat(stats.max()),
+                'min': format_stat(stats.min()),
+                'median': format_stat(stats.median()),
+                'std': format_stat(stats.std()),
+                'nb_marks': len(stats)}
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+"""
+Follow a csv mark sheet while it is being filled.
+
+SheetTail remembers the offset up to which the file was read (only complete
+lines are read), the last bytes before it and the running hash of all the
+bytes before it. When the file grows, only the bytes after the offset are
+read, split into student lines and parsed: an append costs the size of the
+appended lines. The file is considered rewritten before the offset (and has
+to be parsed again) when it was replaced by another one, became shorter, or
+the bytes just before the offset changed. When it keeps the same size with a
+new modification time, it cannot be an append: the whole file is hashed and
+compared with the running hash.
+
+The changes are detected with inotify when the pyinotify module is
+available (only the events of the sheet are kept), by polling the file
+otherwise.
+"""
+
+import os
+import csv
+import time
+import hashlib
+# registers the csv dialect of the mark sheets
+import retrieve_marks
+
+try:
+    import pyinotify
+except ImportError:
+    pyinotify = None
+
+# number of bytes before the offset compared to detect a rewrite
+TAIL_CHECK_SIZE = 4096
+
+
+if pyinotify is not None:
+    class SheetEvents(pyinotify.ProcessEvent):
+        """
+        Notes the events of a single file of the watched directory (the
+        default processing of pyinotify prints all of them).
+        """
+
+        def my_init(self, path=None):
+            self.path = path
+            self.changed = False
+
+        def process_default(self, event):
+            if event.pathname == self.path:
+                self.changed = True
+
+
+class SheetTail(object):
+    """
+    Incremental reader of a csv mark sheet.
+    """
+
+    def __init__(self, path, interval=2.):
+        """
+        ---------------
+        :param path: path of the csv file
+        :param interval: polling period in seconds (maximal wait with inotify)
+        """
+        self.path = path
+        self.interval = interval
+        self.offset = 0
+        self.content = hashlib.sha1()
+        self.tail = ''
+        self.inode = None
+        self.size = None
+        self.mtime = None
+        self.notifier = None
+        if pyinotify is not None:
+            manager = pyinotify.WatchManager()
+            self.events = SheetEvents(path=os.path.abspath(path))
+            self.notifier = pyinotify.Notifier(manager, self.events,
+                                               timeout=int(interval * 1000))
+            # watch the directory, to see the file being replaced
+            manager.add_watch(os.path.dirname(os.path.abspath(path)),
+                              pyinotify.IN_MODIFY | pyinotify.IN_CLOSE_WRITE |
+                              pyinotify.IN_MOVED_TO | pyinotify.IN_CREATE)
+
+    def _read_lines(self, sheet_file):
+        """
+        :return: complete lines from the current offset, the offset is moved
+        after them
+        """
+        sheet_file.seek(self.offset)
+        data = sheet_file.read()
+        end = data.rfind('\n') + 1
+        data = data[:end]
+        self.offset += end
+        self.content.update(data)
+        self.tail = (self.tail + data)[-TAIL_CHECK_SIZE:]
+        status = os.fstat(sheet_file.fileno())
+        self.inode, self.size, self.mtime = status.st_ino, status.st_size, status.st_mtime
+        return data.splitlines(True)
+
+    def read_all(self):
+        """
+        Read the whole file again (complete lines only).
+        ---------------
+        :return: list of the lines, to be given to retrieve_marks.build_list_dic
+        :raise IOError: if the file cannot be read
+        """
+        self.offset = 0
+        self.content = hashlib.sha1()
+        self.tail = ''
+        with open(self.path, 'rb') as sheet_file:
+            return self._read_lines(sheet_file)
+
+    def read_appended(self):
+        """
+        Read the student lines appended since the last read.
+        ---------------
+        :return: list of the new student lines (lists of cells), None if the
+        file was rewritten before the last offset (read_all is then needed)
+        """
+        try:
+            status = os.stat(self.path)
+        except OSError:
+            # being replaced: try again later
+            return []
+        if status.st_ino != self.inode or status.st_size < self.offset:
+            return None
+        if status.st_size == self.size and status.st_mtime == self.mtime:
+            return []
+        with open(self.path, 'rb') as sheet_file:
+            if status.st_size == self.size:
+                # modified in place: compare the whole content read
+                if self._prefix_digest(sheet_file) != self.content.digest():
+                    return None
+            else:
+                sheet_file.seek(self.offset - len(self.tail))
+                if sheet_file.read(len(self.tail)) != self.tail:
+                    return None
+            lines = self._read_lines(sheet_file)
+        return list(csv.reader(lines, dialect='marksheet'))
+
+    def _prefix_digest(self, sheet_file):
+        """
+        :return: sha1 digest of the bytes of the file before the offset
+        """
+        prefix = hashlib.sha1()
+        sheet_file.seek(0)
+        remaining = self.offset
+        while remaining > 0:
+            block = sheet_file.read(min(remaining, 1 << 20))
+            if not block:
+                break
+            prefix.update(block)
+            remaining -= len(block)
+        return prefix.digest()
+
+    def wait(self):
+        """
+        Wait for a change of the file, or at most interval seconds.
+        """
+        if self.notifier is None:
+            time.sleep(self.interval)
+            return
+        # the events of the other files of the directory are ignored
+        self.events.changed = False
+        deadline = time.time() + self.interval
+        while not self.events.changed and time.time() < deadline:
+            if self.notifier.check_events(int((deadline - time.time()) * 1000)):
+                self.notifier.read_events()
+                self.notifier.process_events()
@@ -7,16 +7,157 @@ Open GUI to select which topics / students should be sent their marks.
 Build the mails.
 Send the mails
 
+The GUI (Tkinter) and the modules only needed to send the mails are imported
+when they are used: -h, --dry-run or --select runs start faster.
+
 :Author: NPAC 2015-2016
 :Date: Created 20 Feb 2016 - Last update 11 Aug 2016
 :Mail: antoine.laudrain[at]u-psud.fr
 """
 
+import os
 import sys
 import argparse
-import SelectionInterface as SelI
-from retrieve_marks import build_list_dic
-import mailUtils as mailU
+
+def add_smtp_arguments(parser):
+    """
+    Add the options of the mail sending to a command line parser.
+    ---------------
+    :param parser: argparse.ArgumentParser
+    """
+    group = parser.add_argument_group("mail sending")
+    group.add_argument("--sender", metavar="ADDRESS",
+                    help="mail address of the sender (required unless --dry-run)")
+    group.add_argument("--subject", default="Your marks",
+                    help="subject of the mails (default: %(default)s)")
+    group.add_argument("--smtp-host", default="localhost",
+                    help="SMTP server (default: %(default)s)")
+    group.add_argument("--smtp-port", type=int, default=25,
+                    help="SMTP port (default: %(default)s)")
+    group.add_argument("--smtp-user",
+                    help="SMTP login. The password is read from the "
+                    "MARKSENDER_SMTP_PASSWORD environment variable, or asked.")
+    group.add_argument("--starttls", action="store_true",
+                    help="switch to TLS after connecting to the SMTP server")
+    group.add_argument("--ssl", action="store_true",
+                    help="connect to the SMTP server with SSL")
+    group.add_argument("--connections", type=int, default=2,
+                    help="number of concurrent SMTP sessions (default: %(default)s)")
+    group.add_argument("--rate", type=float,
+                    help="maximal number of mails sent per second (default: no limit)")
+    group.add_argument("--queue-size", type=int, default=100,
+                    help="maximal number of rendered mails waiting to be sent "
+                    "(default: %(default)s, no limit with --routes)")
+    group.add_argument("--routes", metavar="FILE",
+                    help="relay map: send the mails of each recipient domain "
+                    "through its own relay, sessions and retry queue, with "
+                    "lines 'domain host[:port] [connections [per-domain "
+                    "connections]]' (see mailRouting)")
+    group.add_argument("--max-retries", type=int, default=5,
+                    help="with --routes, number of new attempts after a "
+                    "temporary refusal (default: %(default)s)")
+    group.add_argument("--retry-delay", type=float, default=60.,
+                    help="with --routes, seconds before the first new attempt, "
+                    "doubled at each attempt (default: %(default)s)")
+    group.add_argument("--spool", metavar="TYPE:PATH",
+                    help="write the mails to a spool instead of sending them: "
+                    "maildir:DIR, eml:DIR or mbox:FILE (see mailSpool), not "
+                    "with --dry-run")
+
+
+def check_smtp_arguments(parser, args):
+    """
+    Check the options of the mail sending, exit with an error if they are not
+    consistent.
+    ---------------
+    :param parser: argparse.ArgumentParser, with the options of add_smtp_arguments
+    :param args: parsed command line arguments
+    """
+    if not args.dry_run and not args.sender:
+        parser.error("--sender is required to send the mails")
+    if args.spool:
+        if args.dry_run:
+            parser.error("--spool cannot be used with --dry-run (the spool "
+                         "already writes the mails without sending them)")
+        import mailSpool
+        try:
+            mailSpool.parse_spool(args.spool)
+        except ValueError, error:
+            parser.error(str(error))
+    if args.routes:
+        if args.spool:
+            parser.error("--routes cannot be used with --spool")
+        try:
+            read_routes(args)
+        except IOError, error:
+            parser.error("cannot read %s: %s" % (args.routes, error.strerror))
+        except ValueError, error:
+            parser.error("%s: %s" % (args.routes, error))
+
+
+def read_routes(args):
+    """
+    :param args: parsed command line arguments, with --routes
+    :return: routes of the relay map (see mailRouting.parse_routes)
+    """
+    import mailRouting
+    with open(args.routes) as routes_file:
+        return mailRouting.parse_routes(routes_file, args.smtp_host,
+                                        args.smtp_port, args.connections)
+
+
+def create_dispatcher(args, on_result=None):
+    """
+    Open the SMTP pool (or the spool) and start the dispatcher, as set on the
+    command line (see add_smtp_arguments).
+    ---------------
+    :param args: parsed command line arguments
+    :param on_result: see mailDispatch.Dispatcher
+    :return: pool (mailUtils.SMTPPool, spool or mailRouting.RelayPools),
+    dispatcher (mailDispatch.Dispatcher or mailRouting.RoutingDispatcher)
+    """
+    import getpass
+    import mailUtils as mailU
+    import mailDispatch
+    if args.spool:
+        if args.dry_run:
+            parser.error("--spool cannot be used with --dry-run (the spool "
+                         "already writes the mails without sending them)")
+        import mailSpool
+        spool = mailSpool.open_spool(args.spool)
+        dispatcher = mailDispatch.Dispatcher(spool, workers=1,
+                                             queue_size=args.queue_size,
+                                             on_result=on_result)
+        return spool, dispatcher
+    password = None
+    if args.smtp_user:
+        password = os.environ.get("MARKSENDER_SMTP_PASSWORD")
+        if password is None:
+            password = getpass.getpass("SMTP password for %s: " % args.smtp_user)
+    if args.routes:
+        import mailRouting
+        # one pool per domain, to the relay of its route
+        pools = mailRouting.RelayPools(
+            lambda route: mailU.SMTPPool(route.host, route.port,
+                                         args.smtp_user, password,
+                                         starttls=args.starttls, ssl=args.ssl,
+                                         size=route.connections))
+        dispatcher = mailRouting.RoutingDispatcher(read_routes(args), pools,
+                                                   rate=args.rate,
+                                                   max_retries=args.max_retries,
+                                                   delay=args.retry_delay,
+                                                   on_result=on_result)
+        return pools, dispatcher
+    pool = mailU.SMTPPool(args.smtp_host, args.smtp_port,
+                          args.smtp_user, password,
+                          starttls=args.starttls, ssl=args.ssl,
+                          size=args.connections)
+    dispatcher = mailDispatch.Dispatcher(pool, workers=args.connections,
+                                         rate=args.rate,
+                                         queue_size=args.queue_size,
+                                         on_result=on_result)
+    return pool, dispatcher
+
 
 def main(argv):
     """
@@ -24,7 +165,8 @@ def main(argv):
     ---------------
     :param argv: described in built-in help
     :return:    0 if evertything ok,
-                1 if file couldn't be opened.
+                1 if file couldn't be opened,
+                2 if some mails could not be sent.
     """
 
     parser = argparse.ArgumentParser()
@@ -36,38 +178,634 @@ def main(argv):
                     help="alphabetically sort the topics before display")
     parser.add_argument("--dry-run", action="store_true",
                     help="do everything without actually sending the mails")
+    parser.add_argument("--template", metavar="FILE",
+                    help="template of the mails, with [opening], [topic] and "
+                    "[closing] sections (see mailUtils.MailTemplate)")
+    parser.add_argument("--journal", metavar="FILE",
+                    help="record the mails sent in this journal file")
+    parser.add_argument("--resume", action="store_true",
+                    help="do not send again the mails recorded as sent in the "
+                    "journal (requires --journal)")
+    parser.add_argument("--computed-stats", action="store_true",
+                    help="compute the mean, max and min of each topic from the "
+                    "marks, instead of using the lines of the csv file (see "
+                    "markStats)")
+    parser.add_argument("--select", metavar="EXPR",
+                    help="select the marks to send with an expression instead of "
+                    "the GUI, e.g. 'topics=Topic1,Topic3 students=~^[A-M] where "
+                    "mark<10', names with spaces quoted: topics=\"Topic A\",B "
+                    "(see selectExpr)")
+    parser.add_argument("--selection", metavar="FILE",
+                    help="start from the selection saved in this file (if it "
+                    "exists), and save the selection to it before sending (see "
+                    "selectionFile)")
+    parser.add_argument("--no-gui", action="store_true",
+                    help="send the selection of the --selection file as it is, "
+                    "without opening the GUI (requires --selection)")
+    parser.add_argument("--send-early", action="store_true",
+                    help="send the mails of the students confirmed in the GUI "
+                    "(right click on the name, or 'Send ticked') while it is still "
+                    "open, with the topics ticked at the confirmation (see "
+                    "sendPipeline)")
+    parser.add_argument("--snapshot", metavar="FILE",
+                    help="snapshot of the marks sent, updated after sending "
+                    "(see markSnapshot)")
+    parser.add_argument("--changed-only", action="store_true",
+                    help="only select the marks which are new or changed since "
+                    "the snapshot (requires --snapshot)")
+    parser.add_argument("--cache", action="store_true",
+                    help="cache the parsed csv file in ~/.cache/marksender, the "
+                    "next runs do not parse it again while it is unchanged "
+                    "(see markCache)")
+    parser.add_argument("--cache-dir", metavar="DIR",
+                    help="directory of the cache of the parsed csv files "
+                    "(implies --cache)")
+    parser.add_argument("--watch", action="store_true",
+                    help="keep following the csv file and send the marks of the "
+                    "lines appended to it, until interrupted with Ctrl-C "
+                    "(requires --select, see markWatch)")
+    parser.add_argument("--watch-interval", type=float, default=2.,
+                    help="period of the checks of the watched file, in seconds "
+                    "(default: %(default)s)")
+    add_smtp_arguments(parser)
+    profile_group = parser.add_argument_group("profiling")
+    profile_group.add_argument("--profile", action="store_true",
+                    help="record the time spent in each stage, counters and the "
+                    "send latencies, printed as JSON at exit (see profiling)")
+    profile_group.add_argument("--profile-output", metavar="FILE",
+                    help="write the profiling results to this file instead of "
+                    "the standard error (implies --profile)")
+    profile_group.add_argument("--profile-stream", metavar="FILE",
+                    help="write a JSON line to this file at the end of each stage, "
+                    "during the run (implies --profile)")
+    profile_group.add_argument("--cprofile", metavar="FILE",
+                    help="run under cProfile and write its statistics to this "
+                    "file (read them with the pstats module)")
 
-    args = parser.parse_args()
-    # For now, force dry-run since actual mail sending has not been implemented yet.
-    args.dry_run = True
+    args = parser.parse_args(argv[1:])
+    check_smtp_arguments(parser, args)
+    if args.resume and not args.journal:
+        parser.error("--resume requires --journal")
+    if args.changed_only and not args.snapshot:
+        parser.error("--changed-only requires --snapshot")
+    if args.watch and args.select is None:
+        parser.error("--watch requires --select")
+    if args.no_gui and not args.selection:
+        parser.error("--no-gui requires --selection")
+    if args.send_early and (args.select is not None or args.no_gui):
+        parser.error("--send-early requires the GUI (not with --select or --no-gui)")
+    expression = None
+    if args.select is not None:
+        from selectExpr import SelectionExpression
+        try:
+            expression = SelectionExpression(args.select)
+        except ValueError, error:
+            parser.error(str(error))
 
-    # the csv file should have semi-colon (;) separated values
-    try:
-        with open(args.input_file_path, 'r') as input_file:
-            file_raw_data = input_file.readlines()
-    except IOError:
-        print "File not found:", input_file_path
-        return 1
+    recorder = None
+    if args.profile or args.profile_output or args.profile_stream:
+        import profiling
+        stream = open(args.profile_stream, 'w') if args.profile_stream else None
+        recorder = profiling.enable(stream)
+
+    if args.cprofile:
+        import cProfile
+        profiler = cProfile.Profile()
+        code = profiler.runcall(run, args, expression)
+        profiler.dump_stats(args.cprofile)
+    else:
+        code = run(args, expression)
+
+    if recorder is not None:
+        if args.profile_output:
+            with open(args.profile_output, 'w') as output_file:
+                recorder.dump(output_file)
+        else:
+            recorder.dump(sys.stderr)
+        recorder.close()
+    return code
 
-    # build the topics and students list and dictionary
-    data, topic_list, student_list = build_list_dic(file_raw_data,\
-        args.sort_students, args.sort_topics)
 
-    # open the selection interface
-    selection_interface = SelI.SelectionInterface(data, topic_list, student_list)
-    _, _, bool_array = selection_interface.get_selection()
-    # convert the array
-    to_send_array = SelI.to_std_2Darray(bool_array)
+class MarkSender(object):
+    """
+    State of a run: the sheet read, its selection, and where the mails go
+    (dispatcher, journal, snapshot). The steps of run are its methods; the
+    loading ones print the error and return False when the run cannot go on.
+    """
+
+    def __init__(self, args, expression):
+        """
+        ---------------
+        :param args: parsed command line arguments (see main)
+        :param expression: compiled selection expression, None to open the GUI
+        """
+        self.args = args
+        self.expression = expression
+        self.template = None
+        # with an expression which only needs the line of each student, the
+        # mails are rendered and sent while the file is read
+        self.streaming = False
+        self.input_file = None
+        self.student_lines = None
+        # follower of the watched file
+        self.tail = None
+        self.table = None
+        self.topic_list = None
+        self.student_list = None
+        self.statistics = None
+        self.snapshot = None
+        self.selection = None
+        self.journal = None
+        self.delivered = set()
+        self.pool = None
+        self.dispatcher = None
+        # the mails of the students confirmed in the GUI are sent while it is
+        # open
+        self.pipeline = None
+        # the marks of each mail are recorded in the snapshot when the mails
+        # can be sent from another table (watch) or selection (pipeline)
+        self.record_marks = False
+        # students whose mail was delivered, for the snapshot
+        self.sent_students = []
+        self.nb_failed = 0
+        self.nb_skipped = 0
+
+    def load_template(self):
+        """
+        Compile the template of the mails once for all.
+        """
+        import mailUtils as mailU
+        args = self.args
+        try:
+            if args.template:
+                self.template = mailU.MailTemplate.from_file(args.template)
+            else:
+                self.template = mailU.MailTemplate()
+        except IOError:
+            print "File not found:", args.template
+            return False
+        except ValueError, error:
+            print "Invalid template:", error
+            return False
+        # the first mails are sent before the last lines are read
+        use_cache = args.cache or args.cache_dir is not None
+        self.streaming = self.expression is not None and not use_cache and not (
+            args.watch or args.selection or args.changed_only or args.sort_students
+            or args.sort_topics or args.computed_stats or self.template.needs_statistics)
+        return True
+
+    def load_table(self):
+        """
+        Read the csv file (semi-colon separated values), whole or only its
+        reserved lines when streaming, and prepare the template.
+        """
+        from retrieve_marks import build_list_dic, read_sheet, start_table
+        import profiling
+        args = self.args
+        try:
+            if args.watch:
+                # the lines read are remembered to only read the next ones
+                import markWatch
+                self.tail = markWatch.SheetTail(args.input_file_path, args.watch_interval)
+                with profiling.stage('parse'):
+                    table, topic_list, student_list = build_list_dic(self.tail.read_all(),\
+                        args.sort_students, args.sort_topics)
+            elif self.streaming:
+                # only the reserved lines (and the lines giving the storage)
+                # are read here, the file is read while sending
+                self.input_file = open(args.input_file_path, 'r')
+                with profiling.stage('parse'):
+                    header, stats, student_lines = read_sheet(self.input_file)
+                    table, self.student_lines = start_table(header, stats, student_lines)
+                topic_list = table.topic_list()
+                student_list = table.student_list()
+            elif not (args.cache or args.cache_dir is not None):
+                with open(args.input_file_path, 'r') as input_file:
+                    # build the topics and students list and dictionary, the
+                    # file is read and split line by line
+                    with profiling.stage('parse'):
+                        table, topic_list, student_list = build_list_dic(input_file,\
+                            args.sort_students, args.sort_topics)
+            else:
+                import markCache
+                with profiling.stage('parse'):
+                    table, topic_list, student_list, hit = markCache.build_list_dic_cached(
+                        args.input_file_path, args.sort_students, args.sort_topics,
+                        args.cache_dir or markCache.DEFAULT_CACHE_DIR)
+                profiling.count('cache_hit' if hit else 'cache_miss')
+        except (IOError, OSError):
+            print "File not found:", args.input_file_path
+            return False
+        except StopIteration:
+            print "Incomplete file, the 4 reserved lines are missing:", args.input_file_path
+            return False
+        self.table, self.topic_list, self.student_list = table, topic_list, student_list
+
+        # statistics computed from the marks, if needed
+        if args.computed_stats or self.template.needs_statistics:
+            import markStats
+            with profiling.stage('statistics'):
+                self.statistics = markStats.MarkStatistics(table)
+        with profiling.stage('template'):
+            self.template.prepare(table, topic_list, self.statistics,
+                                  not args.computed_stats)
+        if not self.streaming:
+            profiling.count('rows_parsed', table.nb_student)
+            profiling.count('empty_cells',
+                            table.nb_student * table.nb_topic - table.nb_cells())
+        return True
 
-    if args.dry_run:
-        # loop over students to send the mails
-        for iStudent in range(len(student_list)):
-            mail_body = mailU.build_body(iStudent, topic_list, data, to_send_array)
+    def load_snapshot(self):
+        """
+        Load the snapshot of the marks already sent, if needed.
+        """
+        args = self.args
+        if args.snapshot or args.watch:
+            # when watching, the marks sent are needed to only send the
+            # changed ones after the file is rewritten
+            import markSnapshot
+            try:
+                self.snapshot = markSnapshot.MarkSnapshot(args.snapshot)
+            except ValueError, error:
+                print "Invalid snapshot:", error
+                return False
+        self.record_marks = self.snapshot is not None and (
+            args.watch or args.send_early or self.streaming)
+        return True
+
+    def build_selection(self):
+        """
+        Selection from the selection file, the expression and the snapshot
+        (see --selection, --select and --changed-only).
+        """
+        from SelectionModel import SelectionModel, intersect_masks, invert_mask
+        import profiling
+        args = self.args
+        table = self.table
+        with profiling.stage('selection'):
+            selection = SelectionModel(self.student_list, self.topic_list, table)
+            loaded = False
+            if args.selection and os.path.exists(args.selection):
+                import selectionFile
+                try:
+                    selectionFile.load_selection(args.selection, table, selection)
+                except (IOError, ValueError), error:
+                    print "Invalid selection file:", error
+                    return False
+                loaded = True
+                print selection.nb_selected(), "mark(s) selected in", args.selection
+            mask = None
+            unchanged = None
+            if self.expression is not None and not self.streaming:
+                mask = self.expression.mask(table, selection)
+            if args.changed_only:
+                changed = self.snapshot.changed_mask(table, selection)
+                if loaded:
+                    # the marks of the saved selection which did not change
+                    # are unticked
+                    unchanged = invert_mask(changed)
+                else:
+                    mask = changed if mask is None else intersect_masks(mask, changed)
+            if mask is not None:
+                selection.set_mask(mask, True)
+            if unchanged is not None:
+                selection.set_mask(unchanged, False)
+        if args.changed_only:
+            print selection.nb_selected(), "mark(s) new or changed since the snapshot"
+        self.selection = selection
+        return True
+
+    def open_backends(self):
+        """
+        Open the journal and start the dispatcher (not for dry runs).
+        """
+        args = self.args
+        if args.dry_run:
+            return
+        if args.journal:
+            import mailJournal
+            self.journal = mailJournal.SendJournal(args.journal)
+            if args.resume:
+                self.delivered = self.journal.delivered()
+        # the mails are rendered here (or by the pipeline) and sent
+        # concurrently by the dispatcher
+        self.pool, self.dispatcher = create_dispatcher(args, self.on_result)
+
+    def on_result(self, result, tag):
+        """
+        Record the delivery of a mail in the journal and the snapshot. Called
+        from the dispatcher threads.
+        """
+        key, topics, iStudent, marks = tag
+        if self.pipeline is not None:
+            self.pipeline.report(result)
+        if self.journal is not None:
+            import mailJournal
+            status = mailJournal.SENT if result.ok else mailJournal.FAILED
+            self.journal.record(key, result.receiver, topics, status)
+        if not result.ok:
+            return
+        if marks is not None:
+            # watch mode: the table may have been read again meanwhile,
+            # pipeline: the selection may have changed meanwhile
+            self.snapshot.record_mail(result.receiver, marks)
+        else:
+            self.sent_students.append(iStudent)
+
+    def send_students(self, students, table, selection, template):
+        """
+        Render the mails of some students and give them to the dispatcher
+        (printed for a dry run).
+        ---------------
+        :param students: indices of the students
+        :param table: mark table of the students
+        :param selection: selection of their marks (SelectionModel or
+        sendPipeline.FrozenSelection)
+        :param template: template prepared for the table
+        :return: number of mails queued, number of mails which failed
+        """
+        import mailUtils as mailU
+        import profiling
+        args = self.args
+        journal = self.journal
+        snapshot = self.snapshot
+        topic_list = table.topic_list()
+        nb_queued = nb_failed = 0
+        for iStudent in students:
+            with profiling.stage('render'):
+                mail_body = template.render(iStudent, selection)
             if mail_body == "":
                 continue
-            mailU.send_mail_fake(data[iStudent+4][2], mail_body)
+            profiling.count('bodies_rendered')
             # column 2 contains the email addresses
+            mail_add = table.email(iStudent)
+            if mail_add == "":
+                print "Warning: no mail address for", table.name(iStudent)
+                # a dry run only warns about it
+                if not args.dry_run:
+                    self.nb_failed += 1
+                    nb_failed += 1
+                continue
+            topics = marks = None
+            if journal is not None or self.record_marks:
+                selected = [iTopic for iTopic in selection.selected_topics(iStudent)
+                            if table.has_mark(iStudent, iTopic)]
+                topics = [topic_list[iTopic] for iTopic in selected]
+            if self.record_marks:
+                marks = [(topic_list[iTopic], table.value(iStudent, iTopic))
+                         for iTopic in selected]
+            if args.dry_run:
+                mailU.send_mail_fake(mail_add, mail_body)
+                nb_queued += 1
+                if self.pipeline is not None:
+                    # the fake sends show in the progress like real ones
+                    self.pipeline.report(mailU.SendResult(mail_add, True, None, 1))
+                if marks is not None:
+                    snapshot.record_mail(mail_add, marks)
+                continue
+            key = None
+            if journal is not None:
+                import mailJournal
+                key = mailJournal.message_key(mail_add, topics, mail_body)
+                if key in self.delivered:
+                    self.nb_skipped += 1
+                    if marks is not None:
+                        snapshot.record_mail(mail_add, marks)
+                    else:
+                        self.sent_students.append(iStudent)
+                    continue
+            with profiling.stage('build_message'):
+                message = mailU.build_message(args.sender, mail_add, args.subject, mail_body)
+            # blocks while the queue is full
+            with profiling.stage('queue_wait'):
+                self.dispatcher.put(args.sender, mail_add, message,
+                                    (key, topics, iStudent, marks))
+            nb_queued += 1
+        return nb_queued, nb_failed
 
+    def choose(self):
+        """
+        Let the user change the selection in the GUI, unless it was given on
+        the command line, and save it to the selection file.
+        """
+        import profiling
+        args = self.args
+        selection = self.selection
+        if self.expression is not None:
+            # headless selection, without the GUI (counted while sending when
+            # streaming)
+            if not self.streaming:
+                print selection.nb_selected(), "mark(s) selected by:", args.select
+        elif args.no_gui:
+            print selection.nb_selected(), "mark(s) selected"
+        else:
+            # open the selection interface, with the changed marks preselected
+            import SelectionInterface as SelI
+            if args.send_early:
+                import sendPipeline
+                table, template = self.table, self.template
+                self.pipeline = sendPipeline.SendPipeline(
+                    lambda students, frozen: self.send_students(students, table,
+                                                                frozen, template))
+            with profiling.stage('gui'):
+                selection_interface = SelI.SelectionInterface(self.table, self.topic_list,
+                                                              self.student_list,
+                                                              selection, self.pipeline)
+            self.selection = selection_interface.get_selection()
+        if args.selection:
+            import selectionFile
+            selectionFile.save_selection(args.selection, self.table, self.selection)
+
+    def send_selection(self):
+        """
+        Send the mails of the selection: line by line while the file is read
+        when streaming, through the pipeline when the GUI was sending early.
+        """
+        import profiling
+        table, template, selection = self.table, self.template, self.selection
+        if self.streaming:
+            # each line is selected and sent as soon as it is read
+            from sendPipeline import FrozenSelection
+            expression = self.expression
+            line_selection = FrozenSelection()
+            # the topics without name are not selectable
+            topics = frozenset(iTopic for iTopic in expression.topic_indices(table)
+                               if self.topic_list[iTopic] != "")
+            nb_selected = 0
+            for line in self.student_lines:
+                with profiling.stage('parse'):
+                    table.append_student(line)
+                iStudent = table.nb_student - 1
+                with profiling.stage('selection'):
+                    selected = expression.row_topics(table, iStudent, topics)
+                nb_selected += len(selected)
+                line_selection.rows = {iStudent: selected}
+                self.send_students([iStudent], table, line_selection, template)
+            self.input_file.close()
+            profiling.count('rows_parsed', table.nb_student)
+            profiling.count('empty_cells',
+                            table.nb_student * table.nb_topic - table.nb_cells())
+            print nb_selected, "mark(s) selected by:", self.args.select
+        elif self.pipeline is None:
+            self.send_students(range(len(self.student_list)), table, selection, template)
+        else:
+            # the students not confirmed in the GUI are sent with their
+            # selection at its closing
+            pipeline = self.pipeline
+            for iStudent in range(len(self.student_list)):
+                if not pipeline.is_confirmed(iStudent) and selection.selected_student[iStudent]:
+                    pipeline.confirm(iStudent, selection.selected_topics(iStudent))
+            with profiling.stage('pipeline_wait'):
+                pipeline.close()
+            progress = pipeline.progress()
+            print progress['confirmed'], "student(s) confirmed,", progress['queued'], \
+                "mail(s) queued"
+
+    def watch(self):
+        """
+        Follow the watched file until interrupted, sending the marks of the
+        lines appended, or the marks changed when it is rewritten.
+        """
+        import profiling
+        args = self.args
+        tail = self.tail
+        print "Watching", args.input_file_path, "(Ctrl-C to stop)"
+        try:
+            while True:
+                tail.wait()
+                try:
+                    lines = tail.read_appended()
+                except (IOError, OSError), error:
+                    # replaced or unreadable for a while: try at the next poll
+                    print "Cannot read", args.input_file_path, ":", error
+                    continue
+                if lines is None:
+                    self._reread()
+                elif lines:
+                    first_student = self.table.nb_student
+                    with profiling.stage('parse'):
+                        for line in lines:
+                            self.table.append_student(line)
+                    self.student_list = self.table.student_list()
+                    profiling.count('rows_parsed', len(lines))
+                    if self.statistics is not None:
+                        # only the new marks are added to the statistics
+                        with profiling.stage('statistics'):
+                            self.statistics.add_students(first_student)
+                        with profiling.stage('template'):
+                            self.template.prepare(self.table, self.topic_list,
+                                                  self.statistics, not args.computed_stats)
+                    with profiling.stage('selection'):
+                        self.selection.add_students(self.student_list, self.topic_list,
+                                                    self.table)
+                        self.selection.set_mask(self.expression.mask(
+                            self.table, self.selection, first_student), True)
+                    print len(lines), "line(s) appended"
+                    self.send_students(range(first_student, self.table.nb_student),
+                                       self.table, self.selection, self.template)
+        except KeyboardInterrupt:
+            print "Stopped watching", args.input_file_path
+
+    def _reread(self):
+        """
+        The watched file was rewritten before the lines already read: read it
+        again, and only send the marks changed since they were sent.
+        """
+        from retrieve_marks import build_list_dic
+        from SelectionModel import SelectionModel, intersect_masks
+        import profiling
+        args = self.args
+        try:
+            with profiling.stage('parse'):
+                table, topic_list, student_list = build_list_dic(
+                    self.tail.read_all(), args.sort_students, args.sort_topics)
+        except StopIteration:
+            # being written: read it again at the next change
+            self.tail.inode = None
+            return
+        except (IOError, OSError), error:
+            # removed or unreadable for a while: read it again at the next poll
+            print "Cannot read", args.input_file_path, ":", error
+            self.tail.inode = None
+            return
+        profiling.count('watch_reparse')
+        if self.statistics is not None:
+            import markStats
+            with profiling.stage('statistics'):
+                self.statistics = markStats.MarkStatistics(table)
+        with profiling.stage('template'):
+            self.template.prepare(table, topic_list, self.statistics,
+                                  not args.computed_stats)
+        with profiling.stage('selection'):
+            selection = SelectionModel(student_list, topic_list, table)
+            selection.set_mask(intersect_masks(
+                self.expression.mask(table, selection),
+                self.snapshot.changed_mask(table, selection)), True)
+        self.table, self.topic_list, self.student_list = table, topic_list, student_list
+        self.selection = selection
+        print "File rewritten,", selection.nb_selected(), "mark(s) new or changed"
+        self.send_students(range(len(student_list)), table, selection, self.template)
+
+    def summary(self):
+        """
+        Wait for the mails to be sent, close the backends, save the snapshot
+        and print the results.
+        ---------------
+        :return: same as main
+        """
+        import profiling
+        args = self.args
+        nb_failed = self.nb_failed
+        nb_skipped = self.nb_skipped
+        if not args.dry_run:
+            nb_sent = 0
+            with profiling.stage('send_wait'):
+                results = self.dispatcher.close()
+            for result in results:
+                if result.ok:
+                    nb_sent += 1
+                else:
+                    nb_failed += 1
+                    print "Could not send the mail to", result.receiver, ":", result.error
+            try:
+                self.pool.close()
+            except (IOError, OSError), error:
+                # the mails were written, but may not be on the disk
+                print "Could not close the spool", args.spool, ":", error
+                nb_failed += 1
+            if self.journal is not None:
+                self.journal.close()
+            if args.snapshot:
+                self.snapshot.record(self.table, self.selection, self.sent_students)
+                self.snapshot.save()
+            print nb_sent, "mail(s) sent,", nb_failed, "failed."
+            if nb_skipped:
+                print nb_skipped, "mail(s) already sent according to the journal."
+            profiling.count('mails_sent', nb_sent)
+            profiling.count('mails_skipped', nb_skipped)
+        profiling.count('mails_failed', nb_failed)
+        return 0 if nb_failed == 0 else 2
+
+
+def run(args, expression):
+    """
+    Read the marks, select them, build and send the mails.
+    ---------------
+    :param args: parsed command line arguments (see main)
+    :param expression: compiled selection expression, None to open the GUI
+    :return: same as main
+    """
+
+    sender = MarkSender(args, expression)
+    if not (sender.load_template() and sender.load_table()
+            and sender.load_snapshot() and sender.build_selection()):
+        return 1
+    sender.open_backends()
+    sender.choose()
+    sender.send_selection()
+    if sender.tail is not None:
+        sender.watch()
+    return sender.summary()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+"""
+Instrumentation of a run: named stage timers, counters and histograms.
+
+The module keeps one global Recorder, disabled by default: the functions
+stage, count and observe then cost almost nothing, so the instrumentation
+calls can stay in the code. It is enabled by marksender --profile.
+    with profiling.stage('parse'):      time spent in a stage (cumulated over
+        ...                             the calls, with the number of calls)
+    profiling.count('bytes_sent', n)    counter
+    profiling.observe('send_ms', 12.3)  value added to a histogram
+The recorder can be used from several threads. Its state is given by
+snapshot() (a dictionary, dumped as JSON), and can also be streamed to a file
+during the run: one JSON line per finished stage. The lines are queued, and
+written by batches (every STREAM_BATCH lines or STREAM_PERIOD seconds, and by
+close) outside the lock of the recorder, so that the threads timing stages do
+not wait for the file.
+"""
+
+import time
+import json
+import bisect
+import threading
+import contextlib
+import collections
+
+# upper bounds of the histogram buckets (the last bucket has no bound)
+BUCKET_BOUNDS = (0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500,
+                 1000, 2000, 5000, 10000)
+
+# stream lines written at once, or seconds between two writes
+STREAM_BATCH = 256
+STREAM_PERIOD = 1.
+
+
+class Histogram(object):
+    """
+    Distribution of values, in fixed buckets (see BUCKET_BOUNDS).
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.nb = 0
+        self.total = 0.
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS, value)] += 1
+        self.nb += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, fraction):
+        """
+        :return: upper bound of the bucket containing the given fraction of the
+        values (max for the last bucket), None if empty
+        """
+        if self.nb == 0:
+            return None
+        rank = fraction * self.nb
+        cumulated = 0
+        for iBucket, nb in enumerate(self.counts):
+            cumulated += nb
+            if cumulated >= rank and nb:
+                if iBucket < len(BUCKET_BOUNDS):
+                    return min(BUCKET_BOUNDS[iBucket], self.max)
+                return self.max
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.nb,
+            'mean': self.total / self.nb if self.nb else None,
+            'min': self.min,
+            'max': self.max,
+            'p50': self.percentile(0.5),
+            'p90': self.percentile(0.9),
+            'p99': self.percentile(0.99),
+            'buckets': dict(('<=%g' % bound if iBucket < len(BUCKET_BOUNDS)
+                             else '>%g' % BUCKET_BOUNDS[-1], nb)
+                            for iBucket, (bound, nb) in enumerate(
+                                zip(BUCKET_BOUNDS + (None,), self.counts))
+                            if nb),
+        }
+
+
+class NullStage(object):
+    """
+    Context manager doing nothing, for the disabled recorders.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+NULL_STAGE = NullStage()
+
+
+class Recorder(object):
+    """
+    Stage timers, counters and histograms of a run.
+    """
+
+    def __init__(self, enabled=True, stream=None):
+        """
+        ---------------
+        :param enabled: if False, nothing is recorded
+        :param stream: file object where a JSON line is written at the end of
+        each stage (by batches, see flush), None for no streaming
+        """
+        self.enabled = enabled
+        self.stream = stream
+        self.start = time.time()
+        self.stages = {}        # name -> [total time, number of calls]
+        self.counters = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+        # stream lines not written yet, appended without lock (thread safe)
+        self.events = collections.deque()
+        self.last_flush = self.start
+        self.stream_lock = threading.Lock()
+
+    def stage(self, name):
+        """
+        :return: context manager timing a stage
+        """
+        if not self.enabled:
+            return NULL_STAGE
+        return self._timed_stage(name)
+
+    @contextlib.contextmanager
+    def _timed_stage(self, name):
+        start = time.time()
+        try:
+            yield
+        finally:
+            duration = time.time() - start
+            with self.lock:
+                timer = self.stages.setdefault(name, [0., 0])
+                timer[0] += duration
+                timer[1] += 1
+            if self.stream is not None:
+                self.events.append((start + duration - self.start, name, duration))
+                if len(self.events) >= STREAM_BATCH \
+                        or start + duration - self.last_flush >= STREAM_PERIOD:
+                    self.flush(wait=False)
+
+    def flush(self, wait=True):
+        """
+        Write the queued stream lines.
+        ---------------
+        :param wait: if False, return at once when another thread is writing
+        (it writes the new lines too)
+        """
+        if self.stream is None or not self.stream_lock.acquire(wait):
+            return
+        try:
+            self.last_flush = time.time()
+            lines = []
+            while self.events:
+                when, name, duration = self.events.popleft()
+                lines.append(json.dumps({'time': when, 'stage': name,
+                                         'seconds': duration}) + '\n')
+            if lines:
+                self.stream.write(''.join(lines))
+                self.stream.flush()
+        finally:
+            self.stream_lock.release()
+
+    def close(self):
+        """
+        Write the last stream lines and close the stream.
+        """
+        if self.stream is not None:
+            self.flush()
+            self.stream.close()
+
+    def count(self, name, value=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, value):
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.add(value)
+
+    def snapshot(self):
+        """
+        :return: dictionary of the values recorded so far
+        """
+        with self.lock:
+            return {
+                'elapsed': time.time() - self.start,
+                'stages': dict((name, {'seconds': total, 'calls': calls})
+                               for name, (total, calls) in self.stages.iteritems()),
+                'counters': dict(self.counters),
+                'histograms': dict((name, histogram.summary())
+                                   for name, histogram in self.histograms.iteritems()),
+            }
+
+    def dump(self, output_file):
+        """
+        Write the snapshot as JSON.
+        ---------------
+        :param output_file: file object to write to
+        """
+        output_file.write(json.dumps(self.snapshot(), indent=2, sort_keys=True) + '\n')
+
+
+# global recorder, replaced by enable()
+recorder = Recorder(enabled=False)
+
+
+def enable(stream=None):
+    """
+    Start recording, in a new global recorder.
+    ---------------
+    :param stream: see Recorder
+    :return: the recorder
+    """
+    global recorder
+    recorder = Recorder(stream=stream)
+    return recorder
+
+
+def stage(name):
+    return recorder.stage(name)
+
+
+def count(name, value=1):
+    recorder.count(name, value)
+
+
+def observe(name, value):
+    recorder.observe(name, value)
@@ -25,96 +25,678 @@ Thus the first 3 columns and first 4 lines are reserved space.
 """
 
 import sys
-import copy
+import csv
+import array
+import bisect
+import itertools
+
+# the csv files are semi-colon separated, without any quoting convention
+csv.register_dialect('marksheet', delimiter=';', quoting=csv.QUOTE_NONE)
+
+# below this fraction of filled cells, the sparse storage is used
+SPARSE_MAX_FILL = 0.25
+# number of student lines read to estimate the fraction of filled cells
+FILL_SAMPLE_SIZE = 200
+
+
+def read_sheet(input_file):
+    """
+    Lazily read a CSV mark sheet.
+    The 4 reserved lines are read immediately, the student lines are only read
+    (and split) when the returned generator is consumed, so that the file is
+    never fully loaded in memory.
+    ---------------
+    :param input_file: opened CSV file (or any iterable over its lines)
+    :return: header (list of cells), stats (list of the 3 mean, max, min lines),
+    generator over the student lines (lists of cells)
+    """
+
+    reader = csv.reader(input_file, dialect='marksheet')
+    # first line: Name, Surname, Email, name of the topics...
+    header = next(reader)
+    # next 3 lines: mean, max, min values for each topic
+    stats = [next(reader) for iLine in range(3)]
+    return header, stats, reader
+
+
+class MarkRow(object):
+    """
+    Lightweight view of the marks of a single student in a MarkTable.
+    """
+
+    def __init__(self, table, iStudent):
+        self.table = table
+        self.iStudent = iStudent
+
+    def __len__(self):
+        return self.table.nb_topic
+
+    def has_mark(self, iTopic):
+        return self.table.has_mark(self.iStudent, iTopic)
+
+    def mark(self, iTopic):
+        return self.table.mark(self.iStudent, iTopic)
+
+    def mark_str(self, iTopic):
+        return self.table.mark_str(self.iStudent, iTopic)
+
+    def __iter__(self):
+        for iTopic in range(self.table.nb_topic):
+            yield self.table.mark_str(self.iStudent, iTopic)
+
+
+class MarkTable(object):
+    """
+    Columnar storage of a mark sheet.
+    Names, surnames and emails are kept as lists of strings, the topic names
+    and the mean, max, min lines separately. The marks are stored per topic
+    column as an array of floats, along with a "has mark" mask (one byte per
+    cell) telling which cells were filled.
+    The few marks whose text cannot be rebuilt from their float value
+    ("12,5", "ABS", ...) are kept as text aside.
+
+    All accessors take indices in the display order: the student and topic
+    orders are permutations of the file lines and columns (see
+    sorting_order), so sorting never moves any data.
+    """
+
+    def __init__(self, header, stats, student_lines=()):
+        """
+        ---------------
+        :param header: first line of the csv file (list of cells)
+        :param stats: mean, max and min lines of the csv file
+        :param student_lines: iterable over the student lines of the csv file.
+        More students can be added later with append_student.
+        """
+
+        # columns 0,1,2 are name, surname and email, so skipped
+        self.topics = header[3:]
+        self.nb_topic = len(self.topics)
+        self.stat_lines = [self._pad(line)[3:] for line in stats]
+
+        self.names = []
+        self.surnames = []
+        self.emails = []
+        self.marks = [array.array('d') for iTopic in range(self.nb_topic)]
+        self.filled = [bytearray() for iTopic in range(self.nb_topic)]
+        self.text = {}
+        self.nb_student = 0
+
+        self.student_order = None
+        self.topic_order = None
+
+        for line in student_lines:
+            self.append_student(line)
+
+    @classmethod
+    def from_columns(cls, topics, stat_lines, names, surnames, emails,
+                     marks, filled, text):
+        """
+        Build a table from already parsed columns (e.g. read from a cache, see
+        markCache), without reading any csv line.
+        ---------------
+        :param topics: names of the topics, in file order
+        :param stat_lines: mean, max and min lines, without the 3 first columns
+        :param names, surnames, emails: lists of strings, in file order
+        :param marks: list of array('d') per topic
+        :param filled: list of bytearray per topic
+        :param text: dictionary (line, column) -> text of the mark
+        :return: the table (file order)
+        """
+        table = cls(['', '', ''] + list(topics),
+                    [['', '', ''] + list(line) for line in stat_lines])
+        table.names = names
+        table.surnames = surnames
+        table.emails = emails
+        table.marks = marks
+        table.filled = filled
+        table.text = text
+        table.nb_student = len(names)
+        return table
+
+    def _pad(self, line):
+        """
+        Complete a line which is shorter than the header with empty cells.
+        """
+        missing = self.nb_topic + 3 - len(line)
+        if missing > 0:
+            return line + [''] * missing
+        return line
+
+    def append_student(self, line):
+        """
+        Add a student at the end of the table (in file order).
+        ---------------
+        :param line: student line of the csv file (list of cells)
+        """
+
+        line = self._pad(line)
+        iStudent = self.nb_student
+        self.names.append(line[0])
+        self.surnames.append(line[1])
+        self.emails.append(line[2])
+        for iTopic in range(self.nb_topic):
+            cell = line[iTopic+3]
+            if cell == '':
+                self.marks[iTopic].append(0.)
+                self.filled[iTopic].append(0)
+                continue
+            try:
+                value = float(cell.replace(',', '.'))
+            except ValueError:
+                value = float('nan')
+            self.marks[iTopic].append(value)
+            self.filled[iTopic].append(1)
+            if '%g' % value != cell:
+                self.text[(iStudent, iTopic)] = cell
+        self.nb_student += 1
+        if self.student_order is not None:
+            self.student_order.append(iStudent)
+
+    ########################################################
+    # order
+    ########################################################
+
+    def set_order(self, student_order=None, topic_order=None):
+        """
+        Set the display order of the students and topics.
+        ---------------
+        :param student_order: student numbers in file order, in the order they
+        should appear. None for the file order.
+        :param topic_order: topic numbers in file order, in the order they
+        should appear. None for the file order.
+        """
+        self.student_order = student_order
+        self.topic_order = topic_order
+
+    def _student(self, iStudent):
+        if self.student_order is None:
+            return iStudent
+        return self.student_order[iStudent]
+
+    def _topic(self, iTopic):
+        if self.topic_order is None:
+            return iTopic
+        return self.topic_order[iTopic]
+
+    ########################################################
+    # accessors
+    ########################################################
+
+    def topic_list(self):
+        """ List of the topics, in display order. """
+        if self.topic_order is None:
+            return list(self.topics)
+        return [self.topics[iTopic] for iTopic in self.topic_order]
+
+    def student_list(self):
+        """ List of the student names, in display order. """
+        if self.student_order is None:
+            return list(self.names)
+        return [self.names[iStudent] for iStudent in self.student_order]
+
+    def name(self, iStudent):
+        return self.names[self._student(iStudent)]
+
+    def surname(self, iStudent):
+        return self.surnames[self._student(iStudent)]
+
+    def email(self, iStudent):
+        return self.emails[self._student(iStudent)]
+
+    def stats(self, iTopic):
+        """
+        :return: mean, max and min of the topic, as written in the csv file
+        """
+        iColumn = self._topic(iTopic)
+        return tuple(line[iColumn] for line in self.stat_lines)
+
+    def has_mark(self, iStudent, iTopic):
+        return self.filled[self._topic(iTopic)][self._student(iStudent)] == 1
+
+    def mark(self, iStudent, iTopic):
+        """
+        :return: mark as a float (nan if the cell is not a number)
+        """
+        return self.marks[self._topic(iTopic)][self._student(iStudent)]
+
+    def mark_str(self, iStudent, iTopic):
+        """
+        :return: mark as written in the csv file, '' if the cell is empty
+        """
+        iLine = self._student(iStudent)
+        iColumn = self._topic(iTopic)
+        if not self.filled[iColumn][iLine]:
+            return ''
+        text = self.text.get((iLine, iColumn))
+        if text is not None:
+            return text
+        return '%g' % self.marks[iColumn][iLine]
+
+    def value(self, iStudent, iTopic):
+        """
+        :return: mark of a cell as in column_values: float, text when the float
+        cannot give back the text of the cell, None if the cell is empty
+        """
+        iLine = self._student(iStudent)
+        iColumn = self._topic(iTopic)
+        if not self.filled[iColumn][iLine]:
+            return None
+        text = self.text.get((iLine, iColumn))
+        if text is not None:
+            return text
+        return self.marks[iColumn][iLine]
+
+    def row(self, iStudent):
+        """
+        :return: MarkRow view of the marks of the student
+        """
+        return MarkRow(self, iStudent)
+
+    def column(self, iTopic):
+        """
+        Whole topic column, students in file order.
+        ---------------
+        :return: array of the marks, "has mark" mask
+        """
+        iColumn = self._topic(iTopic)
+        return self.marks[iColumn], self.filled[iColumn]
+
+    def column_values(self, iTopic):
+        """
+        :return: list of the marks of the topic, students in file order: float,
+        or text when the float cannot give back the text of the cell, None for
+        the empty cells
+        """
+        iColumn = self._topic(iTopic)
+        values = self.marks[iColumn].tolist()
+        filled = self.filled[iColumn]
+        iLine = filled.find('\x00')
+        while iLine != -1:
+            values[iLine] = None
+            iLine = filled.find('\x00', iLine + 1)
+        for (iLine, iTextColumn), text in self.text.iteritems():
+            if iTextColumn == iColumn:
+                values[iLine] = text
+        return values
+
+    def column_marks(self, iTopic):
+        """
+        :return: array of the marks entered for the topic (empty cells skipped),
+        students in file order
+        """
+        marks, filled = self.column(iTopic)
+        return array.array('d', itertools.compress(marks, filled))
+
+    def nb_marks(self, iTopic):
+        """
+        :return: number of marks entered for the topic
+        """
+        return self.column(iTopic)[1].count('\x01')
+
+    ########################################################
+    # filled cells only (same for both storages)
+    ########################################################
+
+    def row_topics(self, iStudent):
+        """
+        :return: list of the topics with a mark for a student, in display order
+        """
+        iLine = self._student(iStudent)
+        if self.topic_order is None:
+            return [iTopic for iTopic in range(self.nb_topic)
+                    if self.filled[iTopic][iLine]]
+        return [iTopic for iTopic, iColumn in enumerate(self.topic_order)
+                if self.filled[iColumn][iLine]]
+
+    def column_cells(self, iTopic):
+        """
+        Filled cells of a topic column, students in file order.
+        ---------------
+        :return: array of the lines of the filled cells, array of their marks
+        """
+        marks, filled = self.column(iTopic)
+        return (array.array('l', itertools.compress(itertools.count(), filled)),
+                array.array('d', itertools.compress(marks, filled)))
+
+    def nb_cells(self):
+        """
+        :return: number of filled cells
+        """
+        return sum(filled.count('\x01') for filled in self.filled)
+
+    def filled_cells(self, first_student=0):
+        """
+        Map of the filled cells, student after student in display order. The
+        columns are interleaved with slice assignments, without a python loop
+        over the cells.
+        ---------------
+        :param first_student: first student of the map
+        :return: string of nb_topic bytes per student from first_student,
+        '\x01' for the filled cells, '\x00' for the empty ones
+        """
+        nb_topic = self.nb_topic
+        rows = bytearray(self.nb_student * nb_topic)
+        for iTopic in range(nb_topic):
+            rows[iTopic::nb_topic] = self.filled[self._topic(iTopic)]
+        rows = str(rows)
+        if self.student_order is None:
+            return rows[first_student * nb_topic:]
+        return ''.join(rows[iLine * nb_topic:(iLine + 1) * nb_topic]
+                       for iLine in self.student_order[first_student:])
+
+
+class SparseMarkTable(MarkTable):
+    """
+    Storage of a mark sheet with few filled cells, in compressed sparse rows:
+    only the filled cells are kept, student after student (file order), as
+    their column and their mark. The cells of the student of line iLine are
+    the ones between row_start[iLine] and row_start[iLine+1], sorted by column.
+    A cell is found by a binary search in its line. The columns (needed by the
+    column accessors) are indexed on the first use, in one pass over the cells.
+    Same accessors as MarkTable.
+    """
+
+    def __init__(self, header, stats, student_lines=()):
+        MarkTable.__init__(self, header, stats)
+        # dense columns are not used
+        self.marks = None
+        self.filled = None
+        self.row_start = array.array('l', [0])
+        self.cell_columns = array.array('l')
+        self.cell_marks = array.array('d')
+        # per column: lines and positions of the cells, built when needed
+        self._columns = None
+        # display index of each topic column
+        self._topic_positions = None
+
+        for line in student_lines:
+            self.append_student(line)
+
+    @classmethod
+    def from_rows(cls, topics, stat_lines, names, surnames, emails,
+                  row_start, cell_columns, cell_marks, text):
+        """
+        Build a table from already parsed rows (e.g. read from a cache, see
+        markCache).
+        ---------------
+        :param row_start, cell_columns, cell_marks: compressed sparse rows
+        (see SparseMarkTable)
+        :return: the table (file order)
+        """
+        table = cls(['', '', ''] + list(topics),
+                    [['', '', ''] + list(line) for line in stat_lines])
+        table.names = names
+        table.surnames = surnames
+        table.emails = emails
+        table.row_start = row_start
+        table.cell_columns = cell_columns
+        table.cell_marks = cell_marks
+        table.text = text
+        table.nb_student = len(names)
+        return table
+
+    def append_student(self, line):
+        """
+        Add a student at the end of the table (in file order).
+        ---------------
+        :param line: student line of the csv file (list of cells)
+        """
+
+        iStudent = self.nb_student
+        self.names.append(line[0] if len(line) > 0 else '')
+        self.surnames.append(line[1] if len(line) > 1 else '')
+        self.emails.append(line[2] if len(line) > 2 else '')
+        for iTopic, cell in enumerate(line[3:self.nb_topic+3]):
+            if cell == '':
+                continue
+            try:
+                value = float(cell.replace(',', '.'))
+            except ValueError:
+                value = float('nan')
+            self.cell_columns.append(iTopic)
+            self.cell_marks.append(value)
+            if '%g' % value != cell:
+                self.text[(iStudent, iTopic)] = cell
+        self.row_start.append(len(self.cell_columns))
+        self.nb_student += 1
+        self._columns = None
+        if self.student_order is not None:
+            self.student_order.append(iStudent)
+
+    def set_order(self, student_order=None, topic_order=None):
+        MarkTable.set_order(self, student_order, topic_order)
+        self._topic_positions = None
+        if topic_order is not None:
+            self._topic_positions = [0] * self.nb_topic
+            for iTopic, iColumn in enumerate(topic_order):
+                self._topic_positions[iColumn] = iTopic
+
+    def _find(self, iLine, iColumn):
+        """
+        :return: position of the cell of a line and column of the file in
+        cell_columns/cell_marks, -1 if it is empty
+        """
+        end = self.row_start[iLine + 1]
+        position = bisect.bisect_left(self.cell_columns, iColumn,
+                                      self.row_start[iLine], end)
+        if position < end and self.cell_columns[position] == iColumn:
+            return position
+        return -1
+
+    def _column_index(self, iColumn):
+        """
+        :return: lines and positions of the filled cells of a column
+        """
+        if self._columns is None:
+            columns = [(array.array('l'), array.array('l'))
+                       for iTopic in range(self.nb_topic)]
+            cell_columns = self.cell_columns
+            row_start = self.row_start
+            for iLine in range(self.nb_student):
+                for position in range(row_start[iLine], row_start[iLine + 1]):
+                    lines, positions = columns[cell_columns[position]]
+                    lines.append(iLine)
+                    positions.append(position)
+            self._columns = columns
+        return self._columns[iColumn]
+
+    ########################################################
+    # accessors
+    ########################################################
+
+    def has_mark(self, iStudent, iTopic):
+        return self._find(self._student(iStudent), self._topic(iTopic)) != -1
+
+    def mark(self, iStudent, iTopic):
+        """
+        :return: mark as a float (nan if the cell is not a number, 0 if empty)
+        """
+        position = self._find(self._student(iStudent), self._topic(iTopic))
+        if position == -1:
+            return 0.
+        return self.cell_marks[position]
+
+    def mark_str(self, iStudent, iTopic):
+        """
+        :return: mark as written in the csv file, '' if the cell is empty
+        """
+        iLine = self._student(iStudent)
+        iColumn = self._topic(iTopic)
+        position = self._find(iLine, iColumn)
+        if position == -1:
+            return ''
+        text = self.text.get((iLine, iColumn))
+        if text is not None:
+            return text
+        return '%g' % self.cell_marks[position]
+
+    def value(self, iStudent, iTopic):
+        """
+        :return: mark of a cell as in column_values
+        """
+        iLine = self._student(iStudent)
+        iColumn = self._topic(iTopic)
+        position = self._find(iLine, iColumn)
+        if position == -1:
+            return None
+        return self.text.get((iLine, iColumn), self.cell_marks[position])
+
+    def column(self, iTopic):
+        """
+        Whole topic column, students in file order, built from the cells
+        (prefer column_cells).
+        ---------------
+        :return: array of the marks, "has mark" mask
+        """
+        marks = array.array('d', [0.]) * self.nb_student
+        filled = bytearray(self.nb_student)
+        lines, positions = self._column_index(self._topic(iTopic))
+        for iLine, position in itertools.izip(lines, positions):
+            marks[iLine] = self.cell_marks[position]
+            filled[iLine] = 1
+        return marks, filled
+
+    def column_values(self, iTopic):
+        """
+        :return: list of the marks of the topic, students in file order (see
+        MarkTable.column_values)
+        """
+        iColumn = self._topic(iTopic)
+        values = [None] * self.nb_student
+        lines, positions = self._column_index(iColumn)
+        for iLine, position in itertools.izip(lines, positions):
+            values[iLine] = self.text.get((iLine, iColumn), self.cell_marks[position])
+        return values
+
+    def column_marks(self, iTopic):
+        return self.column_cells(iTopic)[1]
+
+    def nb_marks(self, iTopic):
+        return len(self._column_index(self._topic(iTopic))[0])
+
+    def row_topics(self, iStudent):
+        iLine = self._student(iStudent)
+        columns = self.cell_columns[self.row_start[iLine]:self.row_start[iLine + 1]]
+        if self._topic_positions is None:
+            return columns.tolist()
+        return sorted(self._topic_positions[iColumn] for iColumn in columns)
+
+    def column_cells(self, iTopic):
+        lines, positions = self._column_index(self._topic(iTopic))
+        return lines, array.array('d', [self.cell_marks[position]
+                                        for position in positions])
+
+    def nb_cells(self):
+        return len(self.cell_columns)
+
+    def filled_cells(self, first_student=0):
+        nb_topic = self.nb_topic
+        rows = bytearray((self.nb_student - first_student) * nb_topic)
+        for iStudent in range(first_student, self.nb_student):
+            index = (iStudent - first_student) * nb_topic
+            for iTopic in self.row_topics(iStudent):
+                rows[index + iTopic] = 1
+        return str(rows)
+
+
+def start_table(header, stats, student_lines):
+    """
+    Create the empty mark table of a sheet, with the sparse storage if few
+    cells are filled in the first student lines (see SPARSE_MAX_FILL). Only
+    these first lines are read: the students can then be added one at a time
+    while the file is read (see MarkTable.append_student).
+    ---------------
+    :param header: first line of the csv file
+    :param stats: mean, max and min lines
+    :param student_lines: iterator over the student lines
+    :return: empty MarkTable or SparseMarkTable, iterator over all the student
+    lines (the first ones included)
+    """
+    sample = list(itertools.islice(student_lines, FILL_SAMPLE_SIZE))
+    nb_topic = len(header) - 3
+    nb_filled = sum(1 for line in sample for cell in line[3:nb_topic+3] if cell != '')
+    table_class = MarkTable
+    if sample and nb_topic > 0 \
+    and nb_filled < SPARSE_MAX_FILL * len(sample) * nb_topic:
+        table_class = SparseMarkTable
+    return table_class(header, stats), itertools.chain(sample, student_lines)
+
+
+def build_table(header, stats, student_lines):
+    """
+    Build the mark table of a whole sheet (see start_table).
+    ---------------
+    :param header: first line of the csv file
+    :param stats: mean, max and min lines
+    :param student_lines: iterator over the student lines
+    :return: MarkTable or SparseMarkTable (file order)
+    """
+    table, student_lines = start_table(header, stats, student_lines)
+    for line in student_lines:
+        table.append_student(line)
+    return table
+
+
+def sorting_order(name_list):
+    """
+    Permutation sorting alphabetically a list of names. Equal names keep the
+    order they have in the list.
+    ---------------
+    :param name_list: list of names to sort
+    :return: array of the indices in name_list, in alphabetical order
+    """
+    return array.array('l', sorted(range(len(name_list)), key=name_list.__getitem__))
+
 
 def build_list_dic(file_raw_data, sort_students, sort_topics):
     """
-    Builds the topics and students lists and dictionaries from the raw data in
-    the csv file.
+    Builds the mark table and the topics and students lists from the raw data
+    in the csv file.
     The students/topics list is the alphabetical list of students/topics. This
     should be further used to display the students/topics in the right order in
     the graphical interface.
-    The students/topics dictionary is used for sorting. It associates the
-    line/column number of the student/topic in the file read, so before sorting.
-    Dictionnaries: keys = names; values = line/column number.
+    Sorting does not move the data: it only sets the order in which the table
+    gives its lines (students) and columns (topics).
     ---------------
-    :param file_raw_data: list of the lines in the CSV file
+    :param file_raw_data: opened CSV file, or list of its lines
     :param sort_students: boolean flag for student sorting
     :param sort_topics: boolean flag for topic sorting
-    :return: data (list of list formatted csv file), topic_list, student_list
-    """
-
-    # readlines returns the list of lines, finishing by '\n', so we remove
-    # these characters. We also format the data to be easily usable : split the
-    # csv file wrt each cell
-    data = []
-    for line in file_raw_data:
-        data.append(line[:-1].split(';'))
-    # now we have a 2D list with the values
-
-    # Create a dictionary for topics, needed for eventual sorting:
-    # columns 0,1,2 are name, surname and email, so skipped
-    topic_list = []
-    for iTopic in range(3, len(data[0])):
-        topic_list.append(data[0][iTopic])
-        # I know I could have a better syntax for this operation
-        # (for topic in data[0]... append(topic)) but I keep it for the sake for
-        # symmetry with the student part where it is not possible.
-    topic_dic = {}
-    for iTopic in range(len(topic_list)):
-        topic_dic[topic_list[iTopic]] = iTopic
-
-    # Create a dictionary of students, needed for eventual sorting:
-    # skip line 0 to 3 since they are the list of subjects, mean, max, min
-    student_list = []
-    for iStudent in range(4, len(data)):
-        student_list.append(data[iStudent][0])
-    student_dic = {}
-    for iStudent in range(len(student_list)):
-        student_dic[student_list[iStudent]] = iStudent
+    :return: table (MarkTable), topic_list, student_list
+    """
+
+    # the lines are split one at a time while reading the file and directly
+    # stored in the columns of the table (or its rows, for the sparse sheets).
+    header, stats, student_lines = read_sheet(file_raw_data)
+    table = build_table(header, stats, student_lines)
 
     ########################################################
     # alphabetically sort data if options were passed
     ########################################################
 
+    topic_order = None
+    student_order = None
     if sort_topics:
-        # sort the list of topics
-        topic_list.sort()
-        unsorted_data = copy.deepcopy(data)
-        # fill the 3 first columns for all lines
-        data = [unsorted_data[line_nb][0:3] for line_nb in range(len(data))]
-        # fill the topic columns
-        for topic in topic_list:
-            iTopic = topic_dic[topic]
-            for line_nb in range(len(data)):
-                data[line_nb].append( unsorted_data[line_nb][iTopic + 3] )
-
+        topic_order = sorting_order(table.topics)
     if sort_students:
-        # sort the list of students
-        student_list.sort()
-        unsorted_data = copy.deepcopy(data)
-        # fill the 4 first lines
-        data = [unsorted_data[line_nb] for line_nb in range(4)]
-        # fill the student lines, loop is ordered
-        for student in student_list:
-            iStudent = student_dic[student] # pick the original student number
-            data.append( unsorted_data[iStudent + 4] )
-
-    return data, topic_list, student_list
+        student_order = sorting_order(table.names)
+    table.set_order(student_order, topic_order)
+
+    return table, table.topic_list(), table.student_list()
 
 if __name__ == "__main__":
     input_file_path = "test_marks.csv"
     try:
         with open(input_file_path, 'r') as input_file:
-            file_raw_data = input_file.readlines()
+            # build the topic and student dictionaries
+            table, topic_list, student_list = build_list_dic(input_file, False, False)
     except IOError:
         print "File not found :", input_file_path
         sys.exit(1)
 
-    # build the topic and student dictionaries
-    data, topic_list, student_list = build_list_dic(file_raw_data, False, False)
     print "data :"
-    print data
+    for iStudent in range(table.nb_student):
+        print table.name(iStudent), table.email(iStudent), list(table.row(iStudent))
     print ' '
     print "Topics found: ", topic_list
     print "Students found: ", student_list
@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+"""
+Selection expressions, to select the students and topics without the GUI.
+
+An expression is made of clauses separated by spaces:
+    topics=Topic1,Topic3    topics with these exact names
+    topics=~REGEX           topics whose name matches the regular expression
+    students=A,B            students with these exact names
+    students=~REGEX         students whose name matches the regular expression
+    emails=~REGEX           students whose mail address matches
+    where CONDITION         condition on the marks, e.g. mark<10. Several
+                            conditions can be combined with 'and':
+                            where mark>=5 and mark<10
+A missing clause selects everything, so an empty expression selects all the
+cells. Names (or regular expressions) with spaces are quoted, with ' or ",
+and backslashes are kept as they are. Examples:
+    topics=Topic1,Topic3 students=~^[A-M] where mark<10
+    topics="Topic A","Topic B" students='~^Jean ' where mark<10
+
+The expression is compiled once (SelectionExpression) and evaluated column by
+column over the mark table, into a mask of the cells which is applied to a
+SelectionModel in one bulk operation.
+"""
+
+import re
+import shlex
+import bisect
+import operator
+import itertools
+
+OPERATORS = {
+    '<': operator.lt, '<=': operator.le,
+    '>': operator.gt, '>=': operator.ge,
+    '==': operator.eq, '!=': operator.ne,
+}
+CONDITION_PATTERN = re.compile(r'^mark\s*(<=|>=|==|!=|<|>)\s*(-?\d+(?:[.,]\d*)?)$')
+
+
+def split_words(text):
+    """
+    Split an expression on the spaces, but the quoted ones.
+    ---------------
+    :param text: the expression
+    :return: list of the words, without the quotes, as (word, True if the word
+    was quoted, even partly)
+    :raise ValueError: if a quote is not closed
+    """
+    lexer = shlex.shlex(text, posix=True)
+    lexer.whitespace_split = True
+    # backslashes and # are part of the regular expressions
+    lexer.escape = ''
+    lexer.commenters = ''
+    words = []
+    start = 0
+    try:
+        word = lexer.get_token()
+        while word is not None:
+            # the text read for the word (and the spaces around it)
+            end = lexer.instream.tell()
+            quoted = any(quote in text[start:end] for quote in lexer.quotes)
+            words.append((word, quoted))
+            start = end
+            word = lexer.get_token()
+    except ValueError:
+        raise ValueError("Unclosed quote in selection: %s" % text)
+    return words
+
+
+class SelectionExpression(object):
+    """
+    Compiled selection expression.
+    """
+
+    def __init__(self, expression):
+        """
+        ---------------
+        :param expression: text of the expression (see module documentation)
+        :raise ValueError: if the expression is not valid
+        """
+
+        self.expression = expression
+        self.topic_filter = None
+        self.student_filter = None
+        self.email_filter = None
+        self.conditions = []
+
+        # the clauses are the words before the first where which is not
+        # quoted, the conditions the words after it
+        words = split_words(expression)
+        conditions = None
+        for iWord, (word, quoted) in enumerate(words):
+            if word == 'where' and not quoted:
+                conditions = ' '.join(word for word, quoted in words[iWord + 1:])
+                words = words[:iWord]
+                break
+        for clause, quoted in words:
+            if '=' not in clause:
+                raise ValueError("Invalid clause '%s' in selection" % clause)
+            key, value = clause.split('=', 1)
+            if key == 'topics':
+                self.topic_filter = self._compile_filter(value)
+            elif key == 'students':
+                self.student_filter = self._compile_filter(value)
+            elif key == 'emails':
+                self.email_filter = self._compile_filter(value)
+            else:
+                raise ValueError("Unknown key '%s' in selection, allowed: "
+                                 "topics, students, emails" % key)
+        if conditions is not None:
+            for condition in conditions.split(' and '):
+                match = CONDITION_PATTERN.match(condition.strip())
+                if match is None:
+                    raise ValueError("Invalid condition '%s' in selection"
+                                     % condition.strip())
+                self.conditions.append((OPERATORS[match.group(1)],
+                                        float(match.group(2).replace(',', '.'))))
+
+    def _compile_filter(self, value):
+        """
+        :return: function telling if a name is selected
+        """
+        if value.startswith('~'):
+            try:
+                pattern = re.compile(value[1:])
+            except re.error, error:
+                raise ValueError("Invalid regular expression '%s': %s"
+                                 % (value[1:], error))
+            return lambda name: pattern.search(name) is not None
+        names = frozenset(value.split(','))
+        return names.__contains__
+
+    def _mark_is_selected(self, mark):
+        for compare, threshold in self.conditions:
+            if not compare(mark, threshold):
+                return False
+        return True
+
+    def topic_indices(self, table):
+        """
+        :return: list of the topics selected by name (display order)
+        """
+        topic_list = table.topic_list()
+        return [iTopic for iTopic in range(len(topic_list))
+                if self.topic_filter is None or self.topic_filter(topic_list[iTopic])]
+
+    def row_topics(self, table, iStudent, topics):
+        """
+        Evaluate the expression over a single student, e.g. while the file is
+        still being read.
+        ---------------
+        :param table: the mark table (retrieve_marks.MarkTable)
+        :param iStudent: student index
+        :param topics: set of the topics selected by name (see topic_indices),
+        without the topics which have no name
+        :return: list of the selected topics of the student (display order)
+        """
+        # as in SelectionModel, the students without name are not selectable
+        if table.name(iStudent) == "":
+            return []
+        if self.student_filter is not None \
+        and not self.student_filter(table.name(iStudent)):
+            return []
+        if self.email_filter is not None \
+        and not self.email_filter(table.email(iStudent)):
+            return []
+        return [iTopic for iTopic in table.row_topics(iStudent)
+                if iTopic in topics and (not self.conditions or
+                                         self._mark_is_selected(table.mark(iStudent, iTopic)))]
+
+    def mask(self, table, selection, first_student=0):
+        """
+        Evaluate the expression over the mark table.
+        ---------------
+        :param table: the mark table (retrieve_marks.MarkTable)
+        :param selection: SelectionModel giving the layout of the mask
+        :param first_student: only evaluate the students from this index on
+        (e.g. the ones just appended to the table)
+        :return: mask of the selected cells (see SelectionModel.new_mask)
+        """
+
+        topics = self.topic_indices(table)
+
+        # students selected by name/mail: display index of each line of the
+        # file, -1 if not selected
+        if table.student_order is None:
+            student_order = range(table.nb_student)
+        else:
+            student_order = table.student_order
+        positions = [-1] * table.nb_student
+        for iStudent in range(first_student, table.nb_student):
+            if self.student_filter is not None \
+            and not self.student_filter(table.name(iStudent)):
+                continue
+            if self.email_filter is not None \
+            and not self.email_filter(table.email(iStudent)):
+                continue
+            positions[student_order[iStudent]] = iStudent
+        first_line = 0
+        if first_student < table.nb_student:
+            first_line = min(student_order[iStudent]
+                             for iStudent in range(first_student, table.nb_student))
+
+        mask = selection.new_mask()
+        nb_topic = selection.nb_topic
+        for iTopic in topics:
+            # only the filled cells of the column are visited, from the first
+            # line evaluated
+            lines, marks = table.column_cells(iTopic)
+            start = bisect.bisect_left(lines, first_line)
+            for iLine, mark in itertools.izip(lines[start:], marks[start:]):
+                iStudent = positions[iLine]
+                if iStudent == -1:
+                    continue
+                if self.conditions and not self._mark_is_selected(mark):
+                    continue
+                index = iStudent * nb_topic + iTopic
+                mask[index >> 3] |= 1 << (index & 7)
+        return mask
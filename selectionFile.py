@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+"""
+Save and reload the state of a selection (single cells, global students and
+topics), to start again from it after a restart of the program.
+
+The file is made of:
+    MAGIC, length of the metadata (4 bytes, little endian)
+    metadata (marshal): topic names, student mail addresses (and names of
+        the students without address), in the order of the selection
+    global student states, global topic states, single cells: bit arrays
+        (see SelectionModel), one bit per student, topic or cell
+The cells of a 20k x 200 selection take 500 kB.
+
+The states are keyed by student mail address (the name for the students
+without address) and topic name: the selection can be reloaded after the
+students or topics were sorted differently, or lines and columns added or
+removed. The students and topics which are not in the file are unselected.
+When the students and topics did not change, the bit arrays are used as
+they are; otherwise the rows are moved and the columns permuted as strings
+of bytes, without a python loop over the single cells.
+"""
+
+import os
+import struct
+import marshal
+import operator
+import tempfile
+from SelectionModel import pack_bits, unpack_bits
+
+MAGIC = 'MKSEL001'
+
+
+def _keys(values):
+    """
+    :return: list of (value, number of previous occurrences of the value), to
+    tell apart the duplicated values
+    """
+    seen = {}
+    keys = []
+    for value in values:
+        occurrence = seen.get(value, 0)
+        seen[value] = occurrence + 1
+        keys.append((value, occurrence))
+    return keys
+
+
+def _student_keys(emails, names):
+    """
+    :return: keys of the students: mail address, name if there is no address
+    """
+    return _keys([(email, '') if email else ('', name)
+                  for email, name in zip(emails, names)])
+
+
+def save_selection(path, table, selection):
+    """
+    Write the state of a selection to a file.
+    ---------------
+    :param path: path of the file, replaced
+    :param table: the mark table (retrieve_marks.MarkTable)
+    :param selection: SelectionModel of the table
+    """
+
+    nb_student = selection.nb_student
+    emails = [table.email(iStudent) for iStudent in range(nb_student)]
+    metadata = marshal.dumps({
+        'topics': table.topic_list(),
+        'emails': emails,
+        # the names are only needed for the students without address
+        'names': [table.name(iStudent) if not emails[iStudent] else ''
+                  for iStudent in range(nb_student)],
+    })
+    directory = os.path.dirname(os.path.abspath(path))
+    descriptor, temporary_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as selection_file:
+            selection_file.write(MAGIC + struct.pack('<I', len(metadata)) + metadata)
+            selection_file.write(pack_bits(str(selection.students)))
+            selection_file.write(pack_bits(str(selection.topics)))
+            selection_file.write(selection.cells)
+        os.rename(temporary_path, path)
+    except:
+        os.remove(temporary_path)
+        raise
+
+
+def load_selection(path, table, selection):
+    """
+    Replace a selection by the one saved in a file.
+    ---------------
+    :param path: path of the file
+    :param table: the mark table (retrieve_marks.MarkTable)
+    :param selection: SelectionModel of the table
+    :raise IOError: if the file cannot be read
+    :raise ValueError: if the file is not a selection file
+    """
+
+    with open(path, 'rb') as selection_file:
+        content = selection_file.read()
+    start = len(MAGIC) + 4
+    if content[:len(MAGIC)] != MAGIC or len(content) < start:
+        raise ValueError("%s is not a selection file" % path)
+    length, = struct.unpack('<I', content[len(MAGIC):start])
+    try:
+        metadata = marshal.loads(content[start:start + length])
+        saved_topics = metadata['topics']
+        saved_emails = metadata['emails']
+        saved_names = metadata['names']
+    except (EOFError, ValueError, TypeError, KeyError):
+        raise ValueError("%s is not a selection file" % path)
+    saved_nb_student = len(saved_emails)
+    saved_nb_topic = len(saved_topics)
+    position = start + length
+    sizes = [(saved_nb_student + 7) // 8, (saved_nb_topic + 7) // 8,
+             (saved_nb_student * saved_nb_topic + 7) // 8]
+    if len(content) != position + sum(sizes):
+        raise ValueError("%s is not a selection file" % path)
+    saved_students = unpack_bits(bytearray(content[position:position + sizes[0]]),
+                                 saved_nb_student)
+    position += sizes[0]
+    saved_topic_states = unpack_bits(bytearray(content[position:position + sizes[1]]),
+                                     saved_nb_topic)
+    position += sizes[1]
+    saved_cells = bytearray(content[position:])
+
+    nb_student = selection.nb_student
+    topic_keys = _keys(table.topic_list())
+    student_keys = _student_keys([table.email(iStudent) for iStudent in range(nb_student)],
+                                 [table.name(iStudent) for iStudent in range(nb_student)])
+    saved_topic_keys = _keys(saved_topics)
+    saved_student_keys = _student_keys(saved_emails, saved_names)
+    if topic_keys == saved_topic_keys and student_keys == saved_student_keys:
+        selection.set_state(saved_cells, bytearray(saved_students),
+                            bytearray(saved_topic_states))
+        return
+
+    # position of each student and topic in the file, -1 if not there
+    saved_index = dict((key, iSaved) for iSaved, key in enumerate(saved_student_keys))
+    student_map = [saved_index.get(key, -1) for key in student_keys]
+    saved_index = dict((key, iSaved) for iSaved, key in enumerate(saved_topic_keys))
+    # the topics which are not in the file point after the end of the row
+    topic_map = [saved_index.get(key, saved_nb_topic) for key in topic_keys]
+
+    saved_unpacked = unpack_bits(saved_cells, saved_nb_student * saved_nb_topic)
+    permute = None
+    if topic_map != range(saved_nb_topic) and topic_map:
+        permute = operator.itemgetter(*topic_map)
+    empty_row = '\x00' * len(topic_map)
+    rows = []
+    for iSaved in student_map:
+        if iSaved == -1:
+            rows.append(empty_row)
+            continue
+        row = saved_unpacked[iSaved * saved_nb_topic:(iSaved + 1) * saved_nb_topic]
+        if permute is not None:
+            row = ''.join(permute(row + '\x00'))
+        rows.append(row)
+
+    # -1 and the topics not in the file read the unselected state added here
+    saved_topic_states += '\x00'
+    saved_students += '\x00'
+    selection.set_state(pack_bits(''.join(rows)),
+                        bytearray(''.join(saved_students[iSaved] for iSaved in student_map)),
+                        bytearray(''.join(saved_topic_states[iSaved] for iSaved in topic_map)))
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+"""
+Send the mails of the students confirmed in the GUI while it is still open.
+
+When a student is confirmed (see SelectionInterface), the topics ticked for
+him are copied and his number is put in a queue. A worker thread takes the
+confirmed students one by one, renders their mail and gives it to the
+dispatcher (see mailDispatch): the mails are sent while the rest of the
+selection is being made, instead of after the window is closed.
+The copy of the ticked topics (FrozenSelection) is all the worker reads:
+later clicks in the GUI do not change a mail already confirmed.
+
+The progress (mails queued, sent, failed) is reported from the worker and
+dispatcher threads as events in a thread-safe queue, which the GUI reads
+periodically (progress), from its own thread.
+"""
+
+import time
+import threading
+import Queue
+
+
+class FrozenSelection(object):
+    """
+    Topics selected for the confirmed students, as they were when confirmed.
+    Has the selected_topics method of SelectionModel, used to render the mails.
+    """
+
+    def __init__(self):
+        self.rows = {}
+
+    def selected_topics(self, iStudent):
+        return iter(self.rows.get(iStudent, ()))
+
+
+class SendPipeline(object):
+    """
+    Worker thread rendering and queuing the mails of the confirmed students.
+    """
+
+    def __init__(self, send_students):
+        """
+        ---------------
+        :param send_students: function taking a list of students and a
+        selection, which renders their mails and gives them to the dispatcher.
+        It returns the number of mails queued and of mails which failed.
+        Called from the worker thread only.
+        """
+        self.send_students = send_students
+        self.selection = FrozenSelection()
+        self.requests = Queue.Queue()
+        self.events = Queue.Queue()
+        self.counters = {'confirmed': 0, 'queued': 0, 'sent': 0, 'failed': 0}
+        self.start = None
+        self.thread = threading.Thread(target=self._work)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _work(self):
+        while True:
+            iStudent = self.requests.get()
+            if iStudent is None:
+                return
+            nb_queued, nb_failed = self.send_students([iStudent], self.selection)
+            self.events.put(('queued', nb_queued))
+            self.events.put(('failed', nb_failed))
+
+    def is_confirmed(self, iStudent):
+        return iStudent in self.selection.rows
+
+    def confirm(self, iStudent, topics):
+        """
+        Send the mail of a student, with the given topics. From the thread of
+        the GUI (or the main thread once it is closed).
+        ---------------
+        :param iStudent: student index
+        :param topics: topics selected for the student
+        """
+        if self.start is None:
+            self.start = time.time()
+        self.selection.rows[iStudent] = list(topics)
+        self.counters['confirmed'] += 1
+        self.requests.put(iStudent)
+
+    def report(self, result):
+        """
+        Count the result of a mail. From the dispatcher threads.
+        ---------------
+        :param result: mailUtils.SendResult
+        """
+        self.events.put(('sent' if result.ok else 'failed', 1))
+
+    def progress(self):
+        """
+        Read the events reported since the last call. From the thread of the
+        GUI.
+        ---------------
+        :return: dictionary of the counters (confirmed, queued, sent, failed)
+        and of the number of mails sent per second since the first
+        confirmation (rate)
+        """
+        while True:
+            try:
+                name, value = self.events.get_nowait()
+            except Queue.Empty:
+                break
+            self.counters[name] += value
+        progress = dict(self.counters)
+        progress['rate'] = 0.
+        if self.start is not None and time.time() > self.start:
+            progress['rate'] = self.counters['sent'] / (time.time() - self.start)
+        return progress
+
+    def close(self):
+        """
+        Wait for the mails of all the confirmed students to be queued.
+        """
+        self.requests.put(None)
+        self.thread.join()
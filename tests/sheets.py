@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+"""
+Mark sheets generated for the tests (see test_markCache, test_retrieveMarks).
+"""
+
+NB_TOPIC = 12
+
+
+def sheet_lines(nb_student, filled):
+    """
+    :return: lines of a sheet, filled(iStudent, iTopic) telling the cells
+    which have a mark
+    """
+    lines = [';'.join(["Name", "Surname", "mail"]
+                      + ["Topic%d" % iTopic for iTopic in range(NB_TOPIC)])]
+    for stat in ("Mean", "Highest", "Lowest"):
+        lines.append(';'.join([stat, "", ""] + ["10"] * NB_TOPIC))
+    for iStudent in range(nb_student):
+        lines.append(';'.join(
+            ["S%03d" % (nb_student - iStudent), "s", "s%d@u-psud.fr" % iStudent]
+            + ["%d.5" % (iStudent + iTopic) if filled(iStudent, iTopic) else ""
+               for iTopic in range(NB_TOPIC)]))
+    return [line + '\n' for line in lines]
+
+
+def cells(table):
+    """
+    :return: list of the cells of a table as displayed (None if empty)
+    """
+    return [[table.mark_str(iStudent, iTopic) if table.has_mark(iStudent, iTopic) else None
+             for iTopic in range(table.nb_topic)]
+            for iStudent in range(table.nb_student)]
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+"""
+Local stand-in SMTP server for the tests (and the benchmarks): it accepts
+the messages without delivering them, and can be made slow, greylisting or
+refusing the logins.
+"""
+
+import time
+import socket
+import threading
+import SocketServer
+
+
+class StandinHandler(SocketServer.StreamRequestHandler):
+    """
+    Minimal SMTP session (HELO/EHLO, AUTH PLAIN, MAIL, RCPT, DATA, RSET,
+    NOOP, QUIT).
+    """
+
+    def reply(self, line):
+        self.wfile.write(line + '\r\n')
+        self.wfile.flush()
+
+    def handle(self):
+        server = self.server
+        server.session(1)
+        try:
+            self.session()
+        except socket.error:
+            # dropped by the client
+            pass
+        finally:
+            server.session(-1)
+
+    def session(self):
+        server = self.server
+        self.reply('220 standin ESMTP')
+        recipients = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line[:4].upper()
+            if command == 'HELO':
+                self.reply('250 standin')
+            elif command == 'EHLO':
+                self.reply('250-standin')
+                self.reply('250 AUTH PLAIN')
+            elif command == 'AUTH':
+                if server.login():
+                    self.reply('235 2.7.0 Authentication successful')
+                else:
+                    self.reply('535 5.7.8 Authentication failed')
+            elif command == 'MAIL':
+                recipients = []
+                self.reply('250 OK')
+            elif command == 'RCPT':
+                address = line.partition(':')[2].strip().strip('<>')
+                if server.greylisted(address):
+                    self.reply('451 4.7.1 Greylisted, try again later')
+                else:
+                    recipients.append(address)
+                    self.reply('250 OK')
+            elif command == 'DATA':
+                if not recipients:
+                    self.reply('503 No recipient')
+                    continue
+                self.reply('354 End with .')
+                while self.rfile.readline() not in ('.\r\n', ''):
+                    pass
+                time.sleep(server.delay)
+                server.received(len(recipients))
+                recipients = []
+                self.reply('250 OK')
+            elif command == 'RSET':
+                recipients = []
+                self.reply('250 OK')
+            elif command == 'NOOP':
+                self.reply('250 OK')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Not implemented')
+
+
+class StandinServer(SocketServer.ThreadingTCPServer):
+    """
+    Stand-in SMTP server, one thread per session.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, delay=0., greylist=False, refuse_logins=False):
+        """
+        ---------------
+        :param delay: seconds waited before accepting each message
+        :param greylist: refuse the first attempt of each recipient (451)
+        :param refuse_logins: refuse every login (535)
+        """
+        SocketServer.ThreadingTCPServer.__init__(self, ('127.0.0.1', 0), StandinHandler)
+        self.delay = delay
+        self.greylist = greylist
+        self.refuse_logins = refuse_logins
+        self.nb_logins = 0
+        self.seen = set()
+        self.nb_received = 0
+        # number of sessions opened, open now and open at the same time at most
+        self.nb_sessions = 0
+        self.nb_open = 0
+        self.max_open = 0
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.serve_forever, kwargs={'poll_interval': 0.05})
+        self.thread.daemon = True
+        self.thread.start()
+
+    def greylisted(self, address):
+        if not self.greylist:
+            return False
+        with self.lock:
+            if address in self.seen:
+                return False
+            self.seen.add(address)
+            return True
+
+    def login(self):
+        """
+        :return: True if the login is accepted
+        """
+        with self.lock:
+            self.nb_logins += 1
+        return not self.refuse_logins
+
+    def session(self, delta):
+        with self.lock:
+            if delta > 0:
+                self.nb_sessions += 1
+            self.nb_open += delta
+            self.max_open = max(self.max_open, self.nb_open)
+
+    def received(self, nb_messages):
+        with self.lock:
+            self.nb_received += nb_messages
+
+    def port(self):
+        return self.socket.getsockname()[1]
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+"""
+Tests of SelectionModel (ticking rules, locked students).
+"""
+
+import os
+import sys
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+from retrieve_marks import build_list_dic
+from SelectionModel import SelectionModel
+
+LINES = ["Name;Surname;mail;Topic A;Topic B;;Topic C",
+         "Mean;;;10;10;10;10", "Highest;;;20;20;20;20", "Lowest;;;0;0;0;0",
+         "Ann;a;a@a.a;4;12;1;8", "Bob;b;b@b.b;15;;1;9", ";;;1;1;1;1",
+         "Jean Paul;c;c@c.c;6;7;1;"]
+
+
+def model():
+    table, topic_list, student_list = build_list_dic(LINES, False, False)
+    return table, SelectionModel(student_list, topic_list, table)
+
+
+def selected(selection):
+    return [list(selection.selected_topics(iStudent))
+            for iStudent in range(selection.nb_student)]
+
+
+class SelectionModelTest(unittest.TestCase):
+
+    def test_ticking_rules(self):
+        table, selection = model()
+        selection.set_topic(0, True)
+        self.assertEqual(selected(selection), [[0], [0], [], [0]])
+        self.assertTrue(selection.topic_selected(0))
+        selection.set_single(1, 3, True)
+        # Bob has no Topic B mark and the column without name is not
+        # selectable: he is complete
+        self.assertTrue(selection.student_selected(1))
+        selection.set_single(1, 0, False)
+        self.assertFalse(selection.topic_selected(0))
+        self.assertFalse(selection.student_selected(1))
+
+    def test_locked_students_are_kept(self):
+        table, selection = model()
+        selection.set_single(0, 1, True)
+        selection.lock_student(0)
+        selection.select_all()
+        self.assertEqual(selected(selection), [[1], [0, 3], [], [0, 1]])
+        selection.set_topic(3, False)
+        selection.set_rect(0, 3, 0, 3, False)
+        self.assertEqual(selected(selection), [[1], [], [], []])
+        selection.set_topic(0, True)
+        self.assertFalse(selection.topic_selected(0))
+        selection.reset()
+        selection.set_student(0, False)
+        selection.set_single(0, 1, False)
+        self.assertEqual(selected(selection), [[1], [], [], []])
+
+    def test_lists_of_another_size(self):
+        table, topic_list, student_list = build_list_dic(LINES, False, False)
+        self.assertRaises(ValueError, SelectionModel, student_list, topic_list[:-1], table)
+        self.assertRaises(ValueError, SelectionModel, student_list + ["Eve"], topic_list,
+                          table)
+        selection = SelectionModel(student_list, topic_list, table)
+        table.append_student(["Eve", "e", "e@e.e", "1", "2", "", "3"])
+        self.assertRaises(ValueError, selection.add_students, student_list, topic_list, table)
+        selection.add_students(table.student_list(), topic_list, table)
+        self.assertEqual(selection.nb_student, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+"""
+Tests of batchSender: sheets found, sheets rendered in the worker processes,
+bad sheets failing alone, mails of all the sheets sent to one SMTP server.
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import StringIO
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+import batchSender
+from smtpServer import StandinServer
+
+GOOD = ["Name;Surname;mail;Topic1;Topic2",
+        "Mean;;;10;12", "Highest;;;18;19", "Lowest;;;2;3",
+        "A;a;a@a.a;8;15", "B;b;b@b.b;12;9", "C;c;;5;5"]
+
+
+class BatchSenderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.stdout = sys.stdout
+
+    def tearDown(self):
+        sys.stdout = self.stdout
+        shutil.rmtree(self.directory)
+
+    def write(self, name, lines):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as sheet_file:
+            sheet_file.write('\n'.join(lines) + '\n')
+        return path
+
+    def main(self, *argv):
+        sys.stdout = StringIO.StringIO()
+        try:
+            code = batchSender.main(['batchSender.py'] + list(argv))
+            return code, sys.stdout.getvalue()
+        finally:
+            sys.stdout = self.stdout
+
+    def job(self, path, expression='where mark<10', dry_run=True):
+        return (path, expression, None, "t@t.t", "Your marks", None, dry_run, False)
+
+    def test_find_sheets(self):
+        first = self.write('a.csv', GOOD)
+        second = self.write('b.csv', GOOD)
+        self.write('notes.txt', GOOD)
+        self.assertEqual(batchSender.find_sheets([self.directory, first]), [first, second])
+        self.assertEqual(batchSender.find_sheets([os.path.join(self.directory, 'b*')]),
+                         [second])
+        # a missing file is kept, to be reported as not processed
+        missing = os.path.join(self.directory, 'missing.csv')
+        self.assertEqual(batchSender.find_sheets([missing]), [missing])
+
+    def test_render_sheet(self):
+        sheet = batchSender.render_sheet(self.job(self.write('a.csv', GOOD)))
+        self.assertIsNone(sheet['error'])
+        self.assertEqual(sheet['nb_selected'], 4)
+        self.assertEqual(sheet['no_address'], ["C"])
+        self.assertEqual([(mail[0], mail[1], mail[3]) for mail in sheet['mails']],
+                         [("a@a.a", ["Topic1"], None), ("b@b.b", ["Topic2"], None)])
+        sheet = batchSender.render_sheet(self.job(sheet['path'], dry_run=False))
+        self.assertIn("To: a@a.a", sheet['mails'][0][3])
+
+    def test_bad_sheets(self):
+        sheet = batchSender.render_sheet(self.job(self.write('short.csv', GOOD[:2])))
+        self.assertEqual(sheet['error'], "incomplete sheet, the 4 reserved lines are missing")
+        sheet = batchSender.render_sheet(self.job(os.path.join(self.directory, 'no.csv')))
+        self.assertTrue(sheet['error'].startswith("IOError"))
+        self.assertEqual(sheet['mails'], [])
+
+    def test_dry_run(self):
+        self.write('a.csv', GOOD)
+        self.write('b.csv', GOOD)
+        code, output = self.main('--dry-run', '--processes', '2',
+                                 '--select', 'where mark<10', self.directory)
+        self.assertEqual(code, 0)
+        self.assertIn("2 sheet(s), 0 not processed", output)
+        self.write('c.csv', GOOD[:3])
+        code, output = self.main('--dry-run', '--processes', '2',
+                                 '--select', 'where mark<10', self.directory)
+        self.assertEqual(code, 1)
+        self.assertIn("c.csv: not processed", output)
+
+    def test_send(self):
+        server = StandinServer()
+        try:
+            self.write('a.csv', GOOD)
+            self.write('b.csv', GOOD)
+            self.write('c.csv', GOOD[:3])
+            journal = os.path.join(self.directory, 'journal')
+            argv = ['--sender', 't@t.t', '--smtp-host', '127.0.0.1',
+                    '--smtp-port', str(server.port()), '--journal', journal,
+                    '--resume', '--processes', '2', '--select', 'where mark<10',
+                    os.path.join(self.directory, '*.csv')]
+            code, output = self.main(*argv)
+            # the sheet c.csv is incomplete
+            self.assertEqual(code, 1)
+            self.assertIn("4 mail(s) sent", output)
+            self.assertEqual(server.nb_received, 4)
+            # the mails are in the journal: nothing sent again
+            code, output = self.main(*argv)
+            self.assertIn("0 mail(s) sent", output)
+            self.assertEqual(server.nb_received, 4)
+        finally:
+            server.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+"""
+Tests of mailDispatch: token bucket, and dispatch of the messages by the
+worker threads (with fake pools, and against a stand-in SMTP server).
+"""
+
+import os
+import sys
+import time
+import threading
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+import mailUtils as mailU
+import mailDispatch
+from smtpServer import StandinServer
+
+
+class FakePool(object):
+    """
+    Pool sending nothing, after waiting for an event (set at once by default).
+    Raises for the receivers in failing.
+    """
+
+    def __init__(self, failing=()):
+        self.failing = failing
+        self.go = threading.Event()
+        self.go.set()
+        self.sent = []
+        self.lock = threading.Lock()
+
+    def send(self, sender, receiver, message):
+        self.go.wait()
+        if receiver in self.failing:
+            raise IOError("disk full")
+        with self.lock:
+            self.sent.append(receiver)
+        return mailU.SendResult(receiver, True, None, 1)
+
+
+class TokenBucketTest(unittest.TestCase):
+
+    def test_rate(self):
+        bucket = mailDispatch.TokenBucket(50)
+        start = time.time()
+        for iToken in range(11):
+            bucket.acquire()
+        # the first token is there at once, the next ones every 20 ms
+        self.assertGreaterEqual(time.time() - start, 0.18)
+
+    def test_burst(self):
+        bucket = mailDispatch.TokenBucket(1, burst=5)
+        start = time.time()
+        for iToken in range(5):
+            bucket.acquire()
+        self.assertLess(time.time() - start, 0.5)
+
+
+class DispatcherTest(unittest.TestCase):
+
+    def test_every_message_is_reported(self):
+        pool = FakePool()
+        tags = []
+        dispatcher = mailDispatch.Dispatcher(pool, workers=3,
+                                             on_result=lambda result, tag: tags.append(tag))
+        for iMessage in range(50):
+            dispatcher.put("t@t.t", "s%d@s.s" % iMessage, "message", iMessage)
+        results = dispatcher.close()
+        self.assertEqual(len(results), 50)
+        self.assertEqual(sorted(tags), range(50))
+        self.assertEqual(len(pool.sent), 50)
+
+    def test_rate(self):
+        dispatcher = mailDispatch.Dispatcher(FakePool(), workers=4, rate=100)
+        start = time.time()
+        for iMessage in range(21):
+            dispatcher.put("t@t.t", "s%d@s.s" % iMessage, "message")
+        dispatcher.close()
+        self.assertGreaterEqual(time.time() - start, 0.18)
+
+    def test_backpressure(self):
+        pool = FakePool()
+        pool.go.clear()
+        dispatcher = mailDispatch.Dispatcher(pool, workers=1, queue_size=2)
+        done = threading.Event()
+
+        def produce():
+            for iMessage in range(10):
+                dispatcher.put("t@t.t", "s%d@s.s" % iMessage, "message")
+            done.set()
+
+        producer = threading.Thread(target=produce)
+        producer.daemon = True
+        producer.start()
+        # 1 message being sent, 2 in the queue: put blocks
+        self.assertFalse(done.wait(0.2))
+        pool.go.set()
+        self.assertTrue(done.wait(5))
+        self.assertEqual(len(dispatcher.close()), 10)
+
+    def test_errors_do_not_stop_the_workers(self):
+        pool = FakePool(failing=("s1@s.s", "s2@s.s"))
+        dispatcher = mailDispatch.Dispatcher(pool, workers=1, queue_size=1)
+        for iMessage in range(6):
+            dispatcher.put("t@t.t", "s%d@s.s" % iMessage, "message")
+        results = dict((result.receiver, result) for result in dispatcher.close())
+        self.assertEqual(len(results), 6)
+        self.assertFalse(results["s1@s.s"].ok)
+        self.assertEqual(results["s1@s.s"].error, "disk full")
+        self.assertTrue(results["s3@s.s"].ok)
+
+    def test_reporting_errors_do_not_stop_the_workers(self):
+        def on_result(result, tag):
+            if tag == 1:
+                raise IOError("journal not writable")
+
+        dispatcher = mailDispatch.Dispatcher(FakePool(), workers=1, queue_size=1,
+                                             on_result=on_result)
+        for iMessage in range(4):
+            dispatcher.put("t@t.t", "s%d@s.s" % iMessage, "message", iMessage)
+        results = dispatcher.close()
+        self.assertEqual([result.ok for result in results], [True, False, True, True])
+
+    def test_smtp(self):
+        server = StandinServer()
+        pool = mailU.SMTPPool('127.0.0.1', server.port(), size=2)
+        dispatcher = mailDispatch.Dispatcher(pool, workers=2)
+        for iMessage in range(20):
+            receiver = "student%d@example.org" % iMessage
+            dispatcher.put("teacher@example.org", receiver,
+                           mailU.build_message("teacher@example.org", receiver,
+                                               "Your marks", "Mark: 12\n"))
+        results = dispatcher.close()
+        pool.close()
+        server.stop()
+        self.assertTrue(all(result.ok for result in results))
+        self.assertEqual(server.nb_received, 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+"""
+Tests of mailJournal, and of a run resumed from the journal (marksender
+--journal --resume, the mails written to an eml spool).
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import threading
+import StringIO
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+import mailJournal
+import marksender
+
+SHEET = os.path.join(ROOT, 'test_marks.csv')
+
+
+class JournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'journal')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_message_key(self):
+        key = mailJournal.message_key("a@a.a", ["Topic1", "Topic2"], "body")
+        self.assertEqual(key, mailJournal.message_key("a@a.a", ["Topic1", "Topic2"], "body"))
+        self.assertNotEqual(key, mailJournal.message_key("a@a.a", ["Topic1"], "body"))
+        self.assertNotEqual(key, mailJournal.message_key("a@a.a", ["Topic1", "Topic2"],
+                                                         "other body"))
+
+    def test_last_status_wins(self):
+        journal = mailJournal.SendJournal(self.path, sync_every=1)
+        journal.record('k1', "a@a.a", ["Topic1"], mailJournal.FAILED)
+        journal.record('k2', "b@b.b", ["Topic1"], mailJournal.SENT)
+        journal.record('k1', "a@a.a", ["Topic1"], mailJournal.SENT)
+        journal.record('k3', "c@c.c", [], mailJournal.FAILED)
+        journal.close()
+        self.assertEqual(mailJournal.read_journal(self.path),
+                         {'k1': 'sent', 'k2': 'sent', 'k3': 'failed'})
+        self.assertEqual(mailJournal.SendJournal(self.path).delivered(),
+                         set(['k1', 'k2']))
+
+    def test_truncated_line(self):
+        journal = mailJournal.SendJournal(self.path)
+        journal.record('k1', "a@a.a", ["Topic1"], mailJournal.SENT)
+        journal.close()
+        # crash while writing a record
+        with open(self.path, 'a') as journal_file:
+            journal_file.write('sent\tk2\tb@b')
+        self.assertEqual(mailJournal.read_journal(self.path), {'k1': 'sent'})
+        # the next records are not merged with the truncated line
+        journal = mailJournal.SendJournal(self.path)
+        journal.record('k3', "c@c.c", ["Topic1"], mailJournal.SENT)
+        journal.close()
+        status = mailJournal.read_journal(self.path)
+        self.assertEqual(status['k1'], 'sent')
+        self.assertEqual(status['k3'], 'sent')
+
+    def test_threads(self):
+        journal = mailJournal.SendJournal(self.path, sync_every=7)
+
+        def record(iThread):
+            for iMessage in range(100):
+                journal.record('k%d.%d' % (iThread, iMessage), "a@a.a",
+                               ["Topic1", "Topic2"], mailJournal.SENT)
+
+        threads = [threading.Thread(target=record, args=(iThread,)) for iThread in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        journal.close()
+        with open(self.path) as journal_file:
+            lines = journal_file.readlines()
+        self.assertEqual(len(lines), 400)
+        self.assertTrue(all(line.count('\t') == 3 for line in lines))
+        self.assertEqual(len(mailJournal.read_journal(self.path)), 400)
+
+    def test_missing_journal(self):
+        self.assertEqual(mailJournal.read_journal(self.path), {})
+
+
+class ResumeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.journal = os.path.join(self.directory, 'journal')
+        self.sheet = os.path.join(self.directory, 'marks.csv')
+        shutil.copy(SHEET, self.sheet)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def run_marksender(self, spool, *options):
+        output = StringIO.StringIO()
+        stdout = sys.stdout
+        sys.stdout = output
+        try:
+            code = marksender.main(['marksender.py', '--sender', 'teacher@example.org',
+                                    '--spool', 'eml:' + os.path.join(self.directory, spool),
+                                    '--journal', self.journal] + list(options)
+                                   + [self.sheet])
+        finally:
+            sys.stdout = stdout
+        return code, os.listdir(os.path.join(self.directory, spool))
+
+    def test_resume_skips_the_delivered_mails(self):
+        code, first = self.run_marksender('first', '--select', 'topics=Topic1')
+        # student D has no mail address
+        self.assertEqual(code, 2)
+        self.assertEqual(len(first), 4)
+        code, second = self.run_marksender('second', '--resume', '--select', 'topics=Topic1')
+        self.assertEqual(second, [])
+        # the mails with other marks are new messages (C has no Topic2 mark:
+        # his mail is the same)
+        code, third = self.run_marksender('third', '--resume',
+                                          '--select', 'topics=Topic1,Topic2')
+        self.assertEqual(len(third), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+"""
+Tests of mailRouting: relay map, routes, shared pools and retries of the
+greylisted messages, against stand-in SMTP servers (see smtpServer).
+"""
+
+import os
+import sys
+import time
+import threading
+import unittest
+import collections
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+import mailUtils as mailU
+import mailRouting
+from smtpServer import StandinServer
+
+
+def message(receiver):
+    return mailU.build_message("teacher@example.org", receiver, "Your marks",
+                               "Your mark for Topic1 is 12.\n")
+
+
+class ParseRoutesTest(unittest.TestCase):
+
+    def test_routes(self):
+        routes = mailRouting.parse_routes([
+            "# comment",
+            "",
+            "u-psud.fr  smtp.u-psud.fr  4",
+            "@gmail.com relay.example.org:587",
+        ], 'localhost', default_connections=2)
+        self.assertEqual(routes['u-psud.fr'],
+                         mailRouting.Route('u-psud.fr', 'smtp.u-psud.fr', 25, 4, 4))
+        self.assertEqual(routes['gmail.com'],
+                         mailRouting.Route('gmail.com', 'relay.example.org', 587, 2, 2))
+        # half of the connections of the * route for each of its domains
+        self.assertEqual(routes['*'], mailRouting.Route('*', 'localhost', 25, 2, 1))
+        routes = mailRouting.parse_routes(["* relay 6", "a.org host 4 1"], 'localhost')
+        self.assertEqual(routes['*'].domain_connections, 3)
+        self.assertEqual(routes['a.org'].domain_connections, 1)
+
+    def test_invalid_lines(self):
+        for line in ("a.org", "a.org host:port", "a.org host 0", "a.org host 1 2",
+                     "a.org host 2 0", "a.org host 1 1 1"):
+            self.assertRaises(ValueError, mailRouting.parse_routes, [line], 'localhost')
+        self.assertRaises(ValueError, mailRouting.parse_routes,
+                          ["a.org host", "A.org host"], 'localhost')
+
+    def test_find_route(self):
+        routes = mailRouting.parse_routes(["u-psud.fr host"], 'localhost')
+        self.assertEqual(mailRouting.find_route(routes, 'u-psud.fr').domain, 'u-psud.fr')
+        self.assertEqual(mailRouting.find_route(routes, 'lal.u-psud.fr').domain, 'u-psud.fr')
+        self.assertEqual(mailRouting.find_route(routes, 'psud.fr').domain, '*')
+        self.assertEqual(mailRouting.recipient_domain("A.B@Lal.U-Psud.FR "), 'lal.u-psud.fr')
+
+
+class RoutingDispatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.servers = []
+        self.opened = []
+
+    def tearDown(self):
+        for server in self.servers:
+            server.stop()
+
+    def server(self, **options):
+        server = StandinServer(**options)
+        self.servers.append(server)
+        return server
+
+    def dispatcher(self, lines, default_server, **options):
+        routes = mailRouting.parse_routes(lines, '127.0.0.1', default_server.port())
+
+        def open_pool(route):
+            pool = mailU.SMTPPool(route.host, route.port, size=route.connections)
+            self.opened.append(route)
+            return pool
+
+        self.pools = mailRouting.RelayPools(open_pool)
+        return mailRouting.RoutingDispatcher(routes, self.pools, **options)
+
+    def send(self, dispatcher, receivers):
+        tags = []
+        dispatcher.on_result = lambda result, tag: tags.append(tag)
+        for receiver in receivers:
+            dispatcher.put("teacher@example.org", receiver, message(receiver), receiver)
+        results = dispatcher.close()
+        self.pools.close()
+        self.assertEqual(sorted(tags), sorted(receivers))
+        return results
+
+    def test_one_pool_per_route(self):
+        default = self.server()
+        routed = self.server()
+        dispatcher = self.dispatcher(["u-psud.fr 127.0.0.1:%d 1" % routed.port()], default)
+        receivers = ["s%d@d%d.example" % (iMessage, iMessage % 5) for iMessage in range(20)] \
+            + ["s%d@u-psud.fr" % iMessage for iMessage in range(5)]
+        results = self.send(dispatcher, receivers)
+        self.assertTrue(all(result.ok for result in results))
+        # the 5 domains of the * route share its pool
+        self.assertEqual(sorted(route.domain for route in self.opened), ['*', 'u-psud.fr'])
+        self.assertEqual(default.nb_received, 20)
+        self.assertEqual(routed.nb_received, 5)
+        for queue in dispatcher.route_queues.values():
+            self.assertEqual(queue.nb_workers, 0)
+
+    def test_greylisted_messages_are_sent_again(self):
+        default = self.server()
+        grey = self.server(greylist=True)
+        dispatcher = self.dispatcher(["grey.example 127.0.0.1:%d" % grey.port()], default,
+                                     delay=0.05)
+        receivers = ["s%d@grey.example" % iMessage for iMessage in range(4)] \
+            + ["s%d@fast.example" % iMessage for iMessage in range(4)]
+        results = self.send(dispatcher, receivers)
+        self.assertTrue(all(result.ok for result in results))
+        attempts = dict((result.receiver, result.attempts) for result in results)
+        for iMessage in range(4):
+            self.assertEqual(attempts["s%d@grey.example" % iMessage], 2)
+            self.assertEqual(attempts["s%d@fast.example" % iMessage], 1)
+
+    def test_retries_are_limited(self):
+        default = self.server()
+        # the relay of the route does not exist: every attempt fails
+        dispatcher = self.dispatcher(["down.example 127.0.0.1:1"], default,
+                                     delay=0.01, max_retries=2)
+        results = self.send(dispatcher, ["a@down.example", "b@up.example"])
+        results = dict((result.receiver, result) for result in results)
+        self.assertFalse(results["a@down.example"].ok)
+        self.assertTrue(results["b@up.example"].ok)
+
+    def test_per_domain_connections(self):
+        slow = self.server(delay=0.1)
+        dispatcher = self.dispatcher(["* 127.0.0.1:%d 4" % slow.port()], slow)
+        receivers = ["s%d@slow.example" % iMessage for iMessage in range(8)]
+        results = self.send(dispatcher, receivers)
+        self.assertTrue(all(result.ok for result in results))
+        # 2 of the 4 connections for a single domain
+        self.assertEqual(slow.max_open, 2)
+
+    def test_slow_domain_does_not_hold_the_route(self):
+        pools = mailRouting.RelayPools(lambda route: CountingPool())
+        routes = mailRouting.parse_routes([], '127.0.0.1', default_connections=4)
+        dispatcher = mailRouting.RoutingDispatcher(routes, pools)
+        for iMessage in range(8):
+            dispatcher.put("t@t.t", "s%d@slow.example" % iMessage, "message")
+        for iMessage in range(2):
+            dispatcher.put("t@t.t", "s%d@fast.example" % iMessage, "message")
+        results = dispatcher.close()
+        pool = pools.pool(routes['*'])
+        self.assertEqual(len(results), 10)
+        self.assertEqual(pool.max_active['slow.example'], 2)
+        # the fast domain did not wait for the slow one
+        self.assertLess(max(pool.done['fast.example']), max(pool.done['slow.example']))
+
+    def test_errors_do_not_stop_the_workers(self):
+        def on_result(result, tag):
+            if tag == 1:
+                raise IOError("journal not writable")
+
+        pools = mailRouting.RelayPools(lambda route: CountingPool(failing=("s2@a.org",)))
+        routes = mailRouting.parse_routes([], '127.0.0.1', default_connections=1)
+        dispatcher = mailRouting.RoutingDispatcher(routes, pools, on_result=on_result)
+        for iMessage in range(4):
+            dispatcher.put("t@t.t", "s%d@a.org" % iMessage, "message", iMessage)
+        results = dict((result.receiver, result) for result in dispatcher.close())
+        self.assertEqual([results["s%d@a.org" % iMessage].ok for iMessage in range(4)],
+                         [True, False, False, True])
+        self.assertEqual(results["s2@a.org"].error, "disk full")
+        self.assertEqual(dispatcher.route_queues[routes['*']].nb_workers, 0)
+
+
+class CountingPool(object):
+    """
+    Pool sending nothing, slowly for the slow.example domain, counting the
+    messages of each domain being sent. Raises for the receivers in failing.
+    """
+
+    def __init__(self, failing=()):
+        self.failing = failing
+        self.active = collections.defaultdict(int)
+        self.max_active = {}
+        self.done = collections.defaultdict(list)
+        self.lock = threading.Lock()
+
+    def send(self, sender, receiver, message):
+        domain = mailRouting.recipient_domain(receiver)
+        with self.lock:
+            self.active[domain] += 1
+            self.max_active[domain] = max(self.max_active.get(domain, 0),
+                                          self.active[domain])
+        time.sleep(0.05 if domain == 'slow.example' else 0.01)
+        with self.lock:
+            self.active[domain] -= 1
+            self.done[domain].append(time.time())
+        if receiver in self.failing:
+            raise IOError("disk full")
+        return mailU.SendResult(receiver, True, None, 1)
+
+    def close(self):
+        pass
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+"""
+Tests of mailSpool: Maildir, .eml and mbox spools, and of the messages
+written to them (see mailUtils.build_message).
+"""
+
+import os
+import sys
+import email
+import argparse
+import mailbox
+import shutil
+import tempfile
+import unittest
+import StringIO
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+import mailUtils as mailU
+import mailSpool
+import marksender
+
+BODY = "Hello,\nYour mark for Th\xc3\xa9orie is 12.\nFrom now on, 12 = 12.\n"
+
+
+def message(receiver):
+    return mailU.build_message("teacher@example.org", receiver, "Your marks", BODY)
+
+
+class BuildMessageTest(unittest.TestCase):
+
+    def test_readable_body(self):
+        text = message("a@a.a")
+        self.assertIn("Content-Transfer-Encoding: quoted-printable", text)
+        self.assertIn("Your mark for Th=C3=A9orie is 12.\nFrom now on, 12 =3D 12.", text)
+        parsed = email.message_from_string(text)
+        self.assertEqual(parsed['To'], "a@a.a")
+        self.assertEqual(parsed.get_payload(decode=True), BODY)
+
+
+class SpoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def send(self, spool, receivers):
+        results = [spool.send("teacher@example.org", receiver, message(receiver))
+                   for receiver in receivers]
+        spool.close()
+        self.assertTrue(all(result.ok for result in results))
+
+    def test_parse_spool(self):
+        self.assertEqual(mailSpool.parse_spool("mbox:out:1"), (mailSpool.MboxSpool, "out:1"))
+        for description in ("out", "mbox:", "mh:out"):
+            self.assertRaises(ValueError, mailSpool.parse_spool, description)
+
+    def test_maildir(self):
+        path = os.path.join(self.directory, 'Maildir')
+        self.send(mailSpool.open_spool("maildir:" + path), ["a@a.a", "b@b.b"])
+        self.assertEqual(os.listdir(os.path.join(path, 'tmp')), [])
+        receivers = sorted(spooled['To'] for spooled in mailbox.Maildir(path, factory=None))
+        self.assertEqual(receivers, ["a@a.a", "b@b.b"])
+
+    def test_eml(self):
+        path = os.path.join(self.directory, 'eml')
+        self.send(mailSpool.open_spool("eml:" + path), ["a@a.a", "b/c@b.b"])
+        # numbered after the messages of the previous run
+        self.send(mailSpool.open_spool("eml:" + path), ["d@d.d"])
+        names = sorted(os.listdir(path))
+        self.assertEqual(names, ["000000-a@a.a.eml", "000001-b_c@b.b.eml",
+                                 "000002-d@d.d.eml"])
+        with open(os.path.join(path, names[2])) as eml_file:
+            self.assertEqual(email.message_from_file(eml_file).get_payload(decode=True),
+                             BODY)
+
+    def test_mbox(self):
+        path = os.path.join(self.directory, 'mbox')
+        self.send(mailSpool.open_spool("mbox:" + path), ["a@a.a", "b@b.b"])
+        self.send(mailSpool.open_spool("mbox:" + path), ["c@c.c"])
+        with open(path) as mbox_file:
+            content = mbox_file.read()
+        self.assertEqual(content.count("\nFrom teacher@example.org "), 2)
+        # the From line of the body is quoted
+        self.assertIn("\n>From now on", content)
+        spooled = list(mailbox.mbox(path))
+        self.assertEqual([message['To'] for message in spooled], ["a@a.a", "b@b.b", "c@c.c"])
+
+    def test_mbox_not_writable(self):
+        self.assertRaises(OSError, mailSpool.MboxSpool,
+                          os.path.join(self.directory, 'missing', 'mbox'))
+
+    def test_not_with_dry_run(self):
+        parser = argparse.ArgumentParser()
+        parser.add_argument("--dry-run", action="store_true")
+        marksender.add_smtp_arguments(parser)
+        # argparse prints the error
+        stderr = sys.stderr
+        sys.stderr = StringIO.StringIO()
+        try:
+            args = parser.parse_args(["--dry-run", "--spool", "eml:" + self.directory])
+            self.assertRaises(SystemExit, marksender.check_smtp_arguments, parser, args)
+            error = sys.stderr.getvalue()
+        finally:
+            sys.stderr = stderr
+        self.assertIn("--spool cannot be used with --dry-run", error)
+
+
+if __name__ == '__main__':
+    unittest.main()
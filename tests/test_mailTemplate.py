@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+"""
+Tests of mailUtils.MailTemplate, against the body built by the first
+version of build_body (list of lists and boolean array).
+"""
+
+import os
+import sys
+import random
+import shutil
+import tempfile
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+import mailUtils as mailU
+from retrieve_marks import build_list_dic
+from SelectionModel import SelectionModel
+
+DATA = [
+    ["Name", "Surname", "mail", "Topic1", "", "Topic2", "Topic3", "Topic4"],
+    ["Mean", "", "", "25", "", "26", "28.5", "29"],
+    ["Highest", "", "", "49", "", "50", "52", "53"],
+    ["Lowest", "", "", "1", "", "2", "4", "5"],
+    ["A", "a", "a.a@a.a", "1", "", "2", "4", "5,5"],
+    ["B", "b", "b.b@b.b", "17", "", "", "20", "21"],
+    ["", "", "", "", "", "", "", ""],
+    ["E", "e", "e.e@e.e", "18", "", "23", "39", "14"],
+    ["C", "c", "c.c@c.c", "", "", "", "", ""],
+]
+
+
+def first_build_body(iStudent, topic_list, data, to_send_array):
+    """
+    build_body before MailTemplate.
+    """
+    core = ""
+    nb_topics_to_send = 0
+    for iTopic in range(len(topic_list)):
+        if not to_send_array[iStudent][iTopic]:
+            continue
+        if data[iStudent+4][iTopic+3] == '':
+            continue
+        nb_topics_to_send += 1
+        core += "Your mark for %s is %s. Mean is %s, highest grade is %s, lowest grade is %s.\n" \
+            % (topic_list[iTopic], data[iStudent+4][iTopic+3], data[1][iTopic+3],
+               data[2][iTopic+3], data[3][iTopic+3])
+    if nb_topics_to_send == 0:
+        return ""
+    return "Hello,\n" + core + "Have a good day,\nAntoine Laudrain"
+
+
+def sheet():
+    table, topic_list, student_list = build_list_dic(
+        [';'.join(line) for line in DATA], False, False)
+    return table, topic_list, SelectionModel(student_list, topic_list, table)
+
+
+class MailTemplateTest(unittest.TestCase):
+
+    def test_same_as_first_build_body(self):
+        table, topic_list, selection = sheet()
+        template = mailU.MailTemplate().prepare(table, topic_list)
+        generator = random.Random(3)
+        for iDraw in range(20):
+            to_send = [[generator.random() < 0.5 for iTopic in range(len(topic_list))]
+                       for iStudent in range(table.nb_student)]
+            selection.reset()
+            for iStudent in range(table.nb_student):
+                for iTopic in range(len(topic_list)):
+                    if to_send[iStudent][iTopic]:
+                        selection.set_single(iStudent, iTopic, True)
+            # the cells without header or mark are not selectable
+            to_send_array = [[selection.is_selected(iStudent, iTopic)
+                              for iTopic in range(len(topic_list))]
+                             for iStudent in range(table.nb_student)]
+            for iStudent in range(table.nb_student):
+                expected = first_build_body(iStudent, topic_list, DATA, to_send_array)
+                self.assertEqual(template.render(iStudent, selection), expected)
+                self.assertEqual(mailU.build_body(iStudent, topic_list, table, selection),
+                                 expected)
+
+    def test_fields(self):
+        table, topic_list, selection = sheet()
+        selection.set_student(0, True)
+        template = mailU.MailTemplate("Dear %(surname)s %(name)s,\n",
+                                      "%(topic)s: %(mark)s (100% = %(max)s)\n",
+                                      "-- %(email)s")
+        template.prepare(table, topic_list)
+        self.assertEqual(template.render(0, selection),
+                         "Dear a A,\nTopic1: 1 (100% = 49)\nTopic2: 2 (100% = 50)\n"
+                         "Topic3: 4 (100% = 52)\nTopic4: 5,5 (100% = 53)\n-- a.a@a.a")
+
+    def test_statistics_fields(self):
+        table, topic_list, selection = sheet()
+        selection.set_topic(0, True)
+        template = mailU.MailTemplate("", "%(rank)s/%(nb_marks)s\n", "")
+        self.assertTrue(template.needs_statistics)
+        template.prepare(table, topic_list)
+        self.assertEqual([template.render(iStudent, selection) for iStudent in (0, 1, 3)],
+                         ["3/3\n", "2/3\n", "1/3\n"])
+
+    def test_unknown_field(self):
+        self.assertRaises(ValueError, mailU.MailTemplate, "%(mark)s", "", "")
+        self.assertRaises(ValueError, mailU.MailTemplate, "", "%(grade)s", "")
+
+    def test_from_file(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'template')
+            with open(path, 'w') as template_file:
+                template_file.write("[opening]\nHi %(name)s\n[topic]\n%(topic)s=%(mark)s\n"
+                                    "[closing]\nBye\n")
+            template = mailU.MailTemplate.from_file(path)
+            with open(path, 'w') as template_file:
+                template_file.write("[opening]\nHi\n")
+            self.assertRaises(ValueError, mailU.MailTemplate.from_file, path)
+        finally:
+            shutil.rmtree(directory)
+        table, topic_list, selection = sheet()
+        selection.set_single(3, 0, True)
+        template.prepare(table, topic_list)
+        self.assertEqual(template.render(3, selection), "Hi E\nTopic1=18\nBye\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
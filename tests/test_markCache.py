@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+"""
+Tests of the cache of the parsed sheets (markCache), with dense and sparse
+tables.
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+import markCache
+from sheets import sheet_lines, cells
+
+class CacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.directory, 'cache')
+        self.path = os.path.join(self.directory, 'marks.csv')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, lines, mtime=None):
+        with open(self.path, 'w') as sheet_file:
+            sheet_file.writelines(lines)
+        if mtime is not None:
+            os.utime(self.path, (mtime, mtime))
+
+    def build(self, sort=False):
+        return markCache.build_list_dic_cached(self.path, sort, sort, self.cache_dir)
+
+    def check_cache(self, filled):
+        lines = sheet_lines(40, filled)
+        self.write(lines)
+        table, topics, students, hit = self.build(True)
+        self.assertFalse(hit)
+        cached, cached_topics, cached_students, hit = self.build(True)
+        self.assertTrue(hit)
+        self.assertIs(type(cached), type(table))
+        self.assertEqual(cells(cached), cells(table))
+        self.assertEqual(cached_students, students)
+        self.assertEqual(cached_topics, topics)
+        self.assertEqual([cached.email(iStudent) for iStudent in range(40)],
+                         [table.email(iStudent) for iStudent in range(40)])
+
+    def test_dense(self):
+        self.check_cache(lambda s, t: t != 3)
+
+    def test_sparse(self):
+        self.check_cache(lambda s, t: (s * t) % 11 == 1)
+
+    def test_changed_file(self):
+        self.write(sheet_lines(10, lambda s, t: True), time.time() - 100)
+        self.build()
+        self.write(sheet_lines(10, lambda s, t: t != 0), time.time() - 50)
+        table, topics, students, hit = self.build()
+        self.assertFalse(hit)
+        self.assertFalse(table.has_mark(0, 0))
+
+    def test_touched_file_renews_the_key(self):
+        lines = sheet_lines(10, lambda s, t: True)
+        self.write(lines, time.time() - 100)
+        self.build()
+        self.write(lines, time.time() - 50)
+        self.assertTrue(self.build()[3])
+        # the content is not hashed again
+        status = os.stat(self.path)
+        cached = markCache.read_cache(markCache.cache_path(self.cache_dir, self.path),
+                                      (os.path.abspath(self.path), status.st_size,
+                                       status.st_mtime, None))
+        self.assertIsNotNone(cached)
+        self.assertIsNone(cached[3])
+
+    def test_corrupted_cache(self):
+        self.write(sheet_lines(10, lambda s, t: True))
+        self.build()
+        with open(markCache.cache_path(self.cache_dir, self.path), 'r+b') as cache_file:
+            cache_file.seek(-5, os.SEEK_END)
+            cache_file.truncate()
+        table, topics, students, hit = self.build()
+        self.assertFalse(hit)
+        self.assertEqual(table.nb_student, 10)
+
+    def test_cache_not_writable(self):
+        self.write(sheet_lines(10, lambda s, t: True))
+        # a file in place of the cache directory: the sheet is parsed anyway
+        with open(self.cache_dir, 'w'):
+            pass
+        for iRun in range(2):
+            table, topics, students, hit = self.build()
+            self.assertFalse(hit)
+            self.assertEqual(table.nb_student, 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
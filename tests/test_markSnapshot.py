@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+"""
+Tests of markSnapshot: marks recorded once sent, new and modified marks
+found in a new version of the sheet, whatever the order of its lines.
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+from markSnapshot import MarkSnapshot
+from retrieve_marks import build_list_dic
+from SelectionModel import SelectionModel
+
+HEADER = ["Name;Surname;mail;Topic A;Topic B",
+          "Mean;;;10;10", "Highest;;;20;20", "Lowest;;;0;0"]
+
+
+def sheet(students, sort=False):
+    table, topic_list, student_list = build_list_dic(HEADER + students, sort, sort)
+    return table, SelectionModel(student_list, topic_list, table)
+
+
+def changed(snapshot, table, selection):
+    """
+    :return: (student, topic) names of the changed cells
+    """
+    selection.reset()
+    selection.set_mask(snapshot.changed_mask(table, selection), True)
+    student_list = table.student_list()
+    topic_list = table.topic_list()
+    return sorted((student_list[iStudent], topic_list[iTopic])
+                  for iStudent in range(selection.nb_student)
+                  for iTopic in selection.selected_topics(iStudent))
+
+
+class MarkSnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'snapshot')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_changed_marks(self):
+        snapshot = MarkSnapshot(None)
+        table, selection = sheet(["Ann;a;a@a.a;4;12", "Bob;b;b@b.b;15;", "Cid;c;;8;8"])
+        # everything is new, but Cid has no mail address
+        self.assertEqual(changed(snapshot, table, selection),
+                         [("Ann", "Topic A"), ("Ann", "Topic B"), ("Bob", "Topic A")])
+        snapshot.record(table, selection, [0, 1])
+        self.assertEqual(changed(snapshot, table, selection), [])
+        # new line, new mark, modified mark, lines moved
+        table, selection = sheet(["Dan;d;d@d.d;9;", "Bob;b;b@b.b;15;11",
+                                  "Ann;a;a@a.a;5;12"], sort=True)
+        self.assertEqual(changed(snapshot, table, selection),
+                         [("Ann", "Topic A"), ("Bob", "Topic B"), ("Dan", "Topic A")])
+
+    def test_only_the_selected_marks_are_recorded(self):
+        snapshot = MarkSnapshot(None)
+        table, selection = sheet(["Ann;a;a@a.a;4;12", "Bob;b;b@b.b;15;7"])
+        selection.set_topic(0, True)
+        snapshot.record(table, selection, [0, 1])
+        snapshot.record_mail("b@b.b", [("Topic B", table.column_values(1)[1])])
+        self.assertEqual(changed(snapshot, table, selection), [("Ann", "Topic B")])
+
+    def test_save(self):
+        snapshot = MarkSnapshot(self.path)
+        self.assertEqual(snapshot.marks, {})
+        table, selection = sheet(["Ann;a;a@a.a;4;12"])
+        selection.select_all()
+        snapshot.record(table, selection, [0])
+        snapshot.save()
+        self.assertEqual(os.listdir(self.directory), ['snapshot'])
+        self.assertEqual(changed(MarkSnapshot(self.path), table, selection), [])
+
+    def test_not_a_snapshot(self):
+        with open(self.path, 'w') as snapshot_file:
+            snapshot_file.write("Name;Surname;mail\n")
+        self.assertRaises(ValueError, MarkSnapshot, self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
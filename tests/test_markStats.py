@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+"""
+Tests of markStats: statistics of a topic, against a direct computation,
+and statistics of a table kept up to date with its cells.
+"""
+
+import os
+import sys
+import math
+import random
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+import markStats
+from retrieve_marks import build_list_dic
+
+LINES = ["Name;Surname;mail;Topic B;Topic A",
+         "Mean;;;0;0", "Highest;;;0;0", "Lowest;;;0;0",
+         "Ann;a;a@a.a;12;abs", "Bob;b;b@b.b;8;15", "Cid;c;c@c.c;;9,5",
+         "Dan;d;d@d.d;12;11"]
+
+
+class TopicStatsTest(unittest.TestCase):
+
+    def test_same_as_direct_computation(self):
+        generator = random.Random(5)
+        marks = [generator.randint(0, 40) / 2. for iMark in range(101)]
+        stats = markStats.TopicStats(marks)
+        mean = sum(marks) / len(marks)
+        self.assertAlmostEqual(stats.mean(), mean)
+        self.assertAlmostEqual(stats.std(),
+                               math.sqrt(sum((mark - mean) ** 2 for mark in marks) / len(marks)))
+        self.assertEqual(stats.median(), sorted(marks)[50])
+        self.assertEqual((stats.min(), stats.max()), (min(marks), max(marks)))
+        for mark in marks[:10]:
+            self.assertEqual(stats.rank(mark), len([other for other in marks if other > mark]) + 1)
+
+    def test_ties(self):
+        stats = markStats.TopicStats([10., 12., 12., 15.])
+        self.assertEqual([stats.rank(mark) for mark in (15., 12., 10., 11.)], [1, 2, 4, 4])
+        self.assertEqual([stats.percentile(mark) for mark in (15., 12., 10.)],
+                         [87.5, 50., 12.5])
+        self.assertEqual(stats.median(), 12.)
+
+    def test_add_remove(self):
+        stats = markStats.TopicStats([10., 12.])
+        stats.add(float('nan'))
+        stats.add(14.)
+        stats.remove(10.)
+        self.assertEqual(len(stats), 2)
+        self.assertEqual(stats.mean(), 13.)
+        self.assertEqual(stats.median(), 13.)
+        self.assertRaises(ValueError, stats.remove, 10.)
+
+    def test_no_mark(self):
+        stats = markStats.TopicStats()
+        self.assertEqual([stats.mean(), stats.std(), stats.max(), stats.min(),
+                          stats.median(), stats.percentile(1.)], [None] * 6)
+        self.assertEqual(stats.rank(1.), 1)
+        self.assertIsNone(stats.rank(float('nan')))
+
+
+class MarkStatisticsTest(unittest.TestCase):
+
+    def test_values(self):
+        table, topic_list, student_list = build_list_dic(LINES, True, True)
+        statistics = markStats.MarkStatistics(table)
+        # the topics are sorted: Topic A first, its text mark left out
+        self.assertEqual(statistics.values(0),
+                         {'mean': '11.83', 'max': '15', 'min': '9.5', 'median': '11',
+                          'std': '2.32', 'nb_marks': 3})
+        self.assertEqual(statistics.values(1)['nb_marks'], 3)
+        self.assertEqual(markStats.format_stat(None), '')
+
+    def test_updates(self):
+        table, topic_list, student_list = build_list_dic(LINES, False, False)
+        statistics = markStats.MarkStatistics(table)
+        statistics.update_cell(0, 8., 16.)
+        statistics.update_cell(0, None, 4.)
+        self.assertEqual(statistics.topic(0).median(), 12.)
+        table.append_student(["Eve", "e", "e@e.e", "20", ""])
+        statistics.add_students(4)
+        self.assertEqual(len(statistics.topic(0)), 5)
+        self.assertEqual(statistics.topic(0).max(), 20.)
+        self.assertEqual(len(statistics.topic(1)), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+"""
+Tests of markWatch.SheetTail: lines appended to the sheet, sheet rewritten
+in place or replaced, partial lines.
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+import markWatch
+
+LINES = ["Name;Surname;mail;Topic A\n", "Mean;;;10\n", "Highest;;;20\n",
+         "Lowest;;;0\n", "Ann;a;a@a.a;4\n"]
+
+
+class SheetTailTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'marks.csv')
+        self.mtime = time.time() - 100
+        self.write(''.join(LINES))
+        self.tail = markWatch.SheetTail(self.path, interval=0.05)
+        self.assertEqual(self.tail.read_all(), LINES)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, text, mode='w', path=None):
+        path = path or self.path
+        with open(path, mode) as sheet_file:
+            sheet_file.write(text)
+        # a new modification time at each write, whatever the clock resolution
+        self.mtime += 1
+        os.utime(path, (self.mtime, self.mtime))
+
+    def test_unchanged(self):
+        self.assertEqual(self.tail.read_appended(), [])
+
+    def test_appended_lines(self):
+        self.write("Bob;b;b@b.b;12\nCid;c;", 'a')
+        # only the complete lines are read
+        self.assertEqual(self.tail.read_appended(), [["Bob", "b", "b@b.b", "12"]])
+        self.write("c@c.c;7\n", 'a')
+        self.assertEqual(self.tail.read_appended(), [["Cid", "c", "c@c.c", "7"]])
+        self.assertEqual(self.tail.read_appended(), [])
+
+    def test_rewritten_in_place(self):
+        # same size, new content
+        self.write(''.join(LINES).replace("Ann;a;a@a.a;4", "Ann;a;a@a.a;5"))
+        self.assertIsNone(self.tail.read_appended())
+        self.assertEqual(self.tail.read_all()[-1], "Ann;a;a@a.a;5\n")
+        # same size and content, new modification time: not a change
+        self.write(''.join(LINES).replace("Ann;a;a@a.a;4", "Ann;a;a@a.a;5"))
+        self.assertEqual(self.tail.read_appended(), [])
+
+    def test_rewritten_before_the_end(self):
+        self.write(''.join(LINES).replace("Ann", "Ana") + "Bob;b;b@b.b;12\n")
+        self.assertIsNone(self.tail.read_appended())
+
+    def test_shorter(self):
+        self.write(''.join(LINES[:4]))
+        self.assertIsNone(self.tail.read_appended())
+
+    def test_replaced(self):
+        # saved by an editor: written to another file, renamed
+        other = os.path.join(self.directory, 'marks.csv~')
+        self.write(''.join(LINES) + "Bob;b;b@b.b;12\n", path=other)
+        os.rename(other, self.path)
+        self.assertIsNone(self.tail.read_appended())
+        self.assertEqual(len(self.tail.read_all()), 6)
+
+    def test_removed(self):
+        os.remove(self.path)
+        # being replaced: nothing new yet
+        self.assertEqual(self.tail.read_appended(), [])
+        self.assertRaises(IOError, self.tail.read_all)
+
+    def test_wait(self):
+        start = time.time()
+        self.tail.wait()
+        self.assertLess(time.time() - start, 1.)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+"""
+Tests of profiling: histograms, recorder and batched stream of the stages.
+"""
+
+import os
+import sys
+import json
+import threading
+import unittest
+import StringIO
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+import profiling
+
+
+class Stream(StringIO.StringIO):
+    """
+    StringIO counting the writes.
+    """
+
+    def __init__(self):
+        StringIO.StringIO.__init__(self)
+        self.nb_writes = 0
+
+    def write(self, text):
+        self.nb_writes += 1
+        StringIO.StringIO.write(self, text)
+
+
+class HistogramTest(unittest.TestCase):
+
+    def test_summary(self):
+        histogram = profiling.Histogram()
+        for value in range(1, 101):
+            histogram.add(value)
+        summary = histogram.summary()
+        self.assertEqual(summary['count'], 100)
+        self.assertEqual(summary['mean'], 50.5)
+        self.assertEqual((summary['min'], summary['max']), (1, 100))
+        self.assertEqual(summary['p50'], 50)
+        self.assertEqual(summary['p99'], 100)
+        self.assertEqual(summary['buckets']['<=1'], 1)
+        self.assertEqual(sum(summary['buckets'].values()), 100)
+        self.assertEqual(profiling.Histogram().summary()['p50'], None)
+
+
+class RecorderTest(unittest.TestCase):
+
+    def test_disabled(self):
+        recorder = profiling.Recorder(enabled=False)
+        with recorder.stage('parse'):
+            recorder.count('rows', 3)
+            recorder.observe('send_ms', 1.)
+        snapshot = recorder.snapshot()
+        self.assertEqual((snapshot['stages'], snapshot['counters'], snapshot['histograms']),
+                         ({}, {}, {}))
+
+    def test_snapshot(self):
+        recorder = profiling.Recorder()
+        for iCall in range(3):
+            with recorder.stage('render'):
+                recorder.count('bodies')
+        recorder.count('bytes', 100)
+        recorder.observe('send_ms', 12.)
+        snapshot = recorder.snapshot()
+        self.assertEqual(snapshot['stages']['render']['calls'], 3)
+        self.assertEqual(snapshot['counters'], {'bodies': 3, 'bytes': 100})
+        self.assertEqual(snapshot['histograms']['send_ms']['count'], 1)
+        output = StringIO.StringIO()
+        recorder.dump(output)
+        self.assertEqual(json.loads(output.getvalue())['counters']['bodies'], 3)
+
+    def test_stage_of_an_exception(self):
+        recorder = profiling.Recorder()
+        try:
+            with recorder.stage('parse'):
+                raise IOError()
+        except IOError:
+            pass
+        self.assertEqual(recorder.snapshot()['stages']['parse']['calls'], 1)
+
+    def test_stream_by_batches(self):
+        stream = Stream()
+        recorder = profiling.Recorder(stream=stream)
+        recorder.last_flush += 3600
+        for iStage in range(profiling.STREAM_BATCH - 1):
+            with recorder.stage('render'):
+                pass
+        # below the batch size and the period: nothing written yet
+        self.assertEqual(stream.nb_writes, 0)
+        with recorder.stage('send'):
+            pass
+        self.assertEqual(stream.nb_writes, 1)
+        with recorder.stage('close'):
+            pass
+        stream.close = lambda: None
+        recorder.close()
+        lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual(len(lines), profiling.STREAM_BATCH + 1)
+        self.assertEqual([line['stage'] for line in lines[-2:]], ['send', 'close'])
+
+    def test_stream_from_threads(self):
+        stream = Stream()
+        recorder = profiling.Recorder(stream=stream)
+
+        def work():
+            for iStage in range(2000):
+                with recorder.stage('render'):
+                    recorder.count('bodies')
+
+        threads = [threading.Thread(target=work) for iThread in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        recorder.flush()
+        self.assertEqual(stream.getvalue().count('\n'), 8000)
+        self.assertEqual(recorder.snapshot()['counters']['bodies'], 8000)
+        self.assertLess(stream.nb_writes, 8000 / profiling.STREAM_BATCH + 10)
+
+    def test_global_recorder(self):
+        recorder = profiling.recorder
+        try:
+            enabled = profiling.enable()
+            with profiling.stage('parse'):
+                profiling.count('rows')
+            self.assertEqual(enabled.snapshot()['counters'], {'rows': 1})
+        finally:
+            profiling.recorder = recorder
+
+
+if __name__ == '__main__':
+    unittest.main()
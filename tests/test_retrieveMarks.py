@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+"""
+Tests of the parsing of the sheets (retrieve_marks): dense and sparse
+storage of the marks.
+"""
+
+import os
+import sys
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+from retrieve_marks import MarkTable, SparseMarkTable, build_list_dic
+from sheets import NB_TOPIC, sheet_lines, cells
+
+
+class StorageTest(unittest.TestCase):
+
+    def test_dense(self):
+        table, topics, students = build_list_dic(sheet_lines(30, lambda s, t: True),
+                                                 False, False)
+        self.assertIs(type(table), MarkTable)
+        self.assertEqual(table.mark(3, 2), 5.5)
+
+    def test_sparse_same_as_dense(self):
+        lines = sheet_lines(30, lambda s, t: (s + t) % 7 == 0)
+        sparse, topics, students = build_list_dic(lines, True, True)
+        self.assertIsInstance(sparse, SparseMarkTable)
+        # the same cells, stored densely
+        dense = MarkTable(lines[0].rstrip('\n').split(';'),
+                          [line.rstrip('\n').split(';') for line in lines[1:4]])
+        for line in lines[4:]:
+            dense.append_student(line.rstrip('\n').split(';'))
+        dense.set_order(sparse.student_order, sparse.topic_order)
+        self.assertEqual(cells(sparse), cells(dense))
+        self.assertEqual(sparse.student_list(), dense.student_list())
+        self.assertEqual([list(sparse.row_topics(iStudent)) for iStudent in range(30)],
+                         [[iTopic for iTopic in range(NB_TOPIC) if dense.has_mark(iStudent, iTopic)]
+                          for iStudent in range(30)])
+
+    def test_filled_later(self):
+        # the first lines decide the storage, the later ones are kept anyway
+        lines = sheet_lines(300, lambda s, t: s >= 250)
+        table, topics, students = build_list_dic(lines, False, False)
+        self.assertIsInstance(table, SparseMarkTable)
+        self.assertEqual(table.nb_cells(), 50 * NB_TOPIC)
+        self.assertEqual(table.mark_str(299, 0), "299.5")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+"""
+Tests of the selection expressions (selectExpr).
+"""
+
+import os
+import sys
+import operator
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+from retrieve_marks import build_list_dic
+from SelectionModel import SelectionModel
+from selectExpr import SelectionExpression, split_words
+
+LINES = ["Name;Surname;mail;Topic A;Topic B;;Topic C;Test where and",
+         "Mean;;;10;10;10;10;10", "Highest;;;20;20;20;20;20", "Lowest;;;0;0;0;0;0",
+         "Ann;a;a@a.a;4;12;1;8;3", "Bob;b;b@u-psud.fr;15;;1;9;", ";;;1;1;1;1;1",
+         "Jean Paul;c;c@c.c;6;7;1;;"]
+
+
+def model():
+    table, topic_list, student_list = build_list_dic(LINES, False, False)
+    return table, SelectionModel(student_list, topic_list, table)
+
+
+def selected(table, expression):
+    selection = SelectionModel(table.student_list(), table.topic_list(), table)
+    selection.set_mask(SelectionExpression(expression).mask(table, selection), True)
+    return [list(selection.selected_topics(iStudent))
+            for iStudent in range(selection.nb_student)]
+
+
+class SelectionExpressionTest(unittest.TestCase):
+
+    def test_split_words(self):
+        self.assertEqual(split_words('topics="Topic A",B students=~^\\w+#x emails=\'~a b\''),
+                         [('topics=Topic A,B', True), ('students=~^\\w+#x', False),
+                          ('emails=~a b', True)])
+        self.assertEqual(split_words('"where" where'), [('where', True), ('where', False)])
+        self.assertRaises(ValueError, SelectionExpression, 'topics="Topic A')
+
+    def test_clauses(self):
+        expression = SelectionExpression('topics=A,B students=~^J emails=~@u-psud')
+        self.assertTrue(expression.topic_filter('A'))
+        self.assertFalse(expression.topic_filter('AB'))
+        self.assertTrue(expression.student_filter('Jean'))
+        self.assertFalse(expression.student_filter('Ann'))
+        self.assertTrue(expression.email_filter('b@u-psud.fr'))
+        for text in ('topics', 'names=A', 'where mark<', 'where mark<10 or mark>15',
+                     'students=~(', 'topics=A where'):
+            self.assertRaises(ValueError, SelectionExpression, text)
+
+    def test_conditions(self):
+        expression = SelectionExpression('where mark >= 5 and mark<10,5')
+        self.assertEqual(expression.conditions, [(operator.ge, 5.), (operator.lt, 10.5)])
+        self.assertEqual(SelectionExpression('').conditions, [])
+
+    def test_quoted_names(self):
+        table, selection = model()
+        self.assertEqual(selected(table, 'topics="Topic A","Topic C" '
+                                         'students="Jean Paul",Ann where mark<7'),
+                         [[0], [], [], [0]])
+        # where and 'and' in a quoted name are part of the name
+        self.assertEqual(selected(table, 'topics="Test where and" where mark>2'),
+                         [[4], [], [], []])
+
+    def test_row_topics_same_as_mask(self):
+        table, selection = model()
+        for text in ('where mark>=5 and mark<=12', 'topics=~Topic students=~n$',
+                     'emails=~u-psud'):
+            expression = SelectionExpression(text)
+            topics = frozenset(iTopic for iTopic in expression.topic_indices(table)
+                               if table.topic_list()[iTopic] != "")
+            self.assertEqual([expression.row_topics(table, iStudent, topics)
+                              for iStudent in range(4)], selected(table, text))
+
+
+if __name__ == '__main__':
+    unittest.main()
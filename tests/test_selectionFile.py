@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+"""
+Tests of selectionFile: round trip of a selection, and reload after the
+students and topics were sorted, added or removed.
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+import selectionFile
+from retrieve_marks import SparseMarkTable, build_list_dic
+from SelectionModel import SelectionModel
+from sheets import sheet_lines
+
+HEADER = ["Name;Surname;mail;Topic1;Topic2;Topic3",
+          "Mean;;;10;10;10", "Highest;;;20;20;20", "Lowest;;;0;0;0"]
+STUDENTS = ["B;b;b@b.b;1;2;3", "A;a;a@a.a;4;;6", "C;c;;7;8;9", "D;d;d@d.d;;11;12"]
+
+
+def sheet(students, header=HEADER, sort=False):
+    table, topic_list, student_list = build_list_dic(header + students, sort, sort)
+    return table, SelectionModel(student_list, topic_list, table)
+
+
+def state(table, selection):
+    """
+    :return: set of the selected (student, topic) names, global students and
+    topics
+    """
+    topic_list = table.topic_list()
+    student_list = table.student_list()
+    cells = set((student_list[iStudent], topic_list[iTopic])
+                for iStudent in range(selection.nb_student)
+                for iTopic in selection.selected_topics(iStudent))
+    students = set(student_list[iStudent] for iStudent in range(selection.nb_student)
+                   if selection.student_selected(iStudent))
+    topics = set(topic_list[iTopic] for iTopic in range(selection.nb_topic)
+                 if selection.topic_selected(iTopic))
+    return cells, students, topics
+
+
+class SelectionFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'marks.sel')
+        self.table, self.selection = sheet(STUDENTS)
+        # B (0) whole, Topic3 (2) whole, A/Topic1
+        self.selection.set_student(0, True)
+        self.selection.set_topic(2, True)
+        self.selection.set_single(1, 0, True)
+        selectionFile.save_selection(self.path, self.table, self.selection)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        table, selection = sheet(STUDENTS)
+        selectionFile.load_selection(self.path, table, selection)
+        self.assertEqual(selection.cells, self.selection.cells)
+        self.assertEqual(selection.students, self.selection.students)
+        self.assertEqual(selection.topics, self.selection.topics)
+        self.assertEqual(list(selection.selected_student),
+                         list(self.selection.selected_student))
+
+    def test_sorted(self):
+        table, selection = sheet(STUDENTS, sort=True)
+        selectionFile.load_selection(self.path, table, selection)
+        self.assertEqual(state(table, selection), state(self.table, self.selection))
+
+    def test_lines_and_columns_changed(self):
+        # E added first, A removed, a new topic in the middle
+        header = ["Name;Surname;mail;Topic3;New;Topic1;Topic2",
+                  "Mean;;;10;10;10;10", "Highest;;;20;20;20;20", "Lowest;;;0;0;0;0"]
+        students = ["E;e;e@e.e;1;1;1;1", "B;b;b@b.b;3;5;1;2", "C;c;;9;5;7;8",
+                    "D;d;d@d.d;12;5;;11"]
+        table, selection = sheet(students, header)
+        selectionFile.load_selection(self.path, table, selection)
+        cells, students, topics = state(table, selection)
+        self.assertEqual(cells, set([('B', 'Topic1'), ('B', 'Topic2'), ('B', 'Topic3'),
+                                     ('C', 'Topic3'), ('D', 'Topic3')]))
+        # B is not complete with the new topic, Topic3 without E
+        self.assertEqual(students, set())
+        self.assertEqual(topics, set())
+
+    def test_sparse(self):
+        lines = sheet_lines(200, lambda s, t: (s + t) % 9 == 0)
+        table, topic_list, student_list = build_list_dic(lines, False, False)
+        self.assertIsInstance(table, SparseMarkTable)
+        selection = SelectionModel(student_list, topic_list, table)
+        selection.set_topic(0, True)
+        selection.set_student(7, True)
+        selectionFile.save_selection(self.path, table, selection)
+        sorted_table, topic_list, student_list = build_list_dic(lines, True, True)
+        reloaded = SelectionModel(student_list, topic_list, sorted_table)
+        selectionFile.load_selection(self.path, sorted_table, reloaded)
+        self.assertEqual(state(sorted_table, reloaded), state(table, selection))
+
+    def test_not_a_selection_file(self):
+        with open(self.path, 'wb') as selection_file:
+            selection_file.write("Name;Surname;mail\n")
+        self.assertRaises(ValueError, selectionFile.load_selection, self.path,
+                          self.table, self.selection)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+"""
+Tests of sendPipeline: students confirmed while the GUI is open, rendered
+by the worker thread with the topics frozen at their confirmation, and
+progress reported from the other threads.
+"""
+
+import os
+import sys
+import threading
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+import mailUtils as mailU
+import sendPipeline
+
+
+class Sender(object):
+    """
+    send_students function of the pipeline, noting the topics of each
+    student, in the thread of the pipeline. The students in failing fail.
+    """
+
+    def __init__(self, failing=()):
+        self.failing = failing
+        self.sent = {}
+        self.threads = set()
+
+    def __call__(self, students, selection):
+        self.threads.add(threading.current_thread().name)
+        nb_failed = 0
+        for iStudent in students:
+            if iStudent in self.failing:
+                nb_failed += 1
+            else:
+                self.sent[iStudent] = list(selection.selected_topics(iStudent))
+        return len(students) - nb_failed, nb_failed
+
+
+class SendPipelineTest(unittest.TestCase):
+
+    def test_confirmed_students(self):
+        sender = Sender(failing=(2,))
+        pipeline = sendPipeline.SendPipeline(sender)
+        topics = [0, 3]
+        pipeline.confirm(0, topics)
+        # later changes of the selection are not seen
+        topics.append(4)
+        pipeline.confirm(1, iter([1]))
+        pipeline.confirm(2, [0])
+        self.assertTrue(pipeline.is_confirmed(1))
+        self.assertFalse(pipeline.is_confirmed(3))
+        pipeline.close()
+        self.assertEqual(sender.sent, {0: [0, 3], 1: [1]})
+        self.assertNotIn(threading.current_thread().name, sender.threads)
+        progress = pipeline.progress()
+        self.assertEqual((progress['confirmed'], progress['queued'], progress['failed']),
+                         (3, 2, 1))
+
+    def test_reports(self):
+        pipeline = sendPipeline.SendPipeline(Sender())
+        self.assertEqual(pipeline.progress()['rate'], 0.)
+        pipeline.confirm(0, [0])
+        reporters = [threading.Thread(target=pipeline.report,
+                                      args=(mailU.SendResult("a@a.a", iReport % 4 != 0,
+                                                             None, 1),))
+                     for iReport in range(20)]
+        for reporter in reporters:
+            reporter.start()
+        for reporter in reporters:
+            reporter.join()
+        pipeline.close()
+        progress = pipeline.progress()
+        self.assertEqual((progress['sent'], progress['failed']), (15, 5))
+        # the events are only counted once
+        self.assertEqual(pipeline.progress()['sent'], 15)
+
+
+class FrozenSelectionTest(unittest.TestCase):
+
+    def test_selected_topics(self):
+        selection = sendPipeline.FrozenSelection()
+        selection.rows = {3: [1, 2]}
+        self.assertEqual(list(selection.selected_topics(3)), [1, 2])
+        self.assertEqual(list(selection.selected_topics(0)), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
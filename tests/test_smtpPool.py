@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+"""
+Tests of mailUtils.SMTPPool, against a local stand-in SMTP server (see
+smtpServer).
+
+Run with
+    python -m unittest discover tests
+"""
+
+import os
+import sys
+import socket
+import smtplib
+import threading
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+import mailUtils as mailU
+from smtpServer import StandinServer
+
+
+def message(receiver):
+    return mailU.build_message("teacher@example.org", receiver, "Your marks",
+                               "Your mark for Topic1 is 12.\n")
+
+
+class SMTPPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StandinServer()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def send_from_threads(self, pool, nb_threads, nb_messages):
+        results = []
+        lock = threading.Lock()
+
+        def send():
+            for iMessage in range(nb_messages):
+                receiver = "student%d@example.org" % iMessage
+                result = pool.send("teacher@example.org", receiver, message(receiver))
+                with lock:
+                    results.append(result)
+
+        threads = [threading.Thread(target=send) for iThread in range(nb_threads)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join(20)
+            self.assertFalse(thread.is_alive(), "pool deadlock")
+        return results
+
+    def test_renewed_connections_wake_the_waiters(self):
+        # each connection is retired after one message: the threads waiting
+        # for the single connection must be able to open a new one
+        pool = mailU.SMTPPool('127.0.0.1', self.server.port(), size=1, max_messages=1)
+        results = self.send_from_threads(pool, 3, 2)
+        pool.close()
+        self.assertEqual(len(results), 6)
+        self.assertTrue(all(result.ok for result in results))
+        self.assertEqual(pool.nb_open, 0)
+        self.assertEqual(self.server.nb_received, 6)
+
+    def test_size_is_a_limit(self):
+        pool = mailU.SMTPPool('127.0.0.1', self.server.port(), size=2)
+        results = self.send_from_threads(pool, 5, 4)
+        self.assertTrue(all(result.ok for result in results))
+        self.assertLessEqual(pool.nb_open, 2)
+        self.assertLessEqual(self.server.max_open, 2)
+        pool.close()
+        self.assertEqual(pool.nb_open, 0)
+
+    def test_connections_are_reused(self):
+        pool = mailU.SMTPPool('127.0.0.1', self.server.port(), size=1, max_messages=2)
+        results = pool.send_many(("teacher@example.org", receiver, message(receiver))
+                                 for receiver in ("a@a.a", "b@b.b", "c@c.c", "d@d.d", "e@e.e"))
+        pool.close()
+        self.assertEqual([result.attempts for result in results], [1] * 5)
+        # renewed after 2 messages
+        self.assertEqual(self.server.nb_sessions, 3)
+
+    def test_unreachable_server_is_temporary(self):
+        pool = mailU.SMTPPool('127.0.0.1', self.server.port(), retries=0, timeout=5)
+        self.server.stop()
+        self.server = StandinServer()
+        result = pool.send("teacher@example.org", "a@example.org", message("a@example.org"))
+        self.assertFalse(result.ok)
+        self.assertTrue(result.temporary)
+        self.assertEqual(pool.nb_open, 0)
+
+    def test_refused_login_is_permanent(self):
+        self.server.stop()
+        self.server = StandinServer(refuse_logins=True)
+        pool = mailU.SMTPPool('127.0.0.1', self.server.port(), 'teacher', 'secret')
+        result = pool.send("teacher@example.org", "a@example.org", message("a@example.org"))
+        self.assertFalse(result.ok)
+        self.assertFalse(result.temporary)
+        # not tried again
+        self.assertEqual((result.attempts, self.server.nb_logins), (1, 1))
+        self.assertEqual(pool.nb_open, 0)
+
+    def test_login(self):
+        pool = mailU.SMTPPool('127.0.0.1', self.server.port(), 'teacher', 'secret')
+        result = pool.send("teacher@example.org", "a@example.org", message("a@example.org"))
+        pool.close()
+        self.assertTrue(result.ok)
+        self.assertEqual(self.server.nb_logins, 1)
+
+    def test_ssl_error_is_permanent(self):
+        # SSL to a server without SSL
+        pool = mailU.SMTPPool('127.0.0.1', self.server.port(), ssl=True, timeout=5)
+        result = pool.send("teacher@example.org", "a@example.org", message("a@example.org"))
+        self.assertFalse(result.ok)
+        self.assertFalse(result.temporary)
+        self.assertEqual(result.attempts, 1)
+
+    def test_temporary_connection_errors(self):
+        temporary = mailU.connection_error_is_temporary
+        self.assertTrue(temporary(socket.error(111, "Connection refused")))
+        self.assertTrue(temporary(smtplib.SMTPServerDisconnected("closed")))
+        self.assertTrue(temporary(smtplib.SMTPConnectError(421, "busy")))
+        self.assertFalse(temporary(smtplib.SMTPConnectError(554, "no service")))
+        self.assertFalse(temporary(smtplib.SMTPHeloError(501, "bad name")))
+        self.assertFalse(temporary(smtplib.SMTPException("STARTTLS extension not "
+                                                         "supported by server.")))
+
+
+if __name__ == '__main__':
+    unittest.main()